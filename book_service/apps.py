@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BookServiceConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "book_service"
+
+    def ready(self):
+        import book_service.signals  # noqa: F401
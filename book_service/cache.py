@@ -0,0 +1,124 @@
+"""
+Read-through cache of the serialized book catalog.
+
+Keys embed version numbers instead of being deleted: every change of a
+book bumps its own version and the catalog version, so its detail and
+every list page are recomputed on the next read. A reader that raced a
+change can only fill a key of the old version, which nobody reads
+anymore.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from library_service_project.metrics import BOOK_CACHE_REQUESTS
+from library_service_project.routers import use_replica
+
+CATALOG_VERSION_KEY = "books:version"
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.05
+LOCK_RETRIES = 20
+
+_MISSING = object()
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+
+
+def book_key(book_id):
+    """Cache key of the serialized book."""
+
+    version = _get_version(f"books:version:{book_id}")
+    return f"books:detail:{book_id}:{version}"
+
+
+def list_page_key(url):
+    """Cache key of the list page at the given absolute URL."""
+
+    version = _get_version(CATALOG_VERSION_KEY)
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f"books:list:{version}:{digest}"
+
+
+def read_through(key, compute, kind):
+    """
+    Return the cached value of the key, computing it on a miss.
+
+    Only one process computes a missing key at a time, the others wait
+    up to LOCK_WAIT * LOCK_RETRIES seconds for its result, so an expired
+    popular page does not send a burst of identical queries to the
+    database. A waiter that gives up computes the value itself.
+    Cached values are computed from the primary database.
+
+    Args:
+    - key (str): Cache key, from book_key() or list_page_key().
+    - compute (callable): Builds the value on a miss.
+    - kind (str): "detail" or "list", for the hit/miss counters.
+    """
+
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        BOOK_CACHE_REQUESTS.labels(kind, "hit").inc()
+        return value
+
+    BOOK_CACHE_REQUESTS.labels(kind, "miss").inc()
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        for _ in range(LOCK_RETRIES):
+            time.sleep(LOCK_WAIT)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return compute()
+
+    try:
+        # A lagging replica could fill the key of the new version with
+        # the old rows, the cached value is read from the primary.
+        with use_replica(False):
+            value = compute()
+        cache.set(key, value, timeout=settings.BOOK_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def invalidate_books(book_ids):
+    """
+    Expire the cached details of the books and every list page.
+
+    The versions are bumped right away and once more after the current
+    transaction commits, so a page read before the commit does not stay
+    cached.
+    """
+
+    book_ids = set(book_ids)
+
+    def bump():
+        for book_id in book_ids:
+            _bump_version(f"books:version:{book_id}")
+        _bump_version(CATALOG_VERSION_KEY)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidate_book(book_id):
+    """Expire the cached detail of the book and every list page."""
+
+    invalidate_books([book_id])
@@ -0,0 +1,22 @@
+from django.contrib.postgres.indexes import GinIndex
+
+
+class PostgresGinIndex(GinIndex):
+    """
+    GinIndex that is only created on Postgres.
+
+    Other databases (e.g. SQLite test runs) can compile neither its
+    expressions nor its operator classes. SQLite recreates every index
+    of a model whenever a migration remakes its table, so the index is
+    skipped here rather than in the AddIndex operation.
+    """
+
+    def create_sql(self, model, schema_editor, *args, **kwargs):
+        if schema_editor.connection.vendor != "postgresql":
+            return f"-- {self.name} is only created on Postgres"
+        return super().create_sql(model, schema_editor, *args, **kwargs)
+
+    def remove_sql(self, model, schema_editor, *args, **kwargs):
+        if schema_editor.connection.vendor != "postgresql":
+            return f"-- {self.name} is only created on Postgres"
+        return super().remove_sql(model, schema_editor, *args, **kwargs)
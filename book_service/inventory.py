@@ -0,0 +1,92 @@
+from collections import Counter
+
+from django.db.models import F
+from django.utils import timezone
+
+from book_service.cache import invalidate_book, invalidate_books
+from book_service.models import Book
+
+
+def reserve_book(book_id):
+    """Take one copy of the book off the shelf.
+
+    The check and the decrement happen in a single conditional
+    ``UPDATE ... WHERE inventory > 0``, so concurrent checkouts of the
+    same title can never oversell it or lose an update.
+
+    Args:
+        book_id (int): Primary key of the book to reserve.
+
+    Returns:
+        bool: True if a copy was reserved, False if the book is out of stock.
+    """
+
+    reserved = Book.objects.filter(pk=book_id, inventory__gt=0).update(
+        inventory=F("inventory") - 1,
+        inventory_updated_at=timezone.now(),
+    )
+    if reserved:
+        invalidate_book(book_id)
+    return bool(reserved)
+
+
+def reserve_books(book_ids):
+    """Take one copy of each of several different books off the shelf.
+
+    All or nothing: a single conditional ``UPDATE`` decrements the books
+    that are in stock, and if any of them is not, the caller's
+    transaction must be rolled back.
+
+    Args:
+        book_ids (iterable): Primary keys of distinct books to reserve.
+
+    Returns:
+        bool: True if every book was reserved.
+    """
+
+    book_ids = set(book_ids)
+    reserved = Book.objects.filter(pk__in=book_ids, inventory__gt=0).update(
+        inventory=F("inventory") - 1,
+        inventory_updated_at=timezone.now(),
+    )
+    if reserved:
+        invalidate_books(book_ids)
+    return reserved == len(book_ids)
+
+
+def release_book(book_id):
+    """Put one copy of the book back on the shelf.
+
+    Args:
+        book_id (int): Primary key of the returned book.
+    """
+
+    Book.objects.filter(pk=book_id).update(
+        inventory=F("inventory") + 1,
+        inventory_updated_at=timezone.now(),
+    )
+    invalidate_book(book_id)
+
+
+def release_books(book_ids):
+    """Put copies of several books back on the shelf in bulk.
+
+    One ``UPDATE`` is issued per distinct number of returned copies,
+    so returning a whole batch costs a handful of queries, not one per
+    borrowing.
+
+    Args:
+        book_ids (iterable): Primary keys of the returned books, a book
+            returned several times is listed several times.
+    """
+
+    copies_by_book = Counter(book_ids)
+    by_copies = {}
+    for book_id, copies in copies_by_book.items():
+        by_copies.setdefault(copies, []).append(book_id)
+    for copies, ids in by_copies.items():
+        Book.objects.filter(pk__in=ids).update(
+            inventory=F("inventory") + copies,
+            inventory_updated_at=timezone.now(),
+        )
+    invalidate_books(copies_by_book)
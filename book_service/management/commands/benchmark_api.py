@@ -0,0 +1,125 @@
+import json
+import os
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from library_service_project.benchmark import (
+    BENCHMARK_WEBHOOK_SECRET,
+    Dataset,
+    compare,
+    get_endpoints,
+    measure,
+    seed_dataset,
+)
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "api_baseline.json"
+
+
+class Command(BaseCommand):
+    """Django command to measure the cost of every API endpoint"""
+
+    help = (
+        "Seed a dataset in a transaction that is rolled back afterwards, "
+        "call every API endpoint and record its query count, p50/p95 "
+        "latency and response size. Compared with the JSON baseline, "
+        "exits with an error if an endpoint regressed."
+    )
+
+    def add_arguments(self, parser):
+        defaults = Dataset()
+        parser.add_argument("--users", type=int, default=defaults.users)
+        parser.add_argument("--books", type=int, default=defaults.books)
+        parser.add_argument(
+            "--borrowings", type=int, default=defaults.borrowings
+        )
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Allowed growth of size and p95 latency (0.2 is 20%%).",
+        )
+        parser.add_argument(
+            "--skip-latency",
+            action="store_true",
+            help="Only compare query counts, status codes and sizes.",
+        )
+        parser.add_argument(
+            "--update-baseline",
+            action="store_true",
+            help="Write the results to the baseline instead of comparing.",
+        )
+
+    @override_settings(
+        DEBUG=False,
+        ALLOWED_HOSTS=["testserver"],
+        # Every request runs with an empty cache, never flush a real one.
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+            }
+        },
+        STRIPE_BACKEND="payment.stripe_backends.FakeStripeBackend",
+    )
+    @mock.patch.dict(
+        os.environ, {"STRIPE_WEBHOOK_SECRET": BENCHMARK_WEBHOOK_SECRET}
+    )
+    def handle(self, *args, **options):
+        dataset = Dataset(
+            users=options["users"],
+            books=options["books"],
+            borrowings=options["borrowings"],
+            seed=options["seed"],
+        )
+        with transaction.atomic():
+            users = seed_dataset(dataset)
+            results = measure(
+                get_endpoints(users), users, options["iterations"]
+            )
+            transaction.set_rollback(True)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:24} {result['status']} "
+                f"{result['queries']:3} queries "
+                f"{result['p50_ms']:8.2f}ms p50 "
+                f"{result['p95_ms']:8.2f}ms p95 "
+                f"{result['bytes']:8} bytes"
+            )
+
+        baseline_path = Path(options["baseline"])
+        if options["update_baseline"]:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2) + "\n")
+            self.stdout.write(
+                self.style.SUCCESS(f"Baseline written to {baseline_path}")
+            )
+            return
+
+        if not baseline_path.exists():
+            raise CommandError(
+                f"No baseline at {baseline_path}, "
+                "create it with --update-baseline."
+            )
+        checks = ["bytes"]
+        if not options["skip_latency"]:
+            checks.append("p95_ms")
+        regressions = compare(
+            results,
+            json.loads(baseline_path.read_text()),
+            options["threshold"],
+            checks,
+        )
+        if regressions:
+            raise CommandError(
+                "Regressions against the baseline:\n"
+                + "\n".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,112 @@
+import random
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db import connection
+
+from book_service.models import Book
+from book_service.search import search_books
+
+WORDS = (
+    "shadow river night garden silent empire winter stone glass crown "
+    "forest secret city ocean fire lost last road star dream house war "
+    "iron golden dark light song storm island mountain letter memory "
+    "blood silver heart wind queen king child time world journey moon"
+).split()
+FIRST_NAMES = (
+    "Anna John Maria Peter Olga Ivan Emma Lucas Sofia Mark Nina Paul "
+    "Clara David Irina Hugo Vera Adam Lena Oscar"
+).split()
+LAST_NAMES = (
+    "Smith Kovalenko Garcia Novak Muller Rossi Dubois Tanaka Silva "
+    "Petrenko Larsen Wagner Moreau Costa Horvat Nilsen Shevchenko Kent"
+).split()
+QUERIES = (
+    {"q": "golden river"},
+    {"q": "shevchenko"},
+    {"q": "stome"},
+    {"author": "novak"},
+    {"title__startswith": "silent"},
+)
+
+
+class Command(BaseCommand):
+    """Django command to measure book search latency on a large catalog"""
+
+    help = (
+        "Seed the catalog with synthetic books (1M by default) and report "
+        "p50/p95 latency of the search queries behind BookViewSet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the seeded books instead of deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        first_id = self.seed(options)
+        try:
+            for params in QUERIES:
+                self.measure(params, options["repeat"])
+        finally:
+            if not options["keep"]:
+                Book.objects.filter(id__gte=first_id).delete()
+
+    def seed(self, options):
+        rng = random.Random(options["seed"])
+        first_id = None
+        start = time.perf_counter()
+        for offset in range(0, options["books"], options["batch_size"]):
+            size = min(options["batch_size"], options["books"] - offset)
+            books = Book.objects.bulk_create(
+                Book(
+                    title=" ".join(rng.sample(WORDS, rng.randint(2, 5))),
+                    author=(
+                        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+                    ),
+                    cover=rng.choice(Book.CoverChoices.values),
+                    inventory=rng.randint(0, 10),
+                    daily_fee=rng.randint(10, 300) / 100,
+                )
+                for _ in range(size)
+            )
+            if first_id is None:
+                first_id = books[0].id
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Book._meta.db_table}")
+        self.stdout.write(
+            f"Seeded {options['books']} books "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return first_id
+
+    def measure(self, params, repeat):
+        queryset = Book.objects.all()
+        if "q" in params:
+            queryset = search_books(queryset, params["q"])
+        if "author" in params:
+            queryset = queryset.filter(author__icontains=params["author"])
+        if "title__startswith" in params:
+            queryset = queryset.filter(
+                title__istartswith=params["title__startswith"]
+            )
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset[:10])
+            timings.append((time.perf_counter() - start) * 1000)
+
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        self.stdout.write(
+            f"{params}: p50 {statistics.median(timings):.1f}ms, "
+            f"p95 {p95:.1f}ms"
+        )
@@ -0,0 +1,92 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from book_service.inventory import reserve_book
+from book_service.models import Book
+from borrowing.models import Borrowing
+
+
+class Command(BaseCommand):
+    """Django command to stress test concurrent checkouts of one hot book"""
+
+    help = (
+        "Hammer a single book with concurrent checkouts, verify that it is "
+        "never oversold and report checkouts per second."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--inventory", type=int, default=1000)
+        parser.add_argument("--attempts", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=16)
+
+    def handle(self, *args, **options):
+        book = Book.objects.create(
+            title="Benchmark hot book",
+            author="Benchmark",
+            cover=Book.CoverChoices.HARD.value,
+            inventory=options["inventory"],
+            daily_fee=1,
+        )
+        user = get_user_model().objects.create_user(
+            email=f"benchmark-{book.id}@example.com"
+        )
+        expected_return_date = date.today() + timedelta(days=7)
+
+        def checkout():
+            with transaction.atomic():
+                if not reserve_book(book.id):
+                    return False
+                Borrowing.objects.create(
+                    book=book,
+                    user=user,
+                    expected_return_date=expected_return_date,
+                )
+            return True
+
+        def worker(attempts):
+            try:
+                return [checkout() for _ in range(attempts)]
+            finally:
+                connection.close()
+
+        threads = options["threads"]
+        shares = [
+            options["attempts"] // threads
+            + (index < options["attempts"] % threads)
+            for index in range(threads)
+        ]
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                results = sum(pool.map(worker, shares), [])
+            elapsed = time.perf_counter() - start
+
+            book.refresh_from_db()
+            checkouts = sum(results)
+            borrowings = Borrowing.objects.filter(book=book).count()
+        finally:
+            book.delete()
+            user.delete()
+
+        expected = min(options["inventory"], options["attempts"])
+        if checkouts != expected or borrowings != expected or (
+            book.inventory != options["inventory"] - expected
+        ):
+            raise CommandError(
+                f"Oversold: {checkouts} checkouts, {borrowings} borrowings, "
+                f"{book.inventory} left of {options['inventory']}."
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{checkouts} checkouts, {len(results) - checkouts} rejected "
+                f"in {elapsed:.2f}s ({checkouts / elapsed:.0f} checkouts/s, "
+                f"{threads} threads)"
+            )
+        )
@@ -0,0 +1,90 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+class Command(BaseCommand):
+    """Django command to compare request latency with connection reuse"""
+
+    help = (
+        "Serve --requests GET /api/user/me/ requests through the WSGI "
+        "handler, as a server would, once with a new database connection "
+        "per request (CONN_MAX_AGE = 0) and once with a persistent one, "
+        "and report p50/p95 latency and the server connections used. With "
+        "the pool backend (DB_POOL_SIZE) both take their connections from "
+        "the pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Measure the request, not the debug toolbar.
+        middleware = [
+            name
+            for name in settings.MIDDLEWARE
+            if not name.startswith("debug_toolbar")
+        ]
+        with override_settings(
+            DEBUG=False, ALLOWED_HOSTS=["testserver"], MIDDLEWARE=middleware
+        ):
+            self.compare(options["requests"])
+
+    def compare(self, requests):
+        user = get_user_model().objects.create_user(
+            email="connections-benchmark@example.com"
+        )
+        environ = (
+            RequestFactory()
+            .get(
+                reverse("user:manage"),
+                HTTP_AUTHORIZE=f"Bearer {AccessToken.for_user(user)}",
+            )
+            .environ
+        )
+        try:
+            for name, max_age in (("new connection", 0), ("reuse", None)):
+                self.measure(name, max_age, environ, requests)
+        finally:
+            user.delete()
+
+    def measure(self, name, max_age, environ, requests):
+        handler = WSGIHandler()
+        max_age_before = connection.settings_dict["CONN_MAX_AGE"]
+        connection.settings_dict["CONN_MAX_AGE"] = max_age
+        connection.close()
+        backends = set()
+
+        def count(connection, **kwargs):
+            backends.add(connection.connection.info.backend_pid)
+
+        connection_created.connect(count)
+        timings = []
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = handler(dict(environ), lambda *args: None)
+                # Sends request_finished, which closes old connections.
+                response.close()
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            connection_created.disconnect(count)
+            connection.settings_dict["CONN_MAX_AGE"] = max_age_before
+            connection.close()
+
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        self.stdout.write(
+            f"{name}: p50 {statistics.median(timings):.2f}ms, "
+            f"p95 {p95:.2f}ms, {len(backends)} server connections for "
+            f"{requests} requests"
+        )
@@ -0,0 +1,68 @@
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    """Django command to load test a running server over HTTP"""
+
+    help = (
+        "Send --requests requests to --url from --concurrency clients at "
+        "once and report throughput, p50/p95/p99 latency and status "
+        "codes. With several --url the requests go to each in turn. "
+        "Run it against the WSGI and the ASGI server with the same "
+        "number of workers to compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", action="append")
+        parser.add_argument(
+            "--method", choices=("GET", "POST"), default="GET"
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument(
+            "--token",
+            help="JWT access token, for the endpoints that need a user.",
+        )
+
+    def handle(self, *args, **options):
+        urls = options["url"] or ["http://localhost:8000/api/book_service/"]
+        headers = {}
+        if options["token"]:
+            headers["Authorize"] = f"Bearer {options['token']}"
+        sessions = threading.local()
+
+        def call(index):
+            if not hasattr(sessions, "session"):
+                sessions.session = requests.Session()
+                sessions.session.headers.update(headers)
+            start = time.perf_counter()
+            try:
+                response = sessions.session.request(
+                    options["method"], urls[index % len(urls)], timeout=30
+                )
+                outcome = response.status_code
+            except requests.RequestException as exc:
+                outcome = type(exc).__name__
+            return time.perf_counter() - start, outcome
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            results = list(executor.map(call, range(options["requests"])))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency * 1000 for latency, _ in results)
+        outcomes = Counter(outcome for _, outcome in results)
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{options['requests']} requests, {options['concurrency']} "
+            f"concurrent: {len(results) / elapsed:.0f} req/s, "
+            f"p50 {percentiles[49]:.1f}ms, p95 {percentiles[94]:.1f}ms, "
+            f"p99 {percentiles[98]:.1f}ms, responses {dict(outcomes)}"
+        )
@@ -0,0 +1,75 @@
+import time
+from collections import namedtuple
+
+from django.core.management import BaseCommand, CommandError
+
+from borrowing.models import Borrowing
+from payment.pricing import accrued_fine, fine_totals, rental_fee, with_prices
+
+Row = namedtuple(
+    "Row", "borrow_date expected_return_date actual_return_data book"
+)
+Book = namedtuple("Book", "daily_fee")
+
+
+class Command(BaseCommand):
+    """Django command to time pricing every borrowing of the database"""
+
+    help = (
+        "Price every borrowing of the database (see seed_library) with "
+        "the payment.pricing SQL expressions, as a total and streamed "
+        "row by row, and with the scalar functions over the loaded rows, "
+        "checking that they agree."
+    )
+
+    def handle(self, *args, **options):
+        borrowings = Borrowing.objects.all()
+        count = borrowings.count()
+        if not count:
+            raise CommandError("No borrowings, run seed_library first.")
+
+        start = time.perf_counter()
+        totals = fine_totals(borrowings)
+        self.report("SQL totals", count, start)
+
+        start = time.perf_counter()
+        sql_total = 0
+        for rental, fine in (
+            with_prices(borrowings)
+            .values_list("rental_fee", "fine")
+            .iterator(chunk_size=10_000)
+        ):
+            sql_total += fine
+        self.report("SQL rows", count, start)
+
+        start = time.perf_counter()
+        scalar_total = 0
+        rows = borrowings.values_list(
+            "borrow_date",
+            "expected_return_date",
+            "actual_return_data",
+            "book__daily_fee",
+        )
+        for borrow_date, expected, returned, daily_fee in rows.iterator(
+            chunk_size=10_000
+        ):
+            rental_fee(borrow_date, expected, daily_fee)
+            scalar_total += accrued_fine(
+                Row(borrow_date, expected, returned, Book(daily_fee))
+            )
+        self.report("Python rows", count, start)
+
+        if not totals["total"] == sql_total == scalar_total:
+            raise CommandError(
+                f"Totals differ: {totals['total']}, {sql_total}, "
+                f"{scalar_total}."
+            )
+        self.stdout.write(
+            f"{totals['count']} borrowings accrue {totals['total']} of fines"
+        )
+
+    def report(self, name, count, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{name}: {elapsed:.2f}s, {count / elapsed:,.0f} borrowings/s"
+        )
@@ -0,0 +1,97 @@
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+IMPORT_TIME_LINE = re.compile(
+    r"import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|"
+    r"(?P<indent>\s*)(?P<module>\S+)"
+)
+WATCHED_PACKAGES = ("stripe", "telebot")
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the project cold start"""
+
+    help = (
+        "Run `python -X importtime manage.py check` in fresh interpreters "
+        "and report wall time, total import time, the slowest imports "
+        "and whether the Stripe and Telegram SDKs were loaded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--top", type=int, default=10)
+
+    def handle(self, *args, **options):
+        wall_times, import_times = [], []
+        for _ in range(options["runs"]):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", "manage.py", "check"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            wall_times.append(time.perf_counter() - start)
+            imports = self.parse(result.stderr)
+            import_times.append(
+                sum(
+                    cumulative
+                    for module, cumulative, top_level in imports
+                    if top_level
+                )
+            )
+
+        wall_times.sort()
+        import_times.sort()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"manage.py check: median wall time "
+                f"{wall_times[len(wall_times) // 2] * 1000:.0f}ms, "
+                f"median import time "
+                f"{import_times[len(import_times) // 2] / 1000:.0f}ms "
+                f"over {options['runs']} runs"
+            )
+        )
+
+        loaded = {module.split(".")[0] for module, _, _ in imports}
+        for package in WATCHED_PACKAGES:
+            state = "imported" if package in loaded else "not imported"
+            self.stdout.write(f"{package}: {state}")
+
+        self.stdout.write("Slowest top-level imports (last run):")
+        slowest = sorted(
+            (entry for entry in imports if entry[2]),
+            key=lambda entry: entry[1],
+            reverse=True,
+        )
+        for module, cumulative, _ in slowest[: options["top"]]:
+            self.stdout.write(f"{cumulative / 1000:8.1f}ms  {module}")
+
+    @staticmethod
+    def parse(stderr):
+        """
+        Parse `-X importtime` output.
+
+        Returns:
+        - list: (module, cumulative microseconds, is top-level) tuples.
+        """
+
+        imports = []
+        for line in stderr.splitlines():
+            match = IMPORT_TIME_LINE.match(line)
+            if match is None:
+                continue
+            imports.append(
+                (
+                    match["module"],
+                    int(match["cumulative"]),
+                    len(match["indent"]) == 1,
+                )
+            )
+        return imports
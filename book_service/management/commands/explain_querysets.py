@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from book_service.views import BookViewSet
+from borrowing.models import Borrowing
+from borrowing.views import BorrowingViewSet
+from payment.views import PaymentViewSet
+
+
+class Command(BaseCommand):
+    """Django command to print query plans of the API querysets"""
+
+    help = (
+        "Print EXPLAIN output for the first page of every API list "
+        "queryset and for the overdue borrowings scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run the queries and show actual timings (EXPLAIN ANALYZE).",
+        )
+
+    def handle(self, *args, **options):
+        staff = get_user_model().objects.filter(is_staff=True).first()
+        member = get_user_model().objects.filter(is_staff=False).first()
+        page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+
+        for name, queryset in self.get_querysets(staff, member):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(
+                queryset[:page_size].explain(analyze=options["analyze"])
+            )
+            self.stdout.write("")
+
+    def get_querysets(self, staff, member):
+        yield "books", self.view_queryset(BookViewSet, staff)
+        yield "books ?q=", self.view_queryset(
+            BookViewSet, staff, {"q": "history"}
+        )
+        for params in ({"author": "rowling"}, {"title__startswith": "harry"}):
+            yield f"books {params}", self.view_queryset(
+                BookViewSet, staff, params
+            )
+        yield "overdue borrowings", Borrowing.objects.overdue()
+
+        users = [("staff", staff), ("member", member)]
+        for role, user in users:
+            if user is None:
+                self.stderr.write(f"No {role} user found, skipping.")
+                continue
+
+            for params in ({}, {"is_active": "true"}, {"user_id": user.id}):
+                yield (
+                    f"borrowings ({role}) {params}",
+                    self.view_queryset(BorrowingViewSet, user, params),
+                )
+            yield (
+                f"payments ({role})",
+                self.view_queryset(PaymentViewSet, user),
+            )
+
+    @staticmethod
+    def view_queryset(viewset_class, user, params=None):
+        """Build the list queryset exactly as the viewset would."""
+
+        request = Request(APIRequestFactory().get("/", params))
+        request.user = user
+        view = viewset_class(
+            request=request, action="list", format_kwarg=None, kwargs={}
+        )
+        return view.get_queryset()
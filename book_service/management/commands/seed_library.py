@@ -0,0 +1,325 @@
+import csv
+import io
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from operator import attrgetter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from book_service.cache import invalidate_books
+from book_service.management.commands.benchmark_book_search import (
+    FIRST_NAMES,
+    LAST_NAMES,
+    WORDS,
+)
+from book_service.models import Book
+from borrowing.models import Borrowing
+from payment.models import Payment
+from payment.pricing import fine, rental_fee
+from stats.rebuild import rebuild_stats
+
+SEED_PASSWORD = "library-seed"
+# Exponents of the Zipf distributions of book popularity and of reader
+# activity: a few bestsellers and regulars account for most borrowings.
+BOOK_POPULARITY = 1.1
+READER_ACTIVITY = 0.7
+HISTORY_DAYS = 730
+
+
+def zipf_weights(count, exponent):
+    """Cumulative weights of ranks 1..count, for random.choices()."""
+
+    return list(accumulate(1 / rank**exponent for rank in range(1, count + 1)))
+
+
+def reserve_ids(model, count):
+    """
+    Take `count` consecutive ids from the sequence of the model's table.
+
+    Rows are inserted with explicit ids, so borrowings and payments can
+    reference rows of the same run without reading them back.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, %s)",
+            [model._meta.db_table, model._meta.pk.column],
+        )
+        (sequence,) = cursor.fetchone()
+        cursor.execute(
+            "SELECT setval(%s, nextval(%s) + %s - 1)",
+            [sequence, sequence, count],
+        )
+        (last_id,) = cursor.fetchone()
+    return range(last_id - count + 1, last_id + 1)
+
+
+class Command(BaseCommand):
+    """Django command to fill the database with a large synthetic library"""
+
+    help = (
+        "Generate users, books, borrowings and payments at production "
+        "scale, deterministically for a given --seed. Book popularity and "
+        "reader activity follow Zipf distributions, a share of the "
+        "borrowings is active or overdue and late returns carry fines. "
+        "Rows are written with COPY, or with bulk_create with --method "
+        "bulk (borrow_date is then the insert date, as auto_now_add sets "
+        "it). Everything is inserted in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--books", type=int, default=200_000)
+        parser.add_argument("--borrowings", type=int, default=2_000_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--method", choices=("copy", "bulk"), default="copy"
+        )
+        parser.add_argument(
+            "--active",
+            type=float,
+            default=0.07,
+            help="Share of borrowings not returned and not due yet.",
+        )
+        parser.add_argument(
+            "--overdue",
+            type=float,
+            default=0.03,
+            help="Share of borrowings not returned after the due date.",
+        )
+        parser.add_argument(
+            "--late",
+            type=float,
+            default=0.15,
+            help="Share of returned borrowings returned late, with a fine.",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.options = options
+        self.now = timezone.now()
+        self.today = date.today()
+        self.password = make_password(SEED_PASSWORD)
+        self.daily_fees = []
+        if options["borrowings"] and not (
+            options["users"] and options["books"]
+        ):
+            raise CommandError("Borrowings need --users and --books.")
+
+        with transaction.atomic():
+            user_ids = self.timed(
+                get_user_model(), options["users"], self.generate_users
+            )
+            book_ids = self.timed(Book, options["books"], self.generate_books)
+            # The lowest ids are the bestsellers and the regulars.
+            self.book_weights = zipf_weights(len(book_ids), BOOK_POPULARITY)
+            self.user_weights = zipf_weights(len(user_ids), READER_ACTIVITY)
+            self.timed(
+                Borrowing,
+                options["borrowings"],
+                lambda ids: self.generate_borrowings(ids, user_ids, book_ids),
+            )
+
+        with connection.cursor() as cursor:
+            for model in (get_user_model(), Book, Borrowing, Payment):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+        invalidate_books(())
+
+        # The rows were inserted in bulk, past the incremental updates.
+        start = time.perf_counter()
+        rebuild_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"stats rebuilt in {time.perf_counter() - start:.1f}s"
+            )
+        )
+
+    def timed(self, model, count, generate):
+        """
+        Insert `count` rows of the model in batches and report the rate.
+
+        Args:
+        - generate (callable): Gets the ids of a batch, returns the
+          instances to insert, grouped by model.
+
+        Returns:
+        - range: Ids of the inserted rows.
+        """
+
+        ids = reserve_ids(model, count) if count else range(0)
+        rows = {}
+        start = time.perf_counter()
+        batch_size = self.options["batch_size"]
+        for offset in range(0, count, batch_size):
+            batch = ids[offset:offset + batch_size]
+            for batch_model, objects in generate(batch).items():
+                self.insert(batch_model, objects)
+                rows[batch_model] = rows.get(batch_model, 0) + len(objects)
+        elapsed = time.perf_counter() - start
+
+        for batch_model, inserted in rows.items():
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{batch_model._meta.verbose_name_plural}: {inserted} "
+                    f"rows in {elapsed:.1f}s "
+                    f"({inserted / max(elapsed, 1e-9):.0f} rows/s)"
+                )
+            )
+        return ids
+
+    def insert(self, model, objects):
+        if not objects:
+            return
+        if self.options["method"] == "bulk":
+            model.objects.bulk_create(objects)
+            return
+
+        fields = model._meta.concrete_fields
+        values = attrgetter(*(field.attname for field in fields))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objects:
+            # Dates, decimals and ids are written as their str(), \N marks
+            # NULL and an empty field is an empty string.
+            writer.writerow(
+                r"\N" if value is None else value for value in values(obj)
+            )
+        buffer.seek(0)
+
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {quote(model._meta.db_table)} ({columns}) "
+                r"FROM STDIN WITH (FORMAT csv, NULL '\N')",
+                buffer,
+            )
+
+    def generate_users(self, ids):
+        return {
+            get_user_model(): [
+                get_user_model()(
+                    id=user_id,
+                    email=f"reader{user_id}@library.example",
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    password=self.password,
+                    date_joined=self.now
+                    - timedelta(days=self.rng.randint(0, HISTORY_DAYS)),
+                )
+                for user_id in ids
+            ]
+        }
+
+    def generate_books(self, ids):
+        books = [
+            Book(
+                id=book_id,
+                title=" ".join(
+                    self.rng.sample(WORDS, self.rng.randint(2, 5))
+                ).capitalize(),
+                author=(
+                    f"{self.rng.choice(FIRST_NAMES)} "
+                    f"{self.rng.choice(LAST_NAMES)}"
+                ),
+                cover=self.rng.choice(Book.CoverChoices.values),
+                inventory=self.rng.randint(0, 10),
+                daily_fee=Decimal(self.rng.randint(10, 300)) / 100,
+                updated_at=self.now,
+            )
+            for book_id in ids
+        ]
+        self.daily_fees.extend(book.daily_fee for book in books)
+        return {Book: books}
+
+    def generate_borrowings(self, ids, user_ids, book_ids):
+        books = self.rng.choices(
+            range(len(book_ids)), cum_weights=self.book_weights, k=len(ids)
+        )
+        users = self.rng.choices(
+            user_ids, cum_weights=self.user_weights, k=len(ids)
+        )
+        borrowings = []
+        payments = []
+        for borrowing_id, book, user_id in zip(ids, books, users):
+            borrowing = self.generate_borrowing(borrowing_id, book_ids[book])
+            borrowing.user_id = user_id
+            borrowings.append(borrowing)
+            payments.extend(
+                self.generate_payments(borrowing, self.daily_fees[book])
+            )
+        for payment, payment_id in zip(
+            payments, reserve_ids(Payment, len(payments))
+        ):
+            payment.id = payment_id
+        return {Borrowing: borrowings, Payment: payments}
+
+    def generate_borrowing(self, borrowing_id, book_id):
+        rng = self.rng
+        loan_days = rng.randint(7, 30)
+        share = rng.random()
+        returned = None
+        if share < self.options["overdue"]:
+            expected = self.today - timedelta(days=rng.randint(1, 60))
+        elif share < self.options["overdue"] + self.options["active"]:
+            expected = self.today + timedelta(days=rng.randint(0, loan_days))
+        else:
+            expected = self.today - timedelta(
+                days=rng.randint(1, HISTORY_DAYS)
+            )
+            if rng.random() < self.options["late"]:
+                returned = expected + timedelta(days=rng.randint(1, 20))
+            else:
+                returned = expected - timedelta(days=rng.randint(0, loan_days))
+            returned = min(returned, self.today)
+        return Borrowing(
+            id=borrowing_id,
+            borrow_date=expected - timedelta(days=loan_days),
+            expected_return_date=expected,
+            actual_return_data=returned,
+            book_id=book_id,
+            updated_at=self.now,
+        )
+
+    def generate_payments(self, borrowing, daily_fee):
+        """The rental payment and, for a late return, the fine."""
+
+        paid = Payment.StatusChoices.PAID.value
+        pending = Payment.StatusChoices.PENDING.value
+        payments = [
+            Payment(
+                borrowing_id=borrowing.id,
+                type=Payment.TypeChoices.PAYMENT.value,
+                status=paid if self.rng.random() < 0.95 else pending,
+                session_id=f"cs_seed_{borrowing.id}",
+                money_to_pay=rental_fee(
+                    borrowing.borrow_date,
+                    borrowing.expected_return_date,
+                    daily_fee,
+                ),
+                updated_at=self.now,
+            )
+        ]
+        returned = borrowing.actual_return_data
+        if returned and returned > borrowing.expected_return_date:
+            payments.append(
+                Payment(
+                    borrowing_id=borrowing.id,
+                    type=Payment.TypeChoices.FINE.value,
+                    status=paid if self.rng.random() < 0.8 else pending,
+                    session_id=f"cs_seed_fine_{borrowing.id}",
+                    money_to_pay=fine(
+                        borrowing.expected_return_date, daily_fee, returned
+                    ),
+                    updated_at=self.now,
+                )
+            )
+        return payments
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:22
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+import book_service.indexes
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book_service", "0001_initial"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="book",
+            index=book_service.indexes.PostgresGinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "title", "author", config="english"
+                ),
+                name="book_search_vector_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=book_service.indexes.PostgresGinIndex(
+                fields=["title"],
+                name="book_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=book_service.indexes.PostgresGinIndex(
+                fields=["author"],
+                name="book_author_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.9 on 2026-10-18 20:22
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+import book_service.indexes
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book_service", "0003_book_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="book",
+            index=book_service.indexes.PostgresGinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("title"),
+                    name="gin_trgm_ops",
+                ),
+                name="book_title_upper_trgm_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=book_service.indexes.PostgresGinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("author"),
+                    name="gin_trgm_ops",
+                ),
+                name="book_author_upper_trgm_idx",
+            ),
+        ),
+    ]
@@ -1,9 +1,19 @@
 import os.path
 import uuid
 
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.search import SearchVector
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.utils.text import slugify
 
+from book_service.indexes import PostgresGinIndex
+
+# Shared by the full-text index and the search queries, so Postgres
+# can match the indexed expression.
+BOOK_SEARCH_VECTOR = SearchVector("title", "author", config="english")
+
 
 def book_image_file_path(instance, filename):
     _, extension = os.path.splitext(filename)
@@ -24,6 +34,39 @@ class Book(models.Model):
     )
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Set by the checkouts and returns instead of the indexed updated_at,
+    # which then only changes with the description of the book.
+    inventory_updated_at = models.DateTimeField(
+        default=timezone.now, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            PostgresGinIndex(
+                BOOK_SEARCH_VECTOR, name="book_search_vector_idx"
+            ),
+            PostgresGinIndex(
+                fields=["title"],
+                name="book_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            PostgresGinIndex(
+                fields=["author"],
+                name="book_author_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            # The ?author= and ?title__startswith= filters compare
+            # UPPER(column) LIKE UPPER(pattern).
+            PostgresGinIndex(
+                OpClass(Upper("title"), name="gin_trgm_ops"),
+                name="book_title_upper_trgm_idx",
+            ),
+            PostgresGinIndex(
+                OpClass(Upper("author"), name="gin_trgm_ops"),
+                name="book_author_upper_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title}({self.author})"
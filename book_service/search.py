@@ -0,0 +1,68 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from book_service.models import BOOK_SEARCH_VECTOR
+
+
+def search_books(queryset, query):
+    """Filter books by a free-text query and order them by relevance.
+
+    On Postgres the query is matched against the full-text index on
+    title and author, with trigram similarity catching typos and
+    partial words. Other databases (e.g. SQLite test runs) fall back
+    to case-insensitive substring matching.
+
+    Args:
+        queryset (QuerySet): Books to search in.
+        query (str): Text entered by the user.
+    """
+
+    if connections[queryset.db].vendor == "postgresql":
+        return _search_postgres(queryset, query)
+    return _search_fallback(queryset, query)
+
+
+def _search_postgres(queryset, query):
+    search_query = SearchQuery(
+        query, config="english", search_type="websearch"
+    )
+    return (
+        queryset.annotate(
+            search=BOOK_SEARCH_VECTOR,
+            rank=SearchRank(F("search"), search_query)
+            + Greatest(
+                TrigramSimilarity("title", query),
+                TrigramSimilarity("author", query),
+            ),
+        )
+        .filter(
+            Q(search=search_query)
+            | Q(title__trigram_similar=query)
+            | Q(author__trigram_similar=query)
+        )
+        .order_by("-rank", "id")
+    )
+
+
+def _search_fallback(queryset, query):
+    return (
+        queryset.filter(
+            Q(title__icontains=query) | Q(author__icontains=query)
+        )
+        .annotate(
+            rank=Case(
+                When(title__iexact=query, then=Value(1.0)),
+                When(title__istartswith=query, then=Value(0.75)),
+                When(title__icontains=query, then=Value(0.5)),
+                default=Value(0.25),
+                output_field=FloatField(),
+            )
+        )
+        .order_by("-rank", "id")
+    )
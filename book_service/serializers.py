@@ -6,4 +6,4 @@ from book_service.models import Book
 class BookSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
-        fields = "__all__"
+        exclude = ("inventory_updated_at",)
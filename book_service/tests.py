@@ -1,3 +1,293 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from book_service.cache import LOCK_RETRIES, read_through
+from book_service.inventory import reserve_book, release_book
+from book_service.management.commands.explain_querysets import (
+    Command as ExplainQuerysetsCommand,
+)
+from book_service.models import Book
+from book_service.search import _search_fallback
+from book_service.views import BookViewSet
+
+BOOK_URL = reverse("book_service:book-list")
+
+# Postgres features: search ranking and typo tolerance (other databases
+# fall back to _search_fallback), query plans, COPY and sequences.
+postgres_only = skipUnless(
+    connection.vendor == "postgresql", "Needs Postgres."
+)
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Test",
+        "author": "Test Test",
+        "cover": "Hard cover",
+        "inventory": 2,
+        "daily_fee": 0.1,
+    }
+    defaults.update(params)
+    return Book.objects.create(**defaults)
+
+
+class InventoryTests(TestCase):
+    def test_reserve_book_decrements_inventory(self):
+        book = sample_book(inventory=1)
+
+        self.assertTrue(reserve_book(book.id))
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_reserve_book_out_of_stock(self):
+        book = sample_book(inventory=0)
+
+        self.assertFalse(reserve_book(book.id))
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_release_book_increments_inventory(self):
+        book = sample_book(inventory=0)
+
+        release_book(book.id)
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 1)
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+    def test_concurrent_checkouts_never_oversell(self):
+        inventory = 20
+        attempts = 100
+        book = sample_book(inventory=inventory)
+
+        def checkout(_):
+            try:
+                return reserve_book(book.id)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(checkout, range(attempts)))
+
+        book.refresh_from_db()
+        self.assertEqual(sum(results), inventory)
+        self.assertEqual(book.inventory, 0)
+
+
+class BookSearchApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.potter = sample_book(
+            title="Harry Potter and the Chamber of Secrets",
+            author="J. K. Rowling",
+        )
+        self.hobbit = sample_book(
+            title="The Hobbit", author="J. R. R. Tolkien"
+        )
+        self.rings = sample_book(
+            title="The Lord of the Rings", author="J. R. R. Tolkien"
+        )
+
+    def get_titles(self, params):
+        response = self.client.get(BOOK_URL, params)
+        return [book["title"] for book in response.data["results"]]
+
+    @postgres_only
+    def test_search_by_title_words(self):
+        self.assertEqual(
+            self.get_titles({"q": "chamber secrets"}), [self.potter.title]
+        )
+
+    @postgres_only
+    def test_search_by_author(self):
+        titles = self.get_titles({"q": "tolkien"})
+
+        self.assertCountEqual(titles, [self.hobbit.title, self.rings.title])
+
+    @postgres_only
+    def test_search_tolerates_typos(self):
+        self.assertEqual(self.get_titles({"q": "Hobit"}), [self.hobbit.title])
+
+    @postgres_only
+    def test_search_ranks_best_match_first(self):
+        titles = self.get_titles({"q": "lord rings tolkien"})
+
+        self.assertEqual(titles[0], self.rings.title)
+
+    def test_filter_by_author(self):
+        titles = self.get_titles({"author": "rowling"})
+
+        self.assertEqual(titles, [self.potter.title])
+
+    def test_filter_by_title_prefix(self):
+        titles = self.get_titles({"title__startswith": "the "})
+
+        self.assertCountEqual(titles, [self.hobbit.title, self.rings.title])
+
+    @postgres_only
+    def test_filters_use_trigram_indexes(self):
+        # Too few rows for the planner to prefer an index by itself.
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        for params, index in (
+            ({"author": "rowling"}, "book_author_upper_trgm_idx"),
+            ({"title__startswith": "harry"}, "book_title_upper_trgm_idx"),
+        ):
+            queryset = ExplainQuerysetsCommand.view_queryset(
+                BookViewSet, None, params
+            )
+            self.assertIn(f"Index Scan on {index}", queryset.explain())
+
+    def test_fallback_search_ranks_prefix_first(self):
+        books = _search_fallback(Book.objects.all(), "the")
+
+        self.assertEqual(
+            [book.title for book in books],
+            [self.hobbit.title, self.rings.title, self.potter.title],
+        )
+
+
+class BookPaginationApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.books = [sample_book(title=f"Book {i}") for i in range(3)]
+
+    def test_offset_pagination_is_default(self):
+        response = self.client.get(BOOK_URL, {"limit": 2})
+
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_cursor_pagination_pages_by_id_without_count(self):
+        # The page itself and the aggregate behind its ETag.
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                BOOK_URL, {"pagination": "cursor", "limit": 2}
+            )
+
+        self.assertNotIn("count", response.data)
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]],
+            [self.books[2].id, self.books[1].id],
+        )
+
+        response = self.client.get(response.data["next"])
+
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]],
+            [self.books[0].id],
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_search_is_not_paginated_with_a_cursor(self):
+        for params in (
+            {"q": "Book", "pagination": "cursor"},
+            {"q": "Book", "cursor": "cD0z"},
+        ):
+            response = self.client.get(BOOK_URL, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("pagination", response.data)
+
+        response = self.client.get(BOOK_URL, {"q": "Book", "limit": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 3)
+
+
+class BookCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = sample_book(inventory=1)
+        self.detail_url = reverse(
+            "book_service:book-detail", args=[self.book.id]
+        )
+
+    def test_repeated_reads_are_served_from_cache(self):
+        for url in (BOOK_URL, self.detail_url):
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_book_save_invalidates_detail_and_list(self):
+        self.client.get(BOOK_URL)
+        self.client.get(self.detail_url)
+
+        self.book.title = "New title"
+        self.book.save()
+
+        self.assertEqual(
+            self.client.get(self.detail_url).data["title"], "New title"
+        )
+        self.assertEqual(
+            self.client.get(BOOK_URL).data["results"][0]["title"],
+            "New title",
+        )
+
+    def test_inventory_changes_invalidate(self):
+        self.client.get(self.detail_url)
+
+        reserve_book(self.book.id)
+        self.assertEqual(self.client.get(self.detail_url).data["inventory"], 0)
+
+        release_book(self.book.id)
+        self.assertEqual(self.client.get(self.detail_url).data["inventory"], 1)
+
+    def test_deleted_book_is_not_served(self):
+        self.client.get(self.detail_url)
+
+        self.book.delete()
+
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+
+    def test_waits_for_the_value_computed_by_lock_holder(self):
+        cache.add("key:lock", 1)
+        calls = []
+
+        def sleep(seconds):
+            cache.set("key", "computed elsewhere")
+
+        with mock.patch("book_service.cache.time.sleep", sleep):
+            value = read_through("key", lambda: calls.append(1), "detail")
+
+        self.assertEqual(value, "computed elsewhere")
+        self.assertEqual(calls, [])
+
+    def test_gives_up_waiting_and_computes(self):
+        cache.add("key:lock", 1)
+        sleeps = []
+
+        with mock.patch("book_service.cache.time.sleep", sleeps.append):
+            value = read_through("key", lambda: "computed", "detail")
+
+        self.assertEqual(value, "computed")
+        self.assertEqual(len(sleeps), LOCK_RETRIES)
+
+
+class BookQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.books = [sample_book(title=f"Book {i}") for i in range(5)]
+
+    def test_list(self):
+        # ETag aggregate, page count, page rows.
+        with self.assertNumQueries(3):
+            response = self.client.get(BOOK_URL)
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_detail(self):
+        url = reverse("book_service:book-detail", args=[self.books[0].id])
+
+        # ETag aggregate, book row.
+        with self.assertNumQueries(2):
+            self.client.get(url)
@@ -1,12 +1,121 @@
+from functools import partial
+
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 
+from book_service.cache import book_key, list_page_key, read_through
 from book_service.models import Book
 from book_service.permissions import AnonReadOnly
+from book_service.search import search_books
 from book_service.serializers import BookSerializer
+from library_service_project.conditional import ConditionalGetMixin
+from library_service_project.pagination import CursorOrOffsetPagination
+
+
+class BookPagination(CursorOrOffsetPagination):
+    """
+    Search results are ordered by rank, not by the id of the keyset,
+    so ?q= is only paginated with offsets.
+    """
+
+    def use_cursor(self, request):
+        use_cursor = super().use_cursor(request)
+        if use_cursor and request.query_params.get("q"):
+            raise ValidationError(
+                {
+                    self.mode_query_param: (
+                        "Search results cannot be paginated with a cursor."
+                    )
+                }
+            )
+        return use_cursor
+
+
+class CachedCatalogMixin:
+    """Serve list pages and book details through the catalog cache."""
+
+    def catalog_cache_key(self):
+        if self.action == "list":
+            return list_page_key(self.request.build_absolute_uri())
+        return book_key(self.kwargs["pk"])
 
+    def list(self, request, *args, **kwargs):
+        list_page = partial(super().list, request, *args, **kwargs)
+        data = read_through(
+            self.catalog_cache_key(), lambda: list_page().data, "list"
+        )
+        return Response(data)
 
-# Create your views here.
-class BookViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        retrieve = partial(super().retrieve, request, *args, **kwargs)
+        data = read_through(
+            self.catalog_cache_key(), lambda: retrieve().data, "detail"
+        )
+        return Response(data)
+
+
+class BookViewSet(
+    ConditionalGetMixin,
+    CachedCatalogMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = (AnonReadOnly,)
+    pagination_class = BookPagination
+    # The inventory is shown, its changes leave updated_at alone.
+    conditional_fields = ("updated_at", "inventory_updated_at")
+
+    def get_queryset(self):
+        queryset = self.queryset
+        if self.action != "list":
+            return queryset
+
+        query = self.request.query_params.get("q")
+        author = self.request.query_params.get("author")
+        title_prefix = self.request.query_params.get("title__startswith")
+        if author:
+            queryset = queryset.filter(author__icontains=author)
+        if title_prefix:
+            queryset = queryset.filter(title__istartswith=title_prefix)
+        if query:
+            queryset = search_books(queryset, query)
+        return queryset
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                type=str,
+                description="Full-text search by title and author, results are ranked by relevance and paginated with offsets only (ex. ?q=harry potter)",
+                required=False,
+            ),
+            OpenApiParameter(
+                "author",
+                type=str,
+                description="Filter by author, case-insensitive (ex. ?author=rowling)",
+                required=False,
+            ),
+            OpenApiParameter(
+                "title__startswith",
+                type=str,
+                description="Filter by title prefix, case-insensitive (ex. ?title__startswith=harry)",
+                required=False,
+            ),
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def get_validators(self, queryset):
+        # Cached under the same versions as the pages, so a poll of an
+        # unchanged catalog does not even run the aggregate query.
+        get_validators = partial(super().get_validators, queryset)
+        return read_through(
+            f"{self.catalog_cache_key()}:"
+            f"{self.request.accepted_media_type}:validators",
+            get_validators,
+            "validators",
+        )
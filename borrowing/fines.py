@@ -0,0 +1,92 @@
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from borrowing.models import Borrowing, FineBalance, OutstandingFine
+from payment.pricing import fine_expression, late
+
+
+def _upsert(model, objs, unique_field, fields):
+    model.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=[unique_field],
+        update_fields=[*fields, "updated_at"],
+    )
+
+
+def accrue_fines(on_date=None, chunk_size=5000):
+    """
+    Precompute the outstanding fine of every late borrowing and the
+    balance of every user owing one, as of the date (today).
+
+    The late borrowings are walked in chunks of their ids, each chunk
+    is priced in SQL (payment.pricing) and upserted with a single
+    INSERT ... ON CONFLICT statement, as are the user balances. Rows
+    of an earlier run that were not refreshed, the borrowings returned
+    and the users who paid since, are deleted at the end.
+
+    Returns:
+    - dict: The number of late borrowings, of users owing a fine and
+      the total of their fines.
+    """
+
+    on_date = on_date or date.today()
+    borrowings = Borrowing.objects.filter(late(on_date)).order_by("id")
+    last_id = 0
+    while True:
+        chunk = list(
+            borrowings.filter(id__gt=last_id)
+            .annotate(fine=fine_expression(on_date))
+            .values_list("id", "user_id", "fine")[:chunk_size]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        _upsert(
+            OutstandingFine,
+            [
+                OutstandingFine(
+                    borrowing_id=borrowing_id,
+                    user_id=user_id,
+                    amount=fine,
+                    accrued_on=on_date,
+                )
+                for borrowing_id, user_id, fine in chunk
+            ],
+            "borrowing",
+            ["amount", "accrued_on"],
+        )
+
+    with transaction.atomic():
+        # A borrowing returned while its chunk was priced is dropped too.
+        OutstandingFine.objects.filter(
+            Q(accrued_on__lt=on_date)
+            | Q(borrowing__actual_return_data__isnull=False)
+        ).delete()
+        balances = (
+            OutstandingFine.objects.order_by("user_id")
+            .values("user_id")
+            .annotate(amount=Sum("amount"), borrowings=Count("pk"))
+        )
+        users = last_id = 0
+        while True:
+            rows = list(balances.filter(user_id__gt=last_id)[:chunk_size])
+            if not rows:
+                break
+            last_id = rows[-1]["user_id"]
+            users += len(rows)
+            _upsert(
+                FineBalance,
+                [FineBalance(accrued_on=on_date, **row) for row in rows],
+                "user",
+                ["amount", "borrowings", "accrued_on"],
+            )
+        FineBalance.objects.filter(accrued_on__lt=on_date).delete()
+
+    return {
+        "borrowings": OutstandingFine.objects.count(),
+        "users": users,
+        "total": FineBalance.objects.aggregate(total=Sum("amount"))["total"],
+    }
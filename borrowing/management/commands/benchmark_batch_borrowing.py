@@ -0,0 +1,125 @@
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from book_service.models import Book
+from borrowing.views import BorrowingViewSet
+from library_service_project.celery import app
+from notification.models import Notification
+from payment.models import Payment
+
+
+class Command(BaseCommand):
+    """Django command to compare batch borrowing with single borrowings"""
+
+    help = (
+        "Borrow N books with N POST /api/borrowing/ calls and with one "
+        "POST /api/borrowing/batch/ call, in a transaction that is rolled "
+        "back afterwards, and report time, queries, Stripe sessions and "
+        "notifications of both. Stripe is replaced by the fake backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=5)
+        parser.add_argument("--rounds", type=int, default=20)
+
+    @override_settings(
+        STRIPE_BACKEND="payment.stripe_backends.FakeStripeBackend"
+    )
+    def handle(self, *args, **options):
+        app.conf.task_always_eager = True
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email="batch-benchmark@example.com"
+            )
+            expected_return_date = date.today() + timedelta(days=7)
+            factory = APIRequestFactory(HTTP_HOST="localhost")
+
+            def single_calls(books):
+                view = BorrowingViewSet.as_view({"post": "create"})
+                for book in books:
+                    request = factory.post(
+                        "/api/borrowing/",
+                        {
+                            "book": book.id,
+                            "expected_return_date": expected_return_date,
+                        },
+                        format="json",
+                    )
+                    force_authenticate(request, user)
+                    view(request)
+
+            def batch_call(books):
+                view = BorrowingViewSet.as_view({"post": "batch"})
+                request = factory.post(
+                    "/api/borrowing/batch/",
+                    {
+                        "books": [book.id for book in books],
+                        "expected_return_date": expected_return_date,
+                    },
+                    format="json",
+                )
+                force_authenticate(request, user)
+                view(request)
+
+            for name, checkout in (
+                ("single", single_calls),
+                ("batch", batch_call),
+            ):
+                self.measure(name, checkout, options)
+
+            transaction.set_rollback(True)
+
+    def measure(self, name, checkout, options):
+        elapsed = 0
+        queries = 0
+        notifications = Notification.objects.count()
+        payments = Payment.objects.count()
+        for _ in range(options["rounds"]):
+            books = Book.objects.bulk_create(
+                Book(
+                    title=f"Batch benchmark book {i}",
+                    author="Benchmark",
+                    cover=Book.CoverChoices.SOFT.value,
+                    inventory=1,
+                    daily_fee=1,
+                )
+                for i in range(options["books"])
+            )
+            callbacks = len(connection.run_on_commit)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                checkout(books)
+                elapsed += time.perf_counter() - start
+            queries += len(captured)
+
+            # This transaction is never committed, run the on_commit
+            # callbacks requesting the Stripe sessions by hand.
+            for _, callback, _ in connection.run_on_commit[callbacks:]:
+                callback()
+            del connection.run_on_commit[callbacks:]
+        notifications = Notification.objects.count() - notifications
+        new_payments = Payment.objects.count() - payments
+        sessions = len(
+            set(
+                Payment.objects.order_by("-id").values_list(
+                    "session_id", flat=True
+                )[:new_payments]
+            )
+        )
+
+        rounds = options["rounds"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{name}: {options['books']} books in "
+                f"{elapsed / rounds * 1000:.1f}ms, "
+                f"{queries / rounds:.0f} queries, "
+                f"{sessions / rounds:.0f} Stripe sessions, "
+                f"{notifications / rounds:.0f} notifications per checkout"
+            )
+        )
@@ -0,0 +1,115 @@
+import resource
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from borrowing.models import Borrowing
+from borrowing.views import BORROWING_EXPORT_COLUMNS
+from library_service_project.export import EXPORT_WRITERS
+from payment.models import Payment
+from payment.views import PAYMENT_EXPORT_COLUMNS
+
+EXPORTS = {
+    "borrowings": (
+        "borrowing:borrowing-export",
+        Borrowing,
+        BORROWING_EXPORT_COLUMNS,
+    ),
+    "payments": ("payments:payment-export", Payment, PAYMENT_EXPORT_COLUMNS),
+}
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux, the high-water mark of the process.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    """Django command to time the streaming exports"""
+
+    help = (
+        "Stream the borrowing and payment exports of the database (see "
+        "seed_library) through the API as staff, in every format, and "
+        "report rows per second and the peak RSS of the process. With "
+        "--in-memory, the same rows are then also loaded whole before "
+        "being written, for comparison. The peak RSS only grows, so "
+        "that run comes last."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--export", choices=list(EXPORTS), action="append")
+        parser.add_argument(
+            "--format", choices=list(EXPORT_WRITERS), action="append"
+        )
+        parser.add_argument("--in-memory", action="store_true")
+
+    # DEBUG would keep every query, and the toolbar the response.
+    @override_settings(DEBUG=False, ALLOWED_HOSTS=["testserver"])
+    def handle(self, *args, **options):
+        exports = options["export"] or list(EXPORTS)
+        formats = options["format"] or list(EXPORT_WRITERS)
+        if not Borrowing.objects.exists():
+            raise CommandError("No borrowings, run seed_library first.")
+
+        client = APIClient()
+        # An unsaved staff user, no row is written.
+        client.force_authenticate(get_user_model()(is_staff=True))
+        self.stdout.write(f"Peak RSS before: {peak_rss_mib():.0f} MiB")
+
+        for name in exports:
+            url_name, _, _ = EXPORTS[name]
+            for export_format in formats:
+                start = time.perf_counter()
+                response = client.get(
+                    reverse(url_name), {"export_format": export_format}
+                )
+                if response.status_code != 200:
+                    raise CommandError(
+                        f"{name} export failed: {response.status_code}"
+                    )
+                lines = size = 0
+                for chunk in response.streaming_content:
+                    lines += chunk.count(b"\n")
+                    size += len(chunk)
+                rows = lines - (export_format == "csv")
+                self.report(
+                    f"{name} {export_format} streamed",
+                    rows,
+                    size,
+                    time.perf_counter() - start,
+                )
+
+        if options["in_memory"]:
+            for name in exports:
+                _, model, columns = EXPORTS[name]
+                for export_format in formats:
+                    start = time.perf_counter()
+                    rows = list(
+                        model.objects.order_by("id").values_list(
+                            *(field for _, field in columns)
+                        )
+                    )
+                    size = sum(
+                        len(chunk.encode())
+                        for chunk in EXPORT_WRITERS[export_format](
+                            [column for column, _ in columns], rows
+                        )
+                    )
+                    self.report(
+                        f"{name} {export_format} in memory",
+                        len(rows),
+                        size,
+                        time.perf_counter() - start,
+                    )
+                    del rows
+
+    def report(self, name, rows, size, elapsed):
+        self.stdout.write(
+            f"{name}: {rows} rows, {size / 1024 / 1024:.0f} MiB "
+            f"in {elapsed:.2f}s, {rows / elapsed:,.0f} rows/s, "
+            f"peak RSS {peak_rss_mib():.0f} MiB"
+        )
@@ -0,0 +1,105 @@
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from borrowing.notifications import (
+    OVERDUE_HEADER,
+    chunk_messages,
+    overdue_report_lines,
+)
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the overdue borrowings report"""
+
+    help = (
+        "Seed active borrowings (500k by default) in a transaction that is "
+        "rolled back afterwards and time the overdue report pipeline, "
+        "without sending anything to Telegram."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--borrowings", type=int, default=500_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--books", type=int, default=5_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--chunk-size", type=int, default=2_000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options)
+            self.measure(options["chunk_size"])
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        rng = random.Random(options["seed"])
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"overdue-benchmark-{i}@example.com")
+            for i in range(options["users"])
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Benchmark book {i}",
+                author="Benchmark",
+                cover=Book.CoverChoices.SOFT.value,
+                inventory=1,
+                daily_fee=1,
+            )
+            for i in range(options["books"])
+        )
+
+        today = date.today()
+        start = time.perf_counter()
+        for offset in range(0, options["borrowings"], options["batch_size"]):
+            size = min(
+                options["batch_size"], options["borrowings"] - offset
+            )
+            Borrowing.objects.bulk_create(
+                Borrowing(
+                    book=rng.choice(books),
+                    user=rng.choice(users),
+                    expected_return_date=(
+                        today + timedelta(days=rng.randint(-30, 30))
+                    ),
+                )
+                for _ in range(size)
+            )
+        self.stdout.write(
+            f"Seeded {options['borrowings']} active borrowings "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+    def measure(self, chunk_size):
+        tracemalloc.start()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            messages = chunk_messages(
+                OVERDUE_HEADER, overdue_report_lines(chunk_size=chunk_size)
+            )
+            count = total_size = largest = 0
+            for message in messages:
+                count += 1
+                total_size += len(message)
+                largest = max(largest, len(message))
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        overdue = Borrowing.objects.overdue().count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{overdue} overdue borrowings -> {count} messages "
+                f"({total_size} chars, largest {largest}) "
+                f"in {elapsed:.2f}s, {len(queries)} queries, "
+                f"peak Python memory {peak / 1024 / 1024:.1f} MiB"
+            )
+        )
@@ -2,9 +2,58 @@ from datetime import date
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.utils import timezone
 
+from book_service.inventory import release_book, release_books
 from book_service.models import Book
+from stats.counters import record_returns
+
+
+class BorrowingQuerySet(models.QuerySet):
+    def active(self):
+        """Borrowings whose book has not been returned yet."""
+        return self.filter(actual_return_data__isnull=True)
+
+    def overdue(self, on_date=None):
+        """Active borrowings due on or before the given date (today)."""
+        return self.active().filter(
+            expected_return_date__lte=on_date or date.today()
+        )
+
+    def return_books(self):
+        """
+        Mark the active borrowings as returned and release their books.
+
+        The rows are locked first, so a concurrent Borrowing.return_book()
+        of one of them waits and then finds it already returned.
+
+        Returns:
+        - int: Number of borrowings returned.
+        """
+
+        with transaction.atomic():
+            borrowings = list(
+                self.active()
+                .select_for_update()
+                .values_list("id", "book_id", "expected_return_date")
+            )
+            if not borrowings:
+                return 0
+            borrowing_ids = [borrowing_id for borrowing_id, *_ in borrowings]
+            self.model.objects.filter(id__in=borrowing_ids).update(
+                actual_return_data=date.today(), updated_at=timezone.now()
+            )
+            release_books(book_id for _, book_id, _ in borrowings)
+            record_returns(
+                (book_id, expected) for _, book_id, expected in borrowings
+            )
+            # Their fines are paid.
+            OutstandingFine.objects.filter(
+                borrowing_id__in=borrowing_ids
+            ).settle()
+        return len(borrowings)
 
 
 class Borrowing(models.Model):
@@ -15,6 +64,22 @@ class Borrowing(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = BorrowingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "actual_return_data"],
+                name="borrowing_user_returned_idx",
+            ),
+            models.Index(
+                fields=["expected_return_date"],
+                name="borrowing_overdue_idx",
+                condition=models.Q(actual_return_data__isnull=True),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.full_name} borrowing {self.book.title}"
@@ -25,10 +90,35 @@ class Borrowing(models.Model):
             raise error_to_raise({"book": "This book is out of stock."})
 
     def clean(self):
-        Borrowing.valid_inventory_book(
-            self.book.inventory,
-            ValidationError,
-        )
+        if self._state.adding:
+            Borrowing.valid_inventory_book(
+                self.book.inventory,
+                ValidationError,
+            )
+
+    def return_book(self):
+        """
+        Mark the borrowing as returned and put the book back on the shelf.
+
+        The return date is set with a conditional UPDATE, so a borrowing
+        returned twice at the same time releases its copy only once.
+
+        Returns:
+        - bool: False if the borrowing had already been returned.
+        """
+
+        today = date.today()
+        with transaction.atomic():
+            returned = Borrowing.objects.filter(
+                pk=self.pk, actual_return_data__isnull=True
+            ).update(actual_return_data=today, updated_at=timezone.now())
+            if returned:
+                release_book(self.book_id)
+                record_returns([(self.book_id, self.expected_return_date)])
+
+        if returned:
+            self.actual_return_data = today
+        return bool(returned)
 
     def save(
         self,
@@ -37,7 +127,92 @@ class Borrowing(models.Model):
         using=None,
         update_fields=None,
     ):
-        self.full_clean()
+        # Foreign keys are enforced by the database, skip the extra
+        # existence queries for book and user on every save.
+        self.full_clean(exclude=["book", "user"])
         return super(Borrowing, self).save(
             force_insert, force_update, using, update_fields
         )
+
+
+class OutstandingFineQuerySet(models.QuerySet):
+    def settle(self):
+        """
+        Delete the fines and take them off the balances of their users,
+        in one UPDATE.
+        """
+
+        per_user = list(
+            self.order_by()
+            .values("user_id")
+            .annotate(amount=Sum("amount"), borrowings=Count("pk"))
+        )
+        if not per_user:
+            return
+        self.delete()
+        FineBalance.objects.filter(
+            user_id__in=[row["user_id"] for row in per_user]
+        ).update(
+            amount=F("amount")
+            - Case(
+                *(
+                    When(user_id=row["user_id"], then=Value(row["amount"]))
+                    for row in per_user
+                ),
+                output_field=models.DecimalField(),
+            ),
+            borrowings=F("borrowings")
+            - Case(
+                *(
+                    When(user_id=row["user_id"], then=row["borrowings"])
+                    for row in per_user
+                ),
+                output_field=models.IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+
+
+class OutstandingFine(models.Model):
+    """
+    Fine accrued by a late borrowing, precomputed by the nightly
+    accrue_fines task and deleted once paid.
+    """
+
+    borrowing = models.OneToOneField(
+        Borrowing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="outstanding_fine",
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="outstanding_fines",
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    accrued_on = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OutstandingFineQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.amount} owed for borrowing {self.borrowing_id}"
+
+
+class FineBalance(models.Model):
+    """Sum of the outstanding fines of a user."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="fine_balance",
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    borrowings = models.PositiveIntegerField()
+    accrued_on = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} owes {self.amount}"
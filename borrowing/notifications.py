@@ -0,0 +1,104 @@
+from borrowing.models import Borrowing
+from notification.outbox import (
+    TELEGRAM_MESSAGE_LIMIT,
+    enqueue_notification,
+    split_message,
+    telegram_length,
+)
+from payment.pricing import fine_expression
+
+OVERDUE_HEADER = "*🚨---List of overdue---🚨*"
+
+
+def notify_new_borrowing(borrowing):
+    """
+    Queue a notification about a new borrowing for the Telegram chat.
+
+    Called inside the borrowing transaction, so the notification is only
+    kept if the borrowing is committed.
+    """
+
+    enqueue_notification(
+        f"*New Borrowing*:"
+        f"\n*Book title:* {borrowing.book.title}"
+        f"\n*User:* {borrowing.user.email}"
+        f"\n*Expected return date:* {borrowing.expected_return_date}"
+    )
+
+
+def notify_new_borrowings(borrowings):
+    """
+    Queue one notification about several borrowings made together.
+
+    Called inside the borrowing transaction, like notify_new_borrowing().
+    """
+
+    titles = "".join(
+        f"\n*Book title:* {borrowing.book.title}" for borrowing in borrowings
+    )
+    first = borrowings[0]
+    enqueue_notification(
+        f"*New Borrowings ({len(borrowings)})*:"
+        f"{titles}"
+        f"\n*User:* {first.user.email}"
+        f"\n*Expected return date:* {first.expected_return_date}"
+    )
+
+
+def overdue_report_lines(on_date=None, chunk_size=2000):
+    """
+    Yield one report entry per overdue borrowing.
+
+    The filtering and the fines happen in SQL and rows are streamed
+    from a server-side cursor as plain tuples, so memory stays flat and
+    the whole report costs a single query.
+    """
+
+    rows = (
+        Borrowing.objects.overdue(on_date)
+        .annotate(fine=fine_expression(on_date))
+        .order_by("id")
+        .values_list(
+            "id", "expected_return_date", "book__title", "user__email", "fine"
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    for borrowing_id, expected_return_date, title, email, fine in rows:
+        yield (
+            f"\n*ID:* {borrowing_id}"
+            f"\n*Expected data:* {expected_return_date}"
+            f"\n*Book:* {title}"
+            f"\n*User:* {email}"
+            f"\n*Fine:* {fine}\n"
+        )
+
+
+def chunk_messages(header, lines, limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    Pack lines into messages of at most `limit` characters.
+
+    Lengths are counted in UTF-16 code units, as Telegram does. Every
+    message starts with the header. Lines are kept whole, unless one
+    does not fit in a message on its own.
+    """
+
+    header_length = telegram_length(header)
+    room = limit - header_length
+    message, length = header, header_length
+    for line in lines:
+        size = telegram_length(line)
+        if size <= room:
+            pieces = [(line, size)]
+        else:
+            pieces = (
+                (piece, telegram_length(piece))
+                for piece in split_message(line, room)
+            )
+        for piece, size in pieces:
+            if length + size > limit:
+                yield message
+                message, length = header, header_length
+            message, length = message + piece, length + size
+
+    if message != header:
+        yield message
@@ -3,7 +3,7 @@ from rest_framework.permissions import BasePermission
 
 class IsAdminOrIfAuthenticatedBorrowingPermission(BasePermission):
     def has_permission(self, request, view):
-        if view.action in ["create", "list", "retrieve"]:
+        if view.action in ["create", "batch", "list", "retrieve", "export"]:
             return request.user.is_authenticated
         elif view.action in ["update", "partial_update", "destroy"]:
             return request.user.is_staff
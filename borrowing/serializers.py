@@ -1,13 +1,22 @@
 from django.db import transaction
 from rest_framework import serializers
 
+from book_service.inventory import reserve_book, reserve_books
+from book_service.models import Book
 from book_service.serializers import BookSerializer
 from borrowing.models import Borrowing
 from payment.models import Payment
 
-from borrowing.tasks import notification_new_borrowing
+from borrowing.notifications import (
+    notify_new_borrowing,
+    notify_new_borrowings,
+)
 from payment.serializers import PaymentDetailSerializer
-from payment.stripe_helper import create_checkout_session
+from payment.stripe_helper import calculate_amount_borrowing
+from payment.tasks import create_batch_payment_session, create_payment_session
+from stats.counters import record_borrowings
+
+MAX_BATCH_SIZE = 20
 
 
 class BorrowingSerializer(serializers.ModelSerializer):
@@ -17,7 +26,8 @@ class BorrowingSerializer(serializers.ModelSerializer):
     This serializer is responsible for validating and creating book borrowings.
     It ensures that the inventory of the borrowed book is valid, and it handles
     the creation of the borrowing record, updating the book inventory,
-    creating a checkout session, and generating a payment for the borrowing.
+    and generating a payment for the borrowing, whose checkout session
+    is created in the background.
     """
 
     def validate(self, attrs):
@@ -30,40 +40,118 @@ class BorrowingSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Borrowing
-        fields = ("id", "book", "expected_return_date")
+        fields = ("id", "book", "expected_return_date", "payments")
+        read_only_fields = ("payments",)
 
     def create(self, validated_data):
         """
         Create a new borrowing record.
 
-        This method handles the creation of a new borrowing record,
-        updating the book inventory, creating a checkout session,
-        generating a payment for the borrowing, and triggering
-        a notification for the new borrowing.
+        This method reserves a copy of the book and creates the borrowing
+        together with a pending payment and a queued notification in one
+        transaction. The Stripe checkout session is only requested once
+        that transaction is committed, the client polls the payment
+        for its session_url.
         """
 
-        with transaction.atomic():
-            borrowing = Borrowing.objects.create(**validated_data)
-            borrowing.book.inventory -= 1
-            borrowing.book.save()
+        base_url = self.context["request"].build_absolute_uri("/")
 
-            session = create_checkout_session(
-                borrowing, self.context["request"]
+        with transaction.atomic():
+            Borrowing.valid_inventory_book(
+                reserve_book(validated_data["book"].id),
+                serializers.ValidationError,
             )
+            borrowing = Borrowing.objects.create(**validated_data)
 
-            Payment.objects.create(
+            payment = Payment.objects.create(
                 status=Payment.StatusChoices.PENDING,
                 type=Payment.TypeChoices.PAYMENT,
                 borrowing=borrowing,
-                session_url=session.url,
-                session_id=session.id,
-                money_to_pay=session.amount_total / 100,
+                money_to_pay=calculate_amount_borrowing(borrowing),
+            )
+
+            notify_new_borrowing(borrowing)
+            record_borrowings(
+                [(borrowing.book_id, borrowing.expected_return_date)]
             )
 
-            notification_new_borrowing.delay(borrowing.id)
+            transaction.on_commit(
+                lambda: create_payment_session.delay(payment.id, base_url)
+            )
         return borrowing
 
 
+class BorrowingBatchSerializer(serializers.Serializer):
+    """
+    Serializer for borrowing several books at once.
+
+    Either every book is borrowed or none is. The borrowings and their
+    payments are inserted in bulk, paid through a single Stripe checkout
+    session and announced in a single notification.
+    """
+
+    books = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE,
+    )
+    expected_return_date = serializers.DateField()
+
+    def validate_books(self, book_ids):
+        if len(set(book_ids)) != len(book_ids):
+            raise serializers.ValidationError(
+                "Each book can only be borrowed once."
+            )
+        books = Book.objects.in_bulk(book_ids)
+        missing = [book_id for book_id in book_ids if book_id not in books]
+        if missing:
+            raise serializers.ValidationError(f"Books {missing} do not exist.")
+        return [books[book_id] for book_id in book_ids]
+
+    def create(self, validated_data):
+        base_url = self.context["request"].build_absolute_uri("/")
+        books = validated_data["books"]
+
+        with transaction.atomic():
+            if not reserve_books(book.id for book in books):
+                raise serializers.ValidationError(
+                    {"books": "Some of these books are out of stock."}
+                )
+            borrowings = Borrowing.objects.bulk_create(
+                Borrowing(
+                    book=book,
+                    user_id=validated_data["user_id"],
+                    expected_return_date=validated_data[
+                        "expected_return_date"
+                    ],
+                )
+                for book in books
+            )
+            payments = Payment.objects.bulk_create(
+                Payment(
+                    status=Payment.StatusChoices.PENDING.value,
+                    type=Payment.TypeChoices.PAYMENT.value,
+                    borrowing=borrowing,
+                    money_to_pay=calculate_amount_borrowing(borrowing),
+                )
+                for borrowing in borrowings
+            )
+
+            notify_new_borrowings(borrowings)
+            record_borrowings(
+                (borrowing.book_id, borrowing.expected_return_date)
+                for borrowing in borrowings
+            )
+
+            payment_ids = [payment.id for payment in payments]
+            transaction.on_commit(
+                lambda: create_batch_payment_session.delay(
+                    payment_ids, base_url
+                )
+            )
+        return borrowings
+
+
 class BorrowingListSerializer(BorrowingSerializer):
     book = serializers.SlugRelatedField(
         many=False, read_only=True, slug_field="title"
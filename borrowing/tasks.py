@@ -1,56 +1,40 @@
-import os
-from datetime import date, timedelta
-
-import telebot
 from celery import shared_task
 
-from borrowing.models import Borrowing
-
-bot = telebot.TeleBot(os.environ["TELEGRAM_BOT_TOKEN"])
-CHAT_ID = os.environ["TELEGRAM_CHAT_ID"]
+from borrowing.fines import accrue_fines
+from borrowing.notifications import (
+    OVERDUE_HEADER,
+    chunk_messages,
+    overdue_report_lines,
+)
+from library_service_project.routers import use_replica
+from notification.outbox import enqueue_notification, enqueue_notifications
 
 
 @shared_task
-def notification_new_borrowing(borrowing_id):
+@use_replica()
+def check_borrowings_overdue():
     """
-    Send a notification about a new borrowing to a Telegram chat.
+    Check for overdue borrowings and queue a notification to a Telegram chat.
+
+    The report is split into as many messages as needed to stay within
+    Telegram's message size limit, the outbox delivers them. The
+    borrowings are read from the replica, if any.
+
+    By default, once a day
     """
 
-    borrowing = Borrowing.objects.get(id=borrowing_id)
-    message = (
-        f"*New Borrowing*:"
-        f"\n*Book title:* {borrowing.book.title}"
-        f"\n*User:* {borrowing.user.email}"
-        f"\n*Expected return date:* {borrowing.expected_return_date}"
-    )
-    bot.send_message(CHAT_ID, message, parse_mode="Markdown")
+    messages = chunk_messages(OVERDUE_HEADER, overdue_report_lines())
+    if not enqueue_notifications(messages):
+        enqueue_notification("No borrowings overdue today!👍")
 
 
 @shared_task
-def check_borrowings_overdue():
+def accrue_outstanding_fines():
     """
-    Check for overdue borrowings and send a notification to a Telegram chat.
+    Precompute the outstanding fine of every late borrowing and user.
 
-    By default, once a day
+    Scheduled every night by CELERY_BEAT_SCHEDULE, once the day of the
+    fines has changed.
     """
 
-    borrowings = Borrowing.objects.filter(actual_return_data__isnull=True)
-    message = None
-    for object_borrowing in borrowings:
-        if object_borrowing.expected_return_date <= date.today():
-            if not message:
-                message = "*🚨---List of overdue---🚨*"
-
-            message += (
-                f"\n*ID:* {object_borrowing.id}"
-                f"\n*Expected data:* {object_borrowing.expected_return_date}"
-                f"\n*Book:* {object_borrowing.book.title}"
-                f"\n*User:* {object_borrowing.user.email}\n"
-            )
-
-    if message:
-        bot.send_message(CHAT_ID, message, parse_mode="Markdown")
-    else:
-        bot.send_message(
-            CHAT_ID, "No borrowings overdue today!👍", parse_mode="Markdown"
-        )
+    accrue_fines()
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import (
+    APIClient,
+    APIRequestFactory,
+    force_authenticate,
+)
+
+from borrowing.models import Borrowing
+from borrowing.tests.tests import sample_book, sample_user
+from borrowing.views import BorrowingViewSet
+
+EXPORT_URL = reverse("borrowing:borrowing-export")
+
+
+def read_csv(response):
+    content = b"".join(response.streaming_content).decode()
+    return list(csv.DictReader(io.StringIO(content)))
+
+
+class BorrowingExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.staff = sample_user(email="staff@test.com", is_staff=True)
+        self.book = sample_book(title="Dune, Part 1")
+        self.borrowings = [
+            Borrowing.objects.create(
+                book=self.book,
+                user=user,
+                expected_return_date=date.today() + timedelta(days=3),
+                actual_return_data=returned,
+            )
+            for user, returned in (
+                (self.user, None),
+                (self.user, date.today()),
+                (self.staff, None),
+            )
+        ]
+
+    def test_staff_export_csv(self):
+        self.client.force_authenticate(self.staff)
+
+        response = self.client.get(EXPORT_URL, {"is_active": "true"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="borrowings.csv"',
+        )
+        rows = read_csv(response)
+        self.assertEqual(
+            [int(row["id"]) for row in rows],
+            [self.borrowings[0].id, self.borrowings[2].id],
+        )
+        self.assertEqual(rows[0]["book"], "Dune, Part 1")
+        self.assertEqual(rows[0]["user"], self.user.email)
+        self.assertEqual(rows[0]["actual_return_data"], "")
+
+    def test_member_exports_own_borrowings_as_ndjson(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(EXPORT_URL, {"export_format": "ndjson"})
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [row["id"] for row in rows],
+            [self.borrowings[0].id, self.borrowings[1].id],
+        )
+        self.assertEqual(rows[1]["actual_return_data"], str(date.today()))
+
+    def test_unknown_format_is_rejected(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(EXPORT_URL, {"export_format": "xlsx"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_auth_required(self):
+        response = self.client.get(EXPORT_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsyncBorrowingExportTests(TransactionTestCase):
+    def test_export_is_streamed_from_a_thread(self):
+        user = sample_user()
+        Borrowing.objects.create(
+            book=sample_book(),
+            user=user,
+            expected_return_date=date.today(),
+        )
+        view = BorrowingViewSet.as_view({"get": "export"})
+        request = APIRequestFactory().get(EXPORT_URL)
+        force_authenticate(request, user)
+
+        self.assertTrue(iscoroutinefunction(view))
+        response = async_to_sync(view)(request)
+
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return b"".join([chunk async for chunk in response])
+
+        lines = async_to_sync(read)().decode().splitlines()
+        self.assertEqual(len(lines), 2)
@@ -0,0 +1,145 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowing.fines import accrue_fines
+from borrowing.models import Borrowing, FineBalance, OutstandingFine
+from borrowing.tests.tests import sample_book, sample_borrowing, sample_user
+
+ME_URL = reverse("user:manage")
+FINES_SUMMARY_URL = reverse("payments:payment-fines-summary")
+
+
+class AccrueFinesTests(TestCase):
+    def setUp(self):
+        self.user = sample_user()
+        self.other = sample_user(email="other@test.com")
+        book = sample_book(daily_fee=Decimal("1.50"))
+        today = date.today()
+        # Four days at twice the daily fee: 12.00, and two days: 6.00.
+        self.late = [
+            sample_borrowing(
+                user=self.user,
+                book=book,
+                expected_return_date=today - timedelta(days=3),
+            ),
+            sample_borrowing(
+                user=self.user,
+                book=book,
+                expected_return_date=today - timedelta(days=1),
+            ),
+            sample_borrowing(
+                user=self.other,
+                book=book,
+                expected_return_date=today - timedelta(days=1),
+            ),
+        ]
+        sample_borrowing(user=self.other, book=book)
+
+    def balance(self, user):
+        return FineBalance.objects.get(user=user)
+
+    def test_fines_and_balances_are_precomputed(self):
+        summary = accrue_fines(chunk_size=2)
+
+        self.assertEqual(
+            summary,
+            {"borrowings": 3, "users": 2, "total": Decimal("24.00")},
+        )
+        self.assertEqual(
+            dict(OutstandingFine.objects.values_list("borrowing", "amount")),
+            {
+                self.late[0].id: Decimal("12.00"),
+                self.late[1].id: Decimal("6.00"),
+                self.late[2].id: Decimal("6.00"),
+            },
+        )
+        balance = self.balance(self.user)
+        self.assertEqual(balance.amount, Decimal("18.00"))
+        self.assertEqual(balance.borrowings, 2)
+        self.assertEqual(balance.accrued_on, date.today())
+
+    def test_next_run_updates_and_drops_rows(self):
+        accrue_fines(on_date=date.today() - timedelta(days=1))
+        Borrowing.objects.filter(pk=self.late[2].pk).update(
+            actual_return_data=date.today()
+        )
+
+        accrue_fines()
+
+        self.assertEqual(
+            OutstandingFine.objects.get(borrowing=self.late[0]).amount,
+            Decimal("12.00"),
+        )
+        self.assertFalse(
+            OutstandingFine.objects.filter(borrowing=self.late[2]).exists()
+        )
+        self.assertFalse(FineBalance.objects.filter(user=self.other).exists())
+
+    def test_returned_borrowings_settle_their_fines(self):
+        accrue_fines()
+
+        Borrowing.objects.filter(pk=self.late[0].pk).return_books()
+
+        self.assertFalse(
+            OutstandingFine.objects.filter(borrowing=self.late[0]).exists()
+        )
+        balance = self.balance(self.user)
+        self.assertEqual(balance.amount, Decimal("6.00"))
+        self.assertEqual(balance.borrowings, 1)
+        self.assertEqual(self.balance(self.other).amount, Decimal("6.00"))
+
+
+class FineBalanceApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        sample_borrowing(
+            user=self.user,
+            book=sample_book(daily_fee=Decimal("1.50")),
+            expected_return_date=date.today() - timedelta(days=3),
+        )
+        accrue_fines()
+
+    def test_me_shows_balance(self):
+        self.client.force_authenticate(self.user)
+
+        # The user with their balance.
+        with self.assertNumQueries(1):
+            response = self.client.get(ME_URL)
+
+        self.assertEqual(response.data["outstanding_fine"], "12.00")
+        self.assertEqual(response.data["fines_accrued_on"], str(date.today()))
+
+    def test_me_without_fines(self):
+        self.client.force_authenticate(sample_user(email="new@test.com"))
+
+        response = self.client.get(ME_URL)
+
+        self.assertEqual(response.data["outstanding_fine"], "0.00")
+        self.assertIsNone(response.data["fines_accrued_on"])
+
+    def test_summary_is_staff_only(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(FINES_SUMMARY_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_summary(self):
+        staff = sample_user(email="staff@test.com", is_staff=True)
+        self.client.force_authenticate(staff)
+
+        # Totals, largest balances with their users.
+        with self.assertNumQueries(2):
+            response = self.client.get(FINES_SUMMARY_URL)
+
+        self.assertEqual(response.data["total"], Decimal("12.00"))
+        self.assertEqual(response.data["users"], 1)
+        self.assertEqual(response.data["borrowings"], 1)
+        [largest] = response.data["largest"]
+        self.assertEqual(largest["email"], self.user.email)
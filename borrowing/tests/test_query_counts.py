@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from borrowing.tests.tests import BORROWING_URL, sample_borrowing, sample_user
+from payment.models import Payment
+
+
+class BorrowingQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.borrowings = []
+        for days in range(1, 6):
+            borrowing = sample_borrowing(
+                user=self.user,
+                expected_return_date=date.today() + timedelta(days=days),
+            )
+            for payment_type in Payment.TypeChoices:
+                Payment.objects.create(
+                    borrowing=borrowing,
+                    status=Payment.StatusChoices.PENDING.value,
+                    type=payment_type.value,
+                    money_to_pay=1,
+                )
+            self.borrowings.append(borrowing)
+
+    def test_list(self):
+        # ETag aggregate, page count, page rows, payments of the page.
+        with self.assertNumQueries(4):
+            response = self.client.get(BORROWING_URL)
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_detail(self):
+        url = reverse(
+            "borrowing:borrowing-detail", args=[self.borrowings[0].id]
+        )
+
+        # ETag aggregate, borrowing with book and user, its payments.
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(
+            [payment["book"] for payment in response.data["payments"]],
+            [self.borrowings[0].book.title] * 2,
+        )
@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+
+from django.test import TestCase
+
+from borrowing.notifications import OVERDUE_HEADER, chunk_messages
+from borrowing.tasks import check_borrowings_overdue
+from borrowing.tests.tests import sample_borrowing, sample_user
+from notification.models import Notification
+from notification.outbox import telegram_length
+
+
+class CheckBorrowingsOverdueTests(TestCase):
+    def setUp(self):
+        self.user = sample_user()
+
+    def queued_messages(self):
+        return list(
+            Notification.objects.order_by("id").values_list(
+                "message", flat=True
+            )
+        )
+
+    def test_report_is_built_with_a_single_query(self):
+        for days in range(1, 6):
+            sample_borrowing(
+                user=self.user,
+                expected_return_date=date.today() - timedelta(days=days),
+            )
+        sample_borrowing(user=self.user)
+
+        # One query streams the report, one inserts the messages.
+        with self.assertNumQueries(2):
+            check_borrowings_overdue()
+
+        [message] = self.queued_messages()
+        self.assertTrue(message.startswith(OVERDUE_HEADER))
+        self.assertEqual(message.count("*ID:*"), 5)
+        self.assertIn(self.user.email, message)
+
+    def test_no_overdue_borrowings(self):
+        sample_borrowing(user=self.user)
+
+        check_borrowings_overdue()
+
+        self.assertEqual(
+            self.queued_messages(), ["No borrowings overdue today!👍"]
+        )
+
+
+class ChunkMessagesTests(TestCase):
+    def test_messages_respect_limit_and_keep_lines_whole(self):
+        lines = [f"\nline {i:03}" for i in range(100)]
+
+        messages = list(chunk_messages("header", lines, limit=100))
+
+        self.assertGreater(len(messages), 1)
+        for message in messages:
+            self.assertLessEqual(len(message), 100)
+            self.assertTrue(message.startswith("header"))
+        self.assertEqual(
+            "".join(message[len("header"):] for message in messages),
+            "".join(lines),
+        )
+
+    def test_messages_are_measured_in_utf16_units(self):
+        lines = ["\n📚📚📚📚" for _ in range(20)]
+
+        messages = list(chunk_messages("header", lines, limit=100))
+
+        # 9 units per line: 10 lines fit in 100 units with the header.
+        self.assertEqual(len(messages), 2)
+        for message in messages:
+            self.assertLessEqual(telegram_length(message), 100)
+
+    def test_line_longer_than_a_message_is_split(self):
+        line = "\n" + "📚" * 100
+
+        messages = list(chunk_messages("header", [line], limit=100))
+
+        self.assertGreater(len(messages), 1)
+        for message in messages:
+            self.assertLessEqual(telegram_length(message), 100)
+            self.assertTrue(message.startswith("header"))
+        self.assertEqual(
+            "".join(message[len("header"):] for message in messages), line
+        )
+
+    def test_no_lines_no_messages(self):
+        self.assertEqual(list(chunk_messages("header", [])), [])
@@ -1,9 +1,7 @@
-import os
 from datetime import date, timedelta
 
-import stripe
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -12,8 +10,12 @@ from book_service.models import Book
 from borrowing.models import Borrowing
 from borrowing.serializers import BorrowingListSerializer, BorrowingSerializer
 from borrowing.views import BorrowingViewSet
+from notification.models import Notification
+from payment.models import Payment
+from payment.tasks import create_batch_payment_session, create_payment_session
 
 BORROWING_URL = reverse("borrowing:borrowing-list")
+BATCH_URL = reverse("borrowing:borrowing-batch")
 
 
 def sample_book(**params):
@@ -84,7 +86,9 @@ class AuthenticatedPlayApiTests(TestCase):
 
     def test_admin_filter_by_user_id(self):
         self.client.force_authenticate(self.user)
-        response = self.client.get(BORROWING_URL, {"user_id": 2})
+        response = self.client.get(
+            BORROWING_URL, {"user_id": self.user2.id}
+        )
 
         serializer1 = BorrowingListSerializer(self.borrowing1)
         serializer2 = BorrowingListSerializer(self.borrowing2)
@@ -149,3 +153,178 @@ class AuthenticatedPlayApiTests(TestCase):
         response = self.client.post(f"/api/borrowing/{self.borrowing1.id}/return/")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data["detail"], "This borrowing has already been returned.")
+
+    @override_settings(
+        STRIPE_BACKEND="payment.stripe_backends.FakeStripeBackend"
+    )
+    def test_late_returns_on_one_day_share_the_fine_payment(self):
+        self.client.force_authenticate(self.user2)
+        Borrowing.objects.filter(id=self.borrowing2.id).update(
+            expected_return_date=date.today() - timedelta(days=2)
+        )
+        url = f"/api/borrowing/{self.borrowing2.id}/return/"
+
+        for _ in range(3):
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        [payment] = Payment.objects.filter(borrowing=self.borrowing2)
+        self.assertEqual(payment.type, Payment.TypeChoices.FINE.value)
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING.value)
+        self.assertTrue(payment.session_id)
+
+    def test_return_book_twice_releases_inventory_once(self):
+        inventory = self.borrowing2.book.inventory
+
+        self.assertTrue(self.borrowing2.return_book())
+        self.assertFalse(self.borrowing2.return_book())
+
+        self.borrowing2.book.refresh_from_db()
+        self.assertEqual(self.borrowing2.book.inventory, inventory + 1)
+
+    @override_settings(
+        STRIPE_BACKEND="payment.stripe_backends.FakeStripeBackend"
+    )
+    def test_create_borrowing_defers_checkout_session(self):
+        self.client.force_authenticate(self.user2)
+        book = sample_book(inventory=1)
+
+        with self.captureOnCommitCallbacks():
+            response = self.client.post(
+                BORROWING_URL,
+                {
+                    "book": book.id,
+                    "expected_return_date": date.today() + timedelta(days=2),
+                },
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        [notification] = Notification.objects.all()
+        self.assertIn(book.title, notification.message)
+
+        payment = Payment.objects.get(borrowing_id=response.data["id"])
+        self.assertEqual(response.data["payments"], [payment.id])
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING.value)
+        self.assertEqual(payment.session_url, "")
+
+        create_payment_session(payment.id, "http://testserver/")
+
+        payment.refresh_from_db()
+        book.refresh_from_db()
+        self.assertTrue(payment.session_id.startswith("cs_test_"))
+        self.assertTrue(payment.session_url)
+        self.assertEqual(book.inventory, 0)
+
+    def test_overdue_queryset(self):
+        overdue = sample_borrowing(
+            user=self.user2,
+            expected_return_date=date.today() - timedelta(days=1),
+        )
+        sample_borrowing(
+            user=self.user2,
+            expected_return_date=date.today() - timedelta(days=1),
+            actual_return_data=date.today(),
+        )
+
+        self.assertEqual(list(Borrowing.objects.overdue()), [overdue])
+
+    def test_unchanged_active_borrowings_are_not_modified(self):
+        self.client.force_authenticate(self.user2)
+        payment = Payment.objects.create(
+            borrowing=self.borrowing2,
+            status=Payment.StatusChoices.PENDING.value,
+            type=Payment.TypeChoices.PAYMENT.value,
+            money_to_pay=1,
+        )
+        params = {"is_active": "true"}
+        etag = self.client.get(BORROWING_URL, params)["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                BORROWING_URL, params, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        payment.status = Payment.StatusChoices.PAID.value
+        payment.save()
+        response = self.client.get(
+            BORROWING_URL, params, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(
+        STRIPE_BACKEND="payment.stripe_backends.FakeStripeBackend"
+    )
+    def test_batch_borrowing(self):
+        self.client.force_authenticate(self.user2)
+        books = [
+            sample_book(title=f"Batch {i}", inventory=1) for i in range(3)
+        ]
+
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(
+                BATCH_URL,
+                {
+                    "books": [book.id for book in books],
+                    "expected_return_date": date.today() + timedelta(days=2),
+                },
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(borrowing["book"] for borrowing in response.data),
+            sorted(book.id for book in books),
+        )
+        self.assertFalse(
+            Book.objects.filter(
+                id__in=[book.id for book in books], inventory__gt=0
+            ).exists()
+        )
+        [notification] = Notification.objects.all()
+        self.assertIn("Batch 2", notification.message)
+
+        payments = Payment.objects.filter(borrowing__book__in=books)
+        create_batch_payment_session(
+            [payment.id for payment in payments], "http://testserver/"
+        )
+        self.assertEqual(
+            len({payment.session_id for payment in payments.all()}), 1
+        )
+
+    def test_batch_borrowing_is_all_or_nothing(self):
+        self.client.force_authenticate(self.user2)
+        available = sample_book(inventory=1)
+        sold_out = sample_book(inventory=1)
+        Book.objects.filter(id=sold_out.id).update(inventory=0)
+
+        response = self.client.post(
+            BATCH_URL,
+            {
+                "books": [available.id, sold_out.id],
+                "expected_return_date": date.today() + timedelta(days=2),
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        available.refresh_from_db()
+        self.assertEqual(available.inventory, 1)
+        self.assertFalse(
+            Borrowing.objects.filter(book__in=[available, sold_out]).exists()
+        )
+
+    def test_batch_borrowing_rejects_duplicates(self):
+        self.client.force_authenticate(self.user2)
+        book = sample_book()
+
+        response = self.client.post(
+            BATCH_URL,
+            {
+                "books": [book.id, book.id],
+                "expected_return_date": date.today() + timedelta(days=2),
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
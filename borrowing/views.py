@@ -1,5 +1,7 @@
 from datetime import date
 
+from django.db import transaction
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
@@ -11,12 +13,33 @@ from borrowing.serializers import (
     BorrowingSerializer,
     BorrowingListSerializer,
     BorrowingDetailSerializer, BorrowingReturnSerializer,
+    BorrowingBatchSerializer,
 )
+from library_service_project.async_views import AsyncViewMixin
+from library_service_project.conditional import ConditionalGetMixin
+from library_service_project.export import (
+    export_format_parameter,
+    export_response,
+)
+from library_service_project.pagination import CursorOrOffsetPagination
 from payment.models import Payment
 from payment.stripe_helper import create_fine_session
 
+BORROWING_EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("book_id", "book_id"),
+    ("book", "book__title"),
+    ("user_id", "user_id"),
+    ("user", "user__email"),
+    ("borrow_date", "borrow_date"),
+    ("expected_return_date", "expected_return_date"),
+    ("actual_return_data", "actual_return_data"),
+)
+
 
-class BorrowingViewSet(viewsets.ModelViewSet):
+class BorrowingViewSet(
+    AsyncViewMixin, ConditionalGetMixin, viewsets.ModelViewSet
+):
 
     """
     API endpoint for managing book borrowings.
@@ -33,6 +56,14 @@ class BorrowingViewSet(viewsets.ModelViewSet):
     create:
     Create a new book borrowing.
 
+    batch:
+    Borrow several books in one request, all or nothing, paid through
+    a single checkout session.
+
+    export:
+    Stream the borrowings of the list, with the same filters, as CSV
+    or NDJSON.
+
     return_book:
     Custom action to mark a borrowed book as returned.
     If the book is returned on time, it updates the return date.
@@ -43,18 +74,31 @@ class BorrowingViewSet(viewsets.ModelViewSet):
     queryset = Borrowing.objects.all().select_related("user", "book")
     serializer_class = BorrowingSerializer
     permission_classes = [IsAdminOrIfAuthenticatedBorrowingPermission]
+    pagination_class = CursorOrOffsetPagination
+    # The return waits on Stripe for the session of a fine, the export
+    # streams the whole table.
+    async_actions = ("return_book", "export")
+    conditional_related = ("book", "payments")
+
+    def get_conditional_fields(self):
+        fields = super().get_conditional_fields()
+        if self.action == "retrieve":
+            # Only the detail shows the inventory of the book, a loan
+            # of the same title does not change the list.
+            fields.append("book__inventory_updated_at")
+        return fields
 
     def get_queryset(self):
         queryset = Borrowing.objects.select_related("user", "book").prefetch_related("payments")
         if not self.request.user.is_staff:
-            queryset = queryset.filter(user=self.request.user)
+            queryset = queryset.filter(user_id=self.request.user.id)
 
         is_active = self.request.query_params.get("is_active")
         user_id = self.request.query_params.get("user_id")
         if user_id:
             queryset = queryset.filter(user_id=int(user_id))
         if is_active == "true":
-            queryset = queryset.filter(actual_return_data__isnull=True)
+            queryset = queryset.active()
         return queryset
 
     def get_serializer_class(self):
@@ -64,6 +108,8 @@ class BorrowingViewSet(viewsets.ModelViewSet):
             return BorrowingDetailSerializer
         if self.action == "return_book":
             return BorrowingReturnSerializer
+        if self.action == "batch":
+            return BorrowingBatchSerializer
         return BorrowingSerializer
 
     def perform_create(self, serializer):
@@ -73,7 +119,61 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         Assigns the borrowing to the current user.
         """
 
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
+
+    @action(methods=["POST"], detail=False)
+    def batch(self, request):
+        """
+        Borrow several books at once.
+
+        Body: {"books": [<book id>, ...], "expected_return_date": <date>}.
+        Either all the books are in stock and borrowed, or the request
+        fails with HTTP 400 and nothing is reserved.
+        """
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        borrowings = serializer.save(user_id=request.user.id)
+
+        borrowings = Borrowing.objects.filter(
+            id__in=[borrowing.id for borrowing in borrowings]
+        ).prefetch_related("payments")
+        return Response(
+            BorrowingSerializer(borrowings, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    @extend_schema(
+        parameters=[
+            export_format_parameter(),
+            OpenApiParameter(
+                "is_active",
+                type=str,
+                description="As for the list (ex. ?is_active=true)",
+                required=False,
+            ),
+            OpenApiParameter(
+                "user_id",
+                type=int,
+                description="As for the list, staff only (ex. ?user_id=2)",
+                required=False,
+            ),
+        ],
+        responses={200: OpenApiTypes.STR},
+    )
+    @action(methods=["GET"], detail=False)
+    def export(self, request):
+        """
+        Export every borrowing of the list, oldest first, in one
+        streamed file instead of pages.
+        """
+
+        return export_response(
+            request,
+            self.get_queryset().order_by("id"),
+            BORROWING_EXPORT_COLUMNS,
+            "borrowings",
+        )
 
     @action(
         methods=["POST"],
@@ -96,36 +196,46 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         borrowing = self.get_object()
 
         if borrowing.actual_return_data:
-            return Response(
-                {"detail": "This borrowing has already been returned."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+            return self._already_returned()
 
         if borrowing.expected_return_date >= date.today():
-            borrowing.actual_return_data = date.today()
-            borrowing.book.inventory += 1
-            borrowing.book.save()
-            borrowing.save()
+            if not borrowing.return_book():
+                return self._already_returned()
             return Response(
                 {"detail": "This book was successfully returned."},
                 status=status.HTTP_200_OK,
             )
 
-        session = create_fine_session(borrowing, self.request)
-
-        Payment.objects.create(
-            status=Payment.StatusChoices.PENDING,
-            type=Payment.TypeChoices.FINE,
-            borrowing=borrowing,
-            session_url=session.url,
-            session_id=session.id,
-            money_to_pay=session.amount_total / 100,
+        session = create_fine_session(
+            borrowing, request.build_absolute_uri("/")
         )
+
+        # Returns on the same day share the session, and must share its
+        # payment too, or paying it once would mark every copy paid.
+        with transaction.atomic():
+            Borrowing.objects.select_for_update().get(pk=borrowing.pk)
+            Payment.objects.get_or_create(
+                session_id=session.id,
+                type=Payment.TypeChoices.FINE.value,
+                borrowing=borrowing,
+                defaults={
+                    "status": Payment.StatusChoices.PENDING.value,
+                    "session_url": session.url,
+                    "money_to_pay": session.amount_total / 100,
+                },
+            )
         return Response(
             {"detail": "You must pay the fine before returning the book."},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @staticmethod
+    def _already_returned():
+        return Response(
+            {"detail": "This borrowing has already been returned."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
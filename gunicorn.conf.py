@@ -0,0 +1,21 @@
+"""
+gunicorn settings of both deployments:
+
+    gunicorn library_service_project.wsgi:application
+    gunicorn library_service_project.asgi:application \
+        -k uvicorn.workers.UvicornWorker
+
+The number of workers is WEB_CONCURRENCY (1 if unset).
+"""
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+
+def child_exit(server, worker):
+    # Drop the live samples of the dead worker from /metrics.
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -14,5 +14,6 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault(
     "DJANGO_SETTINGS_MODULE", "library_service_project.settings"
 )
+os.environ.setdefault("ASYNC_VIEWS", "1")
 
 application = get_asgi_application()
@@ -0,0 +1,108 @@
+"""
+Async entry points of DRF views, for the ASGI deployment.
+
+Under ASGI Django runs every sync view on the one thread that the sync
+code of the worker shares, so a worker serves one such request at a
+time and a slow Stripe call holds all of them. With ASYNC_VIEWS on,
+the actions of a view that wait on I/O (async_actions) are async
+instead: each request runs the unchanged DRF view on a pool of
+ASGI_THREADS threads, with that thread's own database connection, and
+the event loop is free to accept the next request.
+
+Quick reads stay sync, the hop to the pool costs them more than it
+saves.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import update_wrapper
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+# The pool of the async views, its threads are started as needed.
+view_executor = ThreadPoolExecutor(
+    max_workers=settings.ASGI_THREADS, thread_name_prefix="async-view"
+)
+
+
+def run_in_thread_pool(func):
+    """
+    Wrap a sync function into a coroutine function running it on
+    view_executor, closing the thread's stale database connections
+    before and after, as the request_started and request_finished
+    signals do for a WSGI request.
+    """
+
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False, executor=view_executor)
+
+
+async def iterate_in_thread(iterator):
+    """
+    Iterate a sync iterator from async code, one item at a time.
+
+    Django would read a sync StreamingHttpResponse whole into memory
+    before sending it. Here each step runs on a thread of the iterator's
+    own, so a server-side cursor it opened keeps its connection, which
+    is closed once the iteration ends or the client goes away.
+    """
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1)
+    done = object()
+    try:
+        while (
+            item := await loop.run_in_executor(executor, next, iterator, done)
+        ) is not done:
+            yield item
+    finally:
+        await loop.run_in_executor(executor, connections.close_all)
+        executor.shutdown(wait=False)
+
+
+class AsyncViewMixin:
+    """
+    Serve the routes of the viewset's async_actions as async views when
+    ASYNC_VIEWS is on.
+    """
+
+    async_actions = ()
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if (
+            not settings.ASYNC_VIEWS
+            or iscoroutinefunction(view)
+            or not set(cls.async_actions) & set((actions or {}).values())
+        ):
+            return view
+
+        def render_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            # Render on the pool too, not on the shared sync thread.
+            if hasattr(response, "render"):
+                response.render()
+            return response
+
+        render_view = run_in_thread_pool(render_view)
+
+        async def async_view(request, *args, **kwargs):
+            response = await render_view(request, *args, **kwargs)
+            if response.streaming and not response.is_async:
+                response.streaming_content = iterate_in_thread(
+                    iter(response.streaming_content)
+                )
+            return response
+
+        # Keeps cls, actions and csrf_exempt for routers, the schema
+        # generator and the metrics middleware.
+        return update_wrapper(async_view, view)
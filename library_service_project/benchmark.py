@@ -0,0 +1,474 @@
+"""
+API cost benchmark: query count, latency and response size per route.
+
+Used by the benchmark_api command and by the tests tagged "benchmark".
+Every request is sent through an in-process APIClient against a seeded
+dataset and measured with an empty cache, so the numbers are the cost
+of a cold request and do not depend on the order of the endpoints.
+"""
+
+import hashlib
+import hmac
+import json
+import random
+import statistics
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from payment.models import Payment
+from stats.rebuild import rebuild_stats
+from user.authentication import (
+    AccessToken,
+    RefreshToken,
+    StatelessJWTAuthentication,
+)
+
+BENCHMARK_PASSWORD = "benchmark-password"
+BENCHMARK_WEBHOOK_SECRET = "whsec_benchmark"
+# Route names that are not API endpoints worth measuring.
+UNMEASURED_ROUTES = {
+    "api-root",
+    "swagger-ui",
+    "redoc",
+}
+
+
+@dataclass
+class Dataset:
+    users: int = 50
+    books: int = 200
+    borrowings: int = 1000
+    seed: int = 42
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    url: str
+    role: str = "member"
+    data: object = None
+    headers: Callable = None
+    # Requests that write are rolled back, so the dataset stays the same.
+    writes: bool = False
+
+
+def seed_dataset(dataset):
+    """
+    Insert a deterministic dataset with bulk inserts.
+
+    Returns:
+    - dict: The staff user and the member whose borrowings are measured.
+    """
+
+    rng = random.Random(dataset.seed)
+    password = make_password(BENCHMARK_PASSWORD)
+    users = get_user_model().objects.bulk_create(
+        get_user_model()(
+            email=f"benchmark-{i}@example.com",
+            first_name=f"First{i}",
+            last_name=f"Last{i}",
+            password=password,
+            is_staff=i == 0,
+        )
+        for i in range(dataset.users)
+    )
+    books = Book.objects.bulk_create(
+        Book(
+            title=f"Benchmark book {i}",
+            author=f"Author {i % 40}",
+            cover=rng.choice(Book.CoverChoices.values),
+            inventory=rng.randint(1, 20),
+            daily_fee=Decimal(rng.randint(10, 300)) / 100,
+        )
+        for i in range(dataset.books)
+    )
+
+    today = date.today()
+    borrowings = []
+    for _ in range(dataset.borrowings):
+        expected_return_date = today + timedelta(days=rng.randint(-20, 20))
+        returned = rng.random() < 0.5
+        borrowings.append(
+            Borrowing(
+                book=rng.choice(books),
+                user=rng.choice(users),
+                expected_return_date=expected_return_date,
+                actual_return_data=(
+                    expected_return_date if returned else None
+                ),
+            )
+        )
+    # The member always has a borrowing that can be returned on time.
+    borrowings.append(
+        Borrowing(
+            book=books[0],
+            user=users[1],
+            expected_return_date=today + timedelta(days=7),
+        )
+    )
+    borrowings = Borrowing.objects.bulk_create(borrowings)
+    Payment.objects.bulk_create(
+        Payment(
+            borrowing=borrowing,
+            status=rng.choice(Payment.StatusChoices.values),
+            type=Payment.TypeChoices.PAYMENT.value,
+            session_id=f"cs_benchmark_{borrowing.id}",
+            session_url="https://checkout.stripe.com/c/pay/benchmark",
+            money_to_pay=borrowing.book.daily_fee,
+        )
+        for borrowing in borrowings
+    )
+    rebuild_stats()
+    return {"staff": users[0], "member": users[1]}
+
+
+def webhook_headers(payload):
+    timestamp = int(time.time())
+    signature = hmac.new(
+        BENCHMARK_WEBHOOK_SECRET.encode(),
+        f"{timestamp}.{payload}".encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return {"HTTP_STRIPE_SIGNATURE": f"t={timestamp},v1={signature}"}
+
+
+def get_endpoints(users):
+    """Every API route, with the arguments to call it with."""
+
+    member = users["member"]
+    borrowing = Borrowing.objects.filter(user=member).first()
+    active = (
+        Borrowing.objects.filter(user=member)
+        .active()
+        .filter(expected_return_date__gt=date.today())
+        .first()
+    )
+    payment = Payment.objects.filter(borrowing=borrowing).first()
+    book = Book.objects.filter(inventory__gt=0).first()
+    books = Book.objects.filter(inventory__gt=0)[:5]
+    refresh = RefreshToken.for_user(member)
+    in_a_week = date.today() + timedelta(days=7)
+    webhook_event = json.dumps(
+        {
+            "id": "evt_benchmark",
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "id": payment.session_id,
+                    "payment_status": "paid",
+                }
+            },
+        }
+    )
+
+    return [
+        Endpoint("book-list", "get", reverse("book_service:book-list")),
+        Endpoint(
+            "book-list-search",
+            "get",
+            reverse("book_service:book-list") + "?q=benchmark+book",
+        ),
+        Endpoint(
+            "book-detail",
+            "get",
+            reverse("book_service:book-detail", args=[book.id]),
+        ),
+        Endpoint(
+            "borrowing-list",
+            "get",
+            reverse("borrowing:borrowing-list"),
+        ),
+        Endpoint(
+            "borrowing-list-active",
+            "get",
+            reverse("borrowing:borrowing-list") + "?is_active=true",
+        ),
+        Endpoint(
+            "borrowing-list-staff",
+            "get",
+            reverse("borrowing:borrowing-list"),
+            role="staff",
+        ),
+        Endpoint(
+            "borrowing-detail",
+            "get",
+            reverse("borrowing:borrowing-detail", args=[borrowing.id]),
+        ),
+        Endpoint(
+            "borrowing-create",
+            "post",
+            reverse("borrowing:borrowing-list"),
+            data={
+                "book": book.id,
+                "expected_return_date": in_a_week,
+            },
+            writes=True,
+        ),
+        Endpoint(
+            "borrowing-batch",
+            "post",
+            reverse("borrowing:borrowing-batch"),
+            data={
+                "books": [book.id for book in books],
+                "expected_return_date": in_a_week,
+            },
+            writes=True,
+        ),
+        Endpoint(
+            "borrowing-export",
+            "get",
+            reverse("borrowing:borrowing-export"),
+            role="staff",
+        ),
+        Endpoint(
+            "borrowing-return-book",
+            "post",
+            reverse("borrowing:borrowing-return-book", args=[active.id]),
+            writes=True,
+        ),
+        Endpoint(
+            "payment-list",
+            "get",
+            reverse("payments:payment-list"),
+        ),
+        Endpoint(
+            "payment-detail",
+            "get",
+            reverse("payments:payment-detail", args=[payment.id]),
+        ),
+        Endpoint(
+            "payment-export",
+            "get",
+            reverse("payments:payment-export"),
+            role="staff",
+        ),
+        Endpoint(
+            "payment-outstanding-fines",
+            "get",
+            reverse("payments:payment-outstanding-fines"),
+        ),
+        Endpoint(
+            "payment-outstanding-fines-staff",
+            "get",
+            reverse("payments:payment-outstanding-fines"),
+            role="staff",
+        ),
+        Endpoint(
+            "payment-fines-summary",
+            "get",
+            reverse("payments:payment-fines-summary"),
+            role="staff",
+        ),
+        Endpoint(
+            "payment-success",
+            "get",
+            reverse("payments:payment-success", args=[borrowing.id]),
+        ),
+        Endpoint(
+            "payment-fine-success",
+            "get",
+            reverse("payments:payment-fine-success", args=[borrowing.id]),
+        ),
+        Endpoint(
+            "payment-cancel",
+            "get",
+            reverse("payments:payment-cancel", args=[borrowing.id]),
+        ),
+        Endpoint(
+            "stripe-webhook",
+            "post",
+            reverse("payments:stripe-webhook"),
+            role=None,
+            data=webhook_event,
+            headers=lambda: webhook_headers(webhook_event),
+            writes=True,
+        ),
+        Endpoint(
+            "library-stats",
+            "get",
+            reverse("stats:library-stats"),
+            role="staff",
+        ),
+        Endpoint(
+            "book-stats-list",
+            "get",
+            reverse("stats:book-stats-list"),
+            role="staff",
+        ),
+        Endpoint(
+            "book-stats-detail",
+            "get",
+            reverse("stats:book-stats-detail", args=[book.id]),
+            role="staff",
+        ),
+        Endpoint(
+            "revenue",
+            "get",
+            reverse("stats:revenue"),
+            role="staff",
+        ),
+        Endpoint(
+            "create",
+            "post",
+            reverse("user:create"),
+            role=None,
+            data={
+                "email": "new-benchmark-user@example.com",
+                "password": BENCHMARK_PASSWORD,
+            },
+            writes=True,
+        ),
+        Endpoint(
+            "token_obtain_pair",
+            "post",
+            reverse("user:token_obtain_pair"),
+            role=None,
+            data={
+                "email": member.email,
+                "password": BENCHMARK_PASSWORD,
+            },
+        ),
+        Endpoint(
+            "token_refresh",
+            "post",
+            reverse("user:token_refresh"),
+            role=None,
+            data={"refresh": str(refresh)},
+        ),
+        Endpoint(
+            "token_verify",
+            "post",
+            reverse("user:token_verify"),
+            role=None,
+            data={"token": str(refresh.access_token)},
+        ),
+        Endpoint("manage", "get", reverse("user:manage")),
+        Endpoint("schema", "get", reverse("schema"), role=None),
+    ]
+
+
+@contextmanager
+def stateless_authentication():
+    """
+    Authenticate as deployments with a shared denylist do, so the
+    numbers do not depend on the JWT_AUTHENTICATION default here.
+    """
+
+    # Views inherit DEFAULT_AUTHENTICATION_CLASSES from APIView.
+    previous = APIView.authentication_classes
+    APIView.authentication_classes = (StatelessJWTAuthentication,)
+    try:
+        yield
+    finally:
+        APIView.authentication_classes = previous
+
+
+@stateless_authentication()
+def measure(endpoints, users, iterations):
+    """
+    Call every endpoint `iterations` times.
+
+    Returns:
+    - dict: Per endpoint name, its status code, query count, response
+      size in bytes and p50/p95 latency in milliseconds.
+    """
+
+    tokens = {
+        role: f"Bearer {AccessToken.for_user(user)}"
+        for role, user in users.items()
+    }
+    results = {}
+    for endpoint in endpoints:
+        client = APIClient()
+        if endpoint.role:
+            client.credentials(HTTP_AUTHORIZE=tokens[endpoint.role])
+
+        latencies = []
+        # The first call warms up lazy imports and is not measured.
+        for iteration in range(iterations + 1):
+            cache.clear()
+            kwargs = endpoint.headers() if endpoint.headers else {}
+            if endpoint.data:
+                kwargs["data"] = endpoint.data
+                if isinstance(kwargs["data"], str):
+                    kwargs["content_type"] = "application/json"
+                else:
+                    kwargs["format"] = "json"
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = getattr(client, endpoint.method)(
+                        endpoint.url, **kwargs
+                    )
+                    # Streamed rows are read, and counted, as sent.
+                    content = (
+                        b"".join(response.streaming_content)
+                        if response.streaming
+                        else response.content
+                    )
+                    elapsed = time.perf_counter() - start
+                if iteration:
+                    latencies.append(elapsed)
+                if endpoint.writes:
+                    transaction.set_rollback(True)
+
+        latencies.sort()
+        results[endpoint.name] = {
+            "status": response.status_code,
+            "queries": len(queries),
+            "bytes": len(content),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(
+                latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                * 1000,
+                2,
+            ),
+        }
+    return results
+
+
+def compare(results, baseline, threshold, checks=("bytes", "p95_ms")):
+    """
+    List the regressions of `results` against `baseline`.
+
+    Any extra query or a changed status code is a regression, the
+    `checks` (response size and p95 latency by default) regress when
+    they grow by more than `threshold` (0.2 is 20%).
+    """
+
+    regressions = []
+    for name, expected in baseline.items():
+        actual = results.get(name)
+        if actual is None:
+            regressions.append(f"{name}: not measured")
+            continue
+        if actual["status"] != expected["status"]:
+            regressions.append(
+                f"{name}: status {expected['status']} -> {actual['status']}"
+            )
+        if actual["queries"] > expected["queries"]:
+            regressions.append(
+                f"{name}: {expected['queries']} -> {actual['queries']} queries"
+            )
+        for key in checks:
+            if actual[key] > expected[key] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {key} {expected[key]} -> {actual[key]}"
+                )
+    return regressions
@@ -1,6 +1,8 @@
 import os
+import time
 
 from celery import Celery
+from celery.signals import task_postrun, task_prerun
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault(
@@ -22,3 +24,24 @@ app.autodiscover_tasks()
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
+
+
+_task_starts = {}
+
+
+@task_prerun.connect
+def start_task_timer(task_id, **kwargs):
+    _task_starts[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_duration(task_id, task, state, **kwargs):
+    start = _task_starts.pop(task_id, None)
+    if start is None:
+        return
+    # The package imports this module before Django is set up.
+    from library_service_project.metrics import CELERY_TASK_DURATION
+
+    CELERY_TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(
+        time.perf_counter() - start
+    )
@@ -0,0 +1,82 @@
+"""
+Process wide clients for third-party APIs.
+
+The SDKs are imported and the clients are built on first use, so web
+workers, management commands and tests that never talk to Telegram or
+Stripe neither pay for importing them nor need their credentials.
+Each client is cached, one instance per process.
+"""
+
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+def _require_env(name):
+    try:
+        return os.environ[name]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Set the {name} environment variable."
+        ) from None
+
+
+@lru_cache(maxsize=None)
+def get_telegram_bot():
+    """Return the Telegram bot of the library chat."""
+
+    import telebot
+
+    return telebot.TeleBot(_require_env("TELEGRAM_BOT_TOKEN"))
+
+
+@lru_cache(maxsize=None)
+def get_telegram_chat_id():
+    """Return the id of the chat notifications are sent to."""
+
+    return _require_env("TELEGRAM_CHAT_ID")
+
+
+@lru_cache(maxsize=None)
+def get_stripe_client():
+    """
+    Return a Stripe client authenticated with STRIPE_SECRET_KEY.
+
+    All calls go through one requests.Session, so connections to
+    api.stripe.com are kept alive and reused instead of paying a TLS
+    handshake per call. Failed calls are retried up to
+    STRIPE_MAX_NETWORK_RETRIES times, which is only safe together with
+    an idempotency key on every POST.
+    """
+
+    import requests
+    import stripe
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=settings.STRIPE_POOL_SIZE
+    )
+    session.mount("https://", adapter)
+
+    return stripe.StripeClient(
+        _require_env("STRIPE_SECRET_KEY"),
+        http_client=stripe.RequestsClient(
+            timeout=settings.STRIPE_TIMEOUT, session=session
+        ),
+        max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+    )
+
+
+def get_stripe_webhook_secret():
+    """Return the signing secret of the Stripe webhook endpoint."""
+
+    return _require_env("STRIPE_WEBHOOK_SECRET")
+
+
+def reset_clients():
+    """Drop the cached clients, e.g. after credentials changed."""
+
+    for factory in (get_telegram_bot, get_telegram_chat_id, get_stripe_client):
+        factory.cache_clear()
@@ -0,0 +1,104 @@
+import hashlib
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified support for list and retrieve actions.
+
+    The validators are computed from one aggregate query over the
+    filtered queryset: the row count and the latest of the
+    `conditional_fields` of the rows and of the `updated_at` of the
+    `conditional_related` relations shown with them. An unchanged poll
+    gets a 304 Not Modified without the page being fetched or
+    serialized.
+    """
+
+    conditional_fields = ("updated_at",)
+    conditional_related = ()
+
+    def get_conditional_fields(self):
+        """The date-time fields the validators are computed from."""
+
+        return list(self.conditional_fields) + [
+            f"{relation}__updated_at" for relation in self.conditional_related
+        ]
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.filter_queryset(self.get_queryset()),
+            partial(super().list, request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        respond = partial(super().retrieve, request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            # A malformed lookup value, let retrieve answer 404.
+            return respond()
+        return self.conditional_response(queryset, respond)
+
+    def conditional_response(self, queryset, respond):
+        """
+        Return 304 if the client has the current representation,
+        otherwise the response built by `respond`, with validators.
+        """
+
+        etag, last_modified = self.get_validators(queryset)
+        response = get_conditional_response(
+            self.request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+        if response is None:
+            response = respond()
+            if response.status_code != 200:
+                return response
+
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        return response
+
+    def get_validators(self, queryset):
+        """
+        Returns:
+        - tuple: (ETag, latest updated_at or None) of the queryset.
+        """
+
+        aggregates = {
+            f"max_{index}": Max(field)
+            for index, field in enumerate(self.get_conditional_fields())
+        }
+        stats = queryset.order_by().aggregate(
+            count=Count("pk", distinct=bool(self.conditional_related)),
+            **aggregates,
+        )
+        count = stats.pop("count")
+        last_modified = max(
+            (value for value in stats.values() if value is not None),
+            default=None,
+        )
+
+        # The same rows render differently per page, user and format.
+        key = "|".join(
+            str(part)
+            for part in (
+                self.request.get_full_path(),
+                self.request.user.pk,
+                self.request.accepted_media_type,
+                count,
+                last_modified and last_modified.isoformat(),
+            )
+        )
+        etag = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+        return etag, last_modified
@@ -0,0 +1,68 @@
+"""
+PostgreSQL backend taking its connections from an in-process pool.
+
+Set as the ENGINE with OPTIONS["pool"] holding the ConnectionPool
+arguments (max_size, idle_timeout, timeout, check_after). Django closes
+the connection at the end of every request (CONN_MAX_AGE = 0), which
+here gives it back to the pool of the process instead.
+"""
+
+import os
+import threading
+from functools import partial
+
+from django.db.backends.postgresql import base, creation
+
+from library_service_project.db_pool.pool import ConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def close_pools():
+    """Close the idle connections of every pool of the process."""
+
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections would keep the test database in use.
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    @property
+    def pool(self):
+        conn_params = self.get_connection_params()
+        # The test runner points the alias to another database.
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            pool = _pools.get(key)
+            # A forked worker must not share the sockets of its parent.
+            if pool is None or pool.pid != os.getpid():
+                pool = ConnectionPool(
+                    self.alias,
+                    partial(super().get_new_connection, conn_params),
+                    **self.settings_dict["OPTIONS"].get("pool", {}),
+                )
+                _pools[key] = pool
+            return pool
+
+    def get_new_connection(self, conn_params):
+        return self.pool.getconn()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import extensions
+
+from library_service_project.metrics import (
+    DB_POOL_CONNECTIONS,
+    DB_POOL_WAIT_DURATION,
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection was released in time."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections of one database alias.
+
+    At most `max_size` connections are open at once, a thread asking
+    for one more waits up to `timeout` seconds for a release. Idle
+    connections are reused newest first, so the ones left idle for
+    `idle_timeout` seconds after a burst are closed. A connection idle
+    for more than `check_after` seconds is checked with SELECT 1 before
+    it is handed out, as the server may have dropped it meanwhile.
+    """
+
+    def __init__(
+        self,
+        alias,
+        connect,
+        max_size=10,
+        idle_timeout=300,
+        timeout=10,
+        check_after=30,
+    ):
+        self.alias = alias
+        self.connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.check_after = check_after
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    @property
+    def size(self):
+        return len(self._idle) + self._in_use
+
+    def getconn(self):
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                self._close_expired()
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self.size < self.max_size:
+                    connection, released_at = None, None
+                    self._in_use += 1
+                    break
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise PoolTimeout(
+                        f"No connection of {self.alias!r} released in "
+                        f"{self.timeout}s, all {self.max_size} are in use."
+                    )
+            self._report()
+        DB_POOL_WAIT_DURATION.labels(self.alias).observe(
+            time.monotonic() - start
+        )
+
+        if connection is not None and self._usable(connection, released_at):
+            return connection
+        try:
+            return self.connect()
+        except Exception:
+            self._forget()
+            raise
+
+    def putconn(self, connection):
+        """Take back a connection, closing it if it is not reusable."""
+
+        if not connection.closed:
+            status = connection.info.transaction_status
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except Exception:
+                    connection.close()
+        if connection.closed:
+            self._forget()
+            return
+
+        with self._condition:
+            self._in_use -= 1
+            self._idle.append((connection, time.monotonic()))
+            self._report()
+            self._condition.notify()
+
+    def close(self):
+        """Close the idle connections."""
+
+        with self._condition:
+            while self._idle:
+                connection, _ = self._idle.pop()
+                connection.close()
+            self._report()
+
+    def _usable(self, connection, released_at):
+        if connection.closed:
+            return self._discard(connection)
+        if time.monotonic() - released_at > self.check_after:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            except Exception:
+                return self._discard(connection)
+        return True
+
+    def _discard(self, connection):
+        connection.close()
+        # The slot stays taken, the caller opens a new connection.
+        return False
+
+    def _forget(self):
+        with self._condition:
+            self._in_use -= 1
+            self._report()
+            self._condition.notify()
+
+    def _close_expired(self):
+        expiry = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < expiry:
+            connection, _ = self._idle.popleft()
+            connection.close()
+
+    def _report(self):
+        DB_POOL_CONNECTIONS.labels(self.alias, "idle").set(len(self._idle))
+        DB_POOL_CONNECTIONS.labels(self.alias, "in_use").set(self._in_use)
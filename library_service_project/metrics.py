@@ -0,0 +1,110 @@
+"""
+Prometheus metrics of the web processes and of the Celery workers.
+
+With PROMETHEUS_MULTIPROC_DIR set (to the same empty directory for
+every gunicorn and Celery worker process), each process writes its
+samples there and /metrics reports the sum over all processes.
+Otherwise /metrics reports the samples of the process serving it.
+
+Only the clients of METRICS_ALLOWED_NETWORKS can read /metrics.
+"""
+
+import os
+from ipaddress import ip_address, ip_network
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duration of HTTP requests, per view and action.",
+    ["view", "action", "method", "status"],
+)
+
+DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries run by one HTTP request.",
+    ["view", "action"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float("inf")),
+)
+
+DB_QUERY_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time one HTTP request spent waiting for the database.",
+    ["view", "action"],
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Open connections of the in-process database pool.",
+    ["alias", "state"],
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_WAIT_DURATION = Histogram(
+    "db_pool_wait_duration_seconds",
+    "Time spent waiting for a connection of the database pool.",
+    ["alias"],
+)
+
+STRIPE_REQUEST_DURATION = Histogram(
+    "stripe_request_duration_seconds",
+    "Duration of calls to the Stripe API.",
+    ["operation", "outcome"],
+)
+
+TELEGRAM_REQUEST_DURATION = Histogram(
+    "telegram_request_duration_seconds",
+    "Duration of calls to the Telegram Bot API.",
+    ["outcome"],
+)
+
+BOOK_CACHE_REQUESTS = Counter(
+    "book_cache_requests_total",
+    "Book catalog cache lookups.",
+    ["kind", "result"],
+)
+
+CELERY_TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Duration of Celery tasks.",
+    ["task", "state"],
+)
+
+
+def is_metrics_client(address):
+    """Whether the address is in one of METRICS_ALLOWED_NETWORKS."""
+
+    try:
+        address = ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ip_network(network.strip(), strict=False)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+        if network.strip()
+    )
+
+
+def metrics_view(request):
+    """Expose the metrics in the Prometheus text format."""
+
+    if not is_metrics_client(request.META.get("REMOTE_ADDR", "")):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,211 @@
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from library_service_project.metrics import (
+    DB_QUERIES,
+    DB_QUERY_DURATION,
+    HTTP_REQUEST_DURATION,
+    metrics_view,
+)
+from library_service_project.routers import (
+    is_pinned_to_primary,
+    pin_to_primary,
+    use_replica,
+)
+
+UNRESOLVED = ("<unresolved>", "")
+
+# The QueryStats of the request being served. Context variables follow
+# the request into the threads of sync_to_async, so queries of async
+# views running on the thread pool are counted too.
+_query_stats = ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    """Number and total duration of the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - start
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def view_labels(request, view_func):
+    """
+    Returns:
+    - tuple: The DRF view class and action serving the request, or the
+      URL name and HTTP method for a plain Django view.
+    """
+
+    method = request.method.lower()
+    view_class = getattr(view_func, "cls", None)
+    if view_class is not None:
+        actions = getattr(view_func, "actions", None) or {}
+        return view_class.__name__, actions.get(method, method)
+    return request.resolver_match.view_name, method
+
+
+class PrometheusMiddleware:
+    """
+    Records the latency and the database cost of every request.
+
+    The labels name the view and action, not the URL, so every book
+    detail request counts towards BookViewSet/retrieve whatever its id.
+    Keep it first in MIDDLEWARE to time the other middleware too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        connection_created.connect(
+            install_query_recorder, dispatch_uid="install_query_recorder"
+        )
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    def record(self, request, response, duration, stats):
+        labels = getattr(request, "_metrics_labels", UNRESOLVED)
+        if labels is None:
+            return
+        view, action = labels
+        HTTP_REQUEST_DURATION.labels(
+            view, action, request.method, response.status_code
+        ).observe(duration)
+        DB_QUERIES.labels(view, action).observe(stats.count)
+        DB_QUERY_DURATION.labels(view, action).observe(stats.duration)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Scrapes of /metrics itself are not recorded.
+        request._metrics_labels = (
+            None
+            if view_func is metrics_view
+            else view_labels(request, view_func)
+        )
+
+
+def token_user_id(request):
+    """The user id of the JWT of the request, None if it has no valid one."""
+
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    try:
+        token = authentication.get_validated_token(raw_token)
+    except InvalidToken:
+        return None
+    return token.get(api_settings.USER_ID_CLAIM)
+
+
+class ReplicaMiddleware:
+    """
+    Serves the safe API requests from the read replica.
+
+    A successful unsafe request pins its user to the primary for
+    REPLICA_PIN_SECONDS, their safe requests meanwhile read the primary
+    too, so they see their own writes. The user is taken from the JWT,
+    request.user would query the database before the routing is set.
+    Not used when no replica is configured (REPLICA_DATABASE).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        user_id = token_user_id(request)
+        with use_replica(self.reads_replica(request, user_id)):
+            response = self.get_response(request)
+        self.pin(request, response, user_id)
+        return response
+
+    async def __acall__(self, request):
+        user_id = token_user_id(request)
+        with use_replica(self.reads_replica(request, user_id)):
+            response = await self.get_response(request)
+        self.pin(request, response, user_id)
+        return response
+
+    def reads_replica(self, request, user_id):
+        return (
+            request.method in SAFE_METHODS
+            and request.path.startswith("/api/")
+            and (user_id is None or not is_pinned_to_primary(user_id))
+        )
+
+    def pin(self, request, response, user_id):
+        if (
+            user_id is not None
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            pin_to_primary(user_id)
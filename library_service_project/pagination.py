@@ -0,0 +1,77 @@
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    LimitOffsetPagination,
+)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on the primary key, newest first.
+
+    Each page is a single indexed range scan (WHERE id < cursor
+    ORDER BY id DESC LIMIT n), no matter how deep the client goes,
+    and no COUNT(*) query is issued.
+    """
+
+    ordering = "-id"
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+
+class CursorOrOffsetPagination(BasePagination):
+    """
+    Offset pagination by default, keyset pagination on request.
+
+    Clients opt in with ?pagination=cursor and then follow the
+    next/previous links, which carry the ?cursor= token. Without it the
+    response keeps the LimitOffsetPagination format (count, next,
+    previous, results) for backwards compatibility.
+    """
+
+    mode_query_param = "pagination"
+
+    def __init__(self):
+        self.offset_paginator = LimitOffsetPagination()
+        self.cursor_paginator = KeysetPagination()
+        self.paginator = self.offset_paginator
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.cursor_paginator.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.paginator = self.cursor_paginator
+        else:
+            self.paginator = self.offset_paginator
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.offset_paginator.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        # The cursor paginator also documents "limit", already
+        # covered by the offset paginator, so only its cursor is kept.
+        cursor_parameter = (
+            self.cursor_paginator.get_schema_operation_parameters(view)[0]
+        )
+        return [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": (
+                    "Set to 'cursor' for keyset pagination "
+                    "(no total count, stable deep paging)."
+                ),
+                "schema": {"type": "string", "enum": ["offset", "cursor"]},
+            },
+            *self.offset_paginator.get_schema_operation_parameters(view),
+            cursor_parameter,
+        ]
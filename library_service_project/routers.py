@@ -0,0 +1,63 @@
+"""
+Routing of reads to the read replica.
+
+Reads go to the primary unless the code runs inside use_replica():
+ReplicaMiddleware enables it for safe API requests and report tasks
+are decorated with it. Writes, and reads inside a transaction of the
+primary, always go to the primary.
+
+A user who just wrote is pinned to the primary for REPLICA_PIN_SECONDS,
+so their next reads see their own writes despite the replication lag.
+The pins live in the cache, which must be shared by all processes
+(REDIS_CACHE_URL) for them to work across workers.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Let the reads of the block (or decorated function) use the replica."""
+
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def _pin_key(user_id):
+    return f"replica:pin:{user_id}"
+
+
+def pin_to_primary(user_id):
+    cache.set(_pin_key(user_id), 1, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    return cache.get(_pin_key(user_id)) is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            settings.REPLICA_DATABASE
+            and _use_replica.get()
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return settings.REPLICA_DATABASE
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same rows.
+        return True
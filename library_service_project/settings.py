@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 import os
 from datetime import timedelta
 from pathlib import Path
+
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 
@@ -42,6 +44,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "debug_toolbar",
     "django_celery_beat",
@@ -49,10 +52,14 @@ INSTALLED_APPS = [
     "user",
     "borrowing",
     "payment",
+    "notification",
+    "stats",
     "drf_spectacular",
 ]
 
 MIDDLEWARE = [
+    "library_service_project.middleware.PrometheusMiddleware",
+    "library_service_project.middleware.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -63,6 +70,16 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Serve the views with AsyncViewMixin as async views, asgi.py turns it
+# on. See library_service_project/async_views.py.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS") == "1"
+if ASYNC_VIEWS:
+    # A sync-only middleware would run every request on the one thread
+    # shared by the sync code of the worker.
+    MIDDLEWARE.remove("debug_toolbar.middleware.DebugToolbarMiddleware")
+# Threads of each worker the async views run on.
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", 20))
+
 ROOT_URLCONF = "library_service_project.urls"
 
 TEMPLATES = [
@@ -94,10 +111,92 @@ DATABASES = {
         "PORT": os.environ["POSTGRES_PORT"],
         "NAME": os.environ["POSTGRES_NAME"],
         "USER": os.environ["POSTGRES_USER"],
-        "PASSWORD": os.environ["POSTGRES_PASSWORD"]
+        "PASSWORD": os.environ["POSTGRES_PASSWORD"],
+        # Seconds a connection is kept open for the next requests of the
+        # thread (0 closes it after each request), checked before reuse.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# An in-process pool of DB_POOL_SIZE connections shared by the threads
+# of each process, see library_service_project/db_pool/. Connections go
+# back to the pool after every request.
+if os.environ.get("DB_POOL_SIZE"):
+    DATABASES["default"].update(
+        ENGINE="library_service_project.db_pool",
+        CONN_MAX_AGE=0,
+        OPTIONS={
+            "pool": {
+                "max_size": int(os.environ["DB_POOL_SIZE"]),
+                "idle_timeout": int(
+                    os.environ.get("DB_POOL_IDLE_TIMEOUT", 300)
+                ),
+            }
+        },
+    )
+
+# A read replica of the primary, streaming replication is set up
+# outside of Django. Safe API requests and report tasks read it, see
+# library_service_project/routers.py. For tests it may be a second
+# local database (POSTGRES_REPLICA_NAME), the test runner creates both.
+REPLICA_DATABASE = None
+if os.environ.get("POSTGRES_REPLICA_HOST"):
+    REPLICA_DATABASE = "replica"
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES["default"],
+        "HOST": os.environ["POSTGRES_REPLICA_HOST"],
+        "PORT": os.environ.get(
+            "POSTGRES_REPLICA_PORT", DATABASES["default"]["PORT"]
+        ),
+        "NAME": os.environ.get(
+            "POSTGRES_REPLICA_NAME", DATABASES["default"]["NAME"]
+        ),
+    }
+
+DATABASE_ROUTERS = ["library_service_project.routers.ReplicaRouter"]
+
+# Seconds the reads of a user go to the primary after one of their
+# writes, more than the replication lag.
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+# The Redis from docker-compose (ex. redis://redis:6379/1) in production,
+# a per-process memory cache when REDIS_CACHE_URL is not set.
+if os.environ.get("REDIS_CACHE_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_CACHE_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# The denylist of revoked tokens (user.authentication.revoke_tokens) has
+# a cache of its own, so catalog pages never evict it. It must be shared
+# by every worker: a Redis of its own, or the one of REDIS_CACHE_URL.
+JWT_DENYLIST_CACHE = "jwt_denylist"
+JWT_DENYLIST_REDIS_URL = os.environ.get(
+    "JWT_DENYLIST_REDIS_URL", os.environ.get("REDIS_CACHE_URL")
+)
+if JWT_DENYLIST_REDIS_URL:
+    CACHES[JWT_DENYLIST_CACHE] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": JWT_DENYLIST_REDIS_URL,
+        "KEY_PREFIX": "jwt-denylist",
+    }
+else:
+    CACHES[JWT_DENYLIST_CACHE] = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "jwt-denylist",
+    }
+
+BOOK_CACHE_TIMEOUT = int(os.environ.get("BOOK_CACHE_TIMEOUT", 5 * 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -148,10 +247,28 @@ INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
+# Addresses or networks allowed to read /metrics, comma-separated (ex.
+# 127.0.0.1,10.0.0.0/8 for a Prometheus on the private network). The
+# client is REMOTE_ADDR: behind a reverse proxy, scrape the workers
+# directly rather than through the proxy.
+METRICS_ALLOWED_NETWORKS = os.environ.get(
+    "METRICS_ALLOWED_NETWORKS", "127.0.0.1,::1"
+).split(",")
+
+# user.authentication.StatelessJWTAuthentication builds the user from
+# the claims of the token, rest_framework_simplejwt.authentication.
+# JWTAuthentication loads it from the database on every request. The
+# former is only safe with a shared denylist (check user.E001), without
+# one the latter is the default.
+JWT_AUTHENTICATION = os.environ.get(
+    "JWT_AUTHENTICATION",
+    "user.authentication.StatelessJWTAuthentication"
+    if JWT_DENYLIST_REDIS_URL
+    else "rest_framework_simplejwt.authentication.JWTAuthentication",
+)
+
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
+    "DEFAULT_AUTHENTICATION_CLASSES": (JWT_AUTHENTICATION,),
     "DEFAULT_PERMISSION_CLASSES": [
         "book_service.permissions.IsAdminOrIfAuthenticatedReadOnly",
     ],
@@ -165,6 +282,9 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZE",
+    "TOKEN_USER_CLASS": "user.authentication.TokenUser",
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "user.serializers.TokenRefreshSerializer",
 }
 
 CELERY_BROKER_URL = os.environ["CELERY_BROKER_URL"]
@@ -172,6 +292,47 @@ CELERY_RESULT_BACKEND = os.environ["CELERY_RESULT_BACKEND"]
 CELERY_TIMEZONE = os.environ["TZ"]
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+CELERY_BEAT_SCHEDULE = {
+    "flush-notifications": {
+        "task": "notification.tasks.flush_notifications",
+        "schedule": 10.0,
+    },
+    "process-stripe-events": {
+        "task": "payment.tasks.process_stripe_events",
+        "schedule": 5.0,
+    },
+    "accrue-outstanding-fines": {
+        "task": "borrowing.tasks.accrue_outstanding_fines",
+        "schedule": crontab(hour=0, minute=30),
+    },
+    "refresh-stats": {
+        "task": "stats.tasks.refresh_stats",
+        "schedule": crontab(hour=0, minute=15),
+    },
+}
+
+# "payment.stripe_backends.FakeStripeBackend" runs the payment flow offline
+STRIPE_BACKEND = os.environ.get(
+    "STRIPE_BACKEND", "payment.stripe_backends.StripeBackend"
+)
+STRIPE_FAKE_LATENCY = float(os.environ.get("STRIPE_FAKE_LATENCY", 0))
+# One pooled HTTP session per process is shared by all Stripe calls
+STRIPE_TIMEOUT = float(os.environ.get("STRIPE_TIMEOUT", 10))
+STRIPE_MAX_NETWORK_RETRIES = int(
+    os.environ.get("STRIPE_MAX_NETWORK_RETRIES", 2)
+)
+STRIPE_POOL_SIZE = int(os.environ.get("STRIPE_POOL_SIZE", 10))
+
+# "notification.backends.LocalBackend" keeps messages in memory instead
+NOTIFICATION_BACKEND = os.environ.get(
+    "NOTIFICATION_BACKEND", "notification.backends.TelegramBackend"
+)
+# Telegram allows about 20 messages per minute to the same group, the
+# bucket is shared by all workers (notification.outbox.take_tokens)
+NOTIFICATION_RATE_LIMIT = float(
+    os.environ.get("NOTIFICATION_RATE_LIMIT", 20 / 60)
+)
+NOTIFICATION_BURST = int(os.environ.get("NOTIFICATION_BURST", 3))
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "Library Service Api",
@@ -0,0 +1,668 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    tag,
+)
+from django.urls import URLResolver, get_resolver, resolve, reverse
+from prometheus_client import REGISTRY
+from psycopg2 import extensions
+from rest_framework.test import (
+    APIClient,
+    APIRequestFactory,
+    force_authenticate,
+)
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book_service.management.commands.benchmark_api import DEFAULT_BASELINE
+from book_service.inventory import reserve_book
+from book_service.models import Book
+from book_service.tests import BOOK_URL, postgres_only, sample_book
+from book_service.views import BookViewSet
+from borrowing.models import Borrowing
+from borrowing.tasks import check_borrowings_overdue
+from borrowing.views import BorrowingViewSet
+from library_service_project.async_views import view_executor
+from library_service_project.benchmark import (
+    BENCHMARK_WEBHOOK_SECRET,
+    UNMEASURED_ROUTES,
+    Dataset,
+    compare,
+    get_endpoints,
+    measure,
+    seed_dataset,
+)
+from library_service_project.db_pool.pool import ConnectionPool, PoolTimeout
+from library_service_project.export import csv_lines, ndjson_lines
+from library_service_project.middleware import ReplicaMiddleware
+from library_service_project.routers import ReplicaRouter, use_replica
+from notification.models import Notification
+from payment.models import Payment
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.info = mock.Mock(
+            transaction_status=extensions.TRANSACTION_STATUS_IDLE
+        )
+        self.rollback = mock.Mock()
+        self.cursor = mock.MagicMock()
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.connect = mock.Mock(side_effect=FakeConnection)
+
+    def pool(self, **options):
+        return ConnectionPool("default", self.connect, **options)
+
+    def test_released_connection_is_reused(self):
+        pool = self.pool()
+
+        first = pool.getconn()
+        pool.putconn(first)
+
+        self.assertIs(pool.getconn(), first)
+        self.assertEqual(self.connect.call_count, 1)
+
+    def test_waits_for_a_release_up_to_the_timeout(self):
+        pool = self.pool(max_size=1, timeout=0.01)
+        pool.getconn()
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+    def test_connection_idle_too_long_is_closed(self):
+        pool = self.pool(idle_timeout=0)
+        first = pool.getconn()
+        pool.putconn(first)
+
+        second = pool.getconn()
+
+        self.assertTrue(first.closed)
+        self.assertIsNot(second, first)
+        self.assertEqual(pool.size, 1)
+
+    def test_stale_connection_is_replaced_after_failed_check(self):
+        pool = self.pool(check_after=0)
+        first = pool.getconn()
+        pool.putconn(first)
+        cursor = first.cursor.return_value.__enter__.return_value
+        cursor.execute.side_effect = extensions.QueryCanceledError
+
+        second = pool.getconn()
+
+        self.assertTrue(first.closed)
+        self.assertIsNot(second, first)
+        self.assertEqual(pool.size, 1)
+
+    def test_open_transaction_is_rolled_back_on_release(self):
+        pool = self.pool()
+        connection = pool.getconn()
+        connection.info.transaction_status = (
+            extensions.TRANSACTION_STATUS_INTRANS
+        )
+
+        pool.putconn(connection)
+
+        connection.rollback.assert_called_once()
+        self.assertIs(pool.getconn(), connection)
+
+    def test_closed_connection_frees_its_slot(self):
+        pool = self.pool(max_size=1, timeout=0.01)
+        connection = pool.getconn()
+        connection.close()
+
+        pool.putconn(connection)
+
+        self.assertIsNot(pool.getconn(), connection)
+
+
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(Book), DEFAULT_DB_ALIAS)
+
+    def test_reads_replica_when_enabled(self):
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Book), "replica")
+
+    def test_reads_primary_in_transaction(self):
+        with use_replica(), mock.patch.object(
+            connections[DEFAULT_DB_ALIAS], "in_atomic_block", True
+        ):
+            self.assertEqual(self.router.db_for_read(Book), DEFAULT_DB_ALIAS)
+
+    def test_writes_primary(self):
+        with use_replica():
+            self.assertEqual(self.router.db_for_write(Book), DEFAULT_DB_ALIAS)
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_reads_primary_without_replica(self):
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Book), DEFAULT_DB_ALIAS)
+
+
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.status = 200
+        self.read_from = None
+
+        def get_response(request):
+            self.read_from = ReplicaRouter().db_for_read(Book)
+            return HttpResponse(status=self.status)
+
+        self.middleware = ReplicaMiddleware(get_response)
+
+    def auth(self, user_id):
+        token = AccessToken.for_user(get_user_model()(id=user_id))
+        return {"HTTP_AUTHORIZE": f"Bearer {token}"}
+
+    def test_safe_api_request_reads_replica(self):
+        self.middleware(self.factory.get("/api/books/", **self.auth(1)))
+
+        self.assertEqual(self.read_from, "replica")
+
+    def test_unsafe_request_reads_primary(self):
+        self.middleware(self.factory.post("/api/borrowings/"))
+
+        self.assertEqual(self.read_from, DEFAULT_DB_ALIAS)
+
+    def test_other_pages_read_primary(self):
+        self.middleware(self.factory.get("/admin/"))
+
+        self.assertEqual(self.read_from, DEFAULT_DB_ALIAS)
+
+    def test_write_pins_user_to_primary(self):
+        self.middleware(self.factory.post("/api/borrowings/", **self.auth(1)))
+
+        self.middleware(self.factory.get("/api/borrowings/", **self.auth(1)))
+        self.assertEqual(self.read_from, DEFAULT_DB_ALIAS)
+        self.middleware(self.factory.get("/api/borrowings/", **self.auth(2)))
+        self.assertEqual(self.read_from, "replica")
+
+    def test_failed_write_does_not_pin(self):
+        self.status = 400
+        self.middleware(self.factory.post("/api/borrowings/", **self.auth(1)))
+
+        self.middleware(self.factory.get("/api/borrowings/", **self.auth(1)))
+        self.assertEqual(self.read_from, "replica")
+
+    @override_settings(REPLICA_PIN_SECONDS=-1)
+    def test_pin_expires(self):
+        self.middleware(self.factory.post("/api/borrowings/", **self.auth(1)))
+
+        self.middleware(self.factory.get("/api/borrowings/", **self.auth(1)))
+        self.assertEqual(self.read_from, "replica")
+
+
+@skipUnless(
+    settings.REPLICA_DATABASE,
+    "Set POSTGRES_REPLICA_HOST and POSTGRES_REPLICA_NAME to a second "
+    "local database.",
+)
+class ReplicaDatabaseTests(TransactionTestCase):
+    """
+    The two databases are not replicated here: rows created in only one
+    of them show which one served a request.
+    """
+
+    # The test runner would look for the alias even if the test is skipped.
+    databases = {
+        DEFAULT_DB_ALIAS,
+        settings.REPLICA_DATABASE or DEFAULT_DB_ALIAS,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("borrowing:borrowing-list")
+        for alias in self.databases:
+            user = (
+                get_user_model()
+                .objects.db_manager(alias)
+                .create_user(
+                    id=1, email="reader@example.com", password="password"
+                )
+            )
+            book = Book.objects.using(alias).create(
+                id=1,
+                title=f"Book in {alias}",
+                author="Author",
+                cover=Book.CoverChoices.HARD,
+                inventory=1,
+                daily_fee=1,
+            )
+            Borrowing.objects.using(alias).create(
+                book=book,
+                user=user,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+        self.headers = {
+            "HTTP_AUTHORIZE": f"Bearer {AccessToken.for_user(user)}"
+        }
+
+    def book_title(self, response):
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"][0]["book"]
+
+    def test_list_reads_replica(self):
+        response = self.client.get(self.url, **self.headers)
+
+        self.assertEqual(self.book_title(response), "Book in replica")
+
+    def test_reads_primary_after_write(self):
+        response = self.client.patch(
+            reverse("user:manage"),
+            {"first_name": "Reader"},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, **self.headers)
+
+        self.assertEqual(self.book_title(response), "Book in default")
+
+    def test_overdue_report_reads_replica(self):
+        Borrowing.objects.using(settings.REPLICA_DATABASE).update(
+            expected_return_date=date.today()
+        )
+
+        check_borrowings_overdue()
+
+        notification = Notification.objects.using(DEFAULT_DB_ALIAS).get()
+        self.assertIn("Book in replica", notification.message)
+        self.assertFalse(
+            Notification.objects.using(settings.REPLICA_DATABASE).exists()
+        )
+
+
+class ExportWriterTests(SimpleTestCase):
+    def test_rows_are_written_in_chunks(self):
+        rows = [(i, f"title {i}", None) for i in range(5)]
+
+        chunks = list(csv_lines(("id", "title", "date"), rows, chunk_size=2))
+
+        self.assertEqual(
+            chunks,
+            [
+                "id,title,date\r\n0,title 0,\r\n1,title 1,\r\n",
+                "2,title 2,\r\n3,title 3,\r\n",
+                "4,title 4,\r\n",
+            ],
+        )
+        self.assertEqual(list(csv_lines(("id",), [])), ["id\r\n"])
+        self.assertEqual(
+            list(ndjson_lines(("id",), [(date(2024, 1, 2),)], chunk_size=2)),
+            ['{"id":"2024-01-02"}\n'],
+        )
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsyncViewTests(TransactionTestCase):
+    def test_io_actions_run_on_the_pool(self):
+        user = get_user_model().objects.create_user(
+            email="async@test.com", password="password"
+        )
+        borrowing = Borrowing.objects.create(
+            book=Book.objects.create(
+                title="Async", author="Test", inventory=1, daily_fee=1
+            ),
+            user=user,
+            expected_return_date=date.today(),
+        )
+        # A pool of the test's own, so that the connection of its thread
+        # can be closed before the test database is dropped.
+        executor = ThreadPoolExecutor(1, thread_name_prefix="async-view")
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(
+            lambda: executor.submit(connections.close_all).result()
+        )
+        with mock.patch(
+            "library_service_project.async_views.view_executor", executor
+        ):
+            view = BorrowingViewSet.as_view({"post": "return_book"})
+        request = APIRequestFactory().post(f"/{borrowing.id}/return/")
+        force_authenticate(request, user)
+        threads = []
+        return_book = Borrowing.return_book
+
+        def record_thread(borrowing):
+            threads.append(threading.current_thread().name)
+            return return_book(borrowing)
+
+        self.assertTrue(iscoroutinefunction(view))
+        self.assertIs(view.cls, BorrowingViewSet)
+        with mock.patch.object(Borrowing, "return_book", record_thread):
+            response = async_to_sync(view)(request, pk=borrowing.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_rendered)
+        self.assertTrue(threads[0].startswith("async-view"))
+
+    def test_pool_has_asgi_threads(self):
+        self.assertEqual(view_executor._max_workers, settings.ASGI_THREADS)
+
+    def test_reads_stay_sync(self):
+        for view in (
+            BookViewSet.as_view({"get": "list"}),
+            BookViewSet.as_view({"get": "retrieve"}),
+            BorrowingViewSet.as_view({"get": "list", "post": "create"}),
+        ):
+            self.assertFalse(iscoroutinefunction(view))
+
+    @override_settings(ASYNC_VIEWS=False)
+    def test_views_stay_sync_without_async_views(self):
+        view = BorrowingViewSet.as_view({"post": "return_book"})
+
+        self.assertFalse(iscoroutinefunction(view))
+
+
+class ExplainQuerysetsCommandTests(TestCase):
+    @postgres_only
+    def test_prints_plan_for_every_queryset(self):
+        get_user_model().objects.create_user(
+            email="staff@test.com", password="Test122345", is_staff=True
+        )
+        get_user_model().objects.create_user(
+            email="member@test.com", password="Test122345"
+        )
+        out = StringIO()
+
+        call_command("explain_querysets", stdout=out)
+
+        output = out.getvalue()
+        for name in (
+            "books",
+            "overdue borrowings",
+            "borrowings (staff)",
+            "borrowings (member)",
+            "payments (member)",
+        ):
+            self.assertIn(name, output)
+
+
+API_NAMESPACES = ("book_service", "borrowing", "user", "payments")
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+def api_route_names():
+    """Names of the routes of the API apps and of the schema."""
+
+    names = {"schema"}
+    for pattern in get_resolver().url_patterns:
+        if (
+            isinstance(pattern, URLResolver)
+            and pattern.namespace in API_NAMESPACES
+        ):
+            names.update(route_names(pattern.url_patterns))
+    return names
+
+
+@tag("benchmark")
+@override_settings(STRIPE_BACKEND="payment.stripe_backends.FakeStripeBackend")
+@mock.patch.dict(
+    os.environ, {"STRIPE_WEBHOOK_SECRET": BENCHMARK_WEBHOOK_SECRET}
+)
+class ApiBenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = seed_dataset(Dataset(users=5, books=20, borrowings=50))
+        self.endpoints = get_endpoints(self.users)
+
+    def test_every_route_is_measured(self):
+        measured = {
+            resolve(urlsplit(endpoint.url).path).url_name
+            for endpoint in self.endpoints
+        }
+
+        self.assertEqual(
+            api_route_names() - UNMEASURED_ROUTES - measured, set()
+        )
+
+    def test_query_counts_match_baseline(self):
+        results = measure(self.endpoints, self.users, iterations=1)
+
+        baseline = json.loads(DEFAULT_BASELINE.read_text())
+        self.assertEqual(compare(results, baseline, 0, checks=()), [])
+
+
+@postgres_only
+class SeedLibraryCommandTests(TestCase):
+    def seed(self, **options):
+        options = {"users": 20, "books": 30, "borrowings": 300, **options}
+        call_command("seed_library", stdout=StringIO(), **options)
+
+    def test_inserts_rows_with_copy_and_bulk_create(self):
+        for method in ("copy", "bulk"):
+            with self.subTest(method=method):
+                Book.objects.all().delete()
+                get_user_model().objects.all().delete()
+
+                self.seed(method=method, batch_size=100)
+
+                self.assertEqual(get_user_model().objects.count(), 20)
+                self.assertEqual(Book.objects.count(), 30)
+                self.assertEqual(Borrowing.objects.count(), 300)
+                self.assertTrue(Borrowing.objects.overdue().exists())
+                self.assertTrue(
+                    Payment.objects.filter(
+                        type=Payment.TypeChoices.FINE.value
+                    ).exists()
+                )
+
+    def test_same_seed_generates_same_library(self):
+        def library():
+            return list(
+                Borrowing.objects.order_by("id").values_list(
+                    "book__title", "expected_return_date", "actual_return_data"
+                )
+            )
+
+        self.seed()
+        first = library()
+        Book.objects.all().delete()
+
+        self.seed()
+        self.assertEqual(library(), first)
+
+        self.seed(seed=7)
+        self.assertNotEqual(library()[300:], first)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        sample_book()
+
+    def sample(self, name, action="list"):
+        return (
+            REGISTRY.get_sample_value(
+                name, {"view": "BookViewSet", "action": action}
+            )
+            or 0
+        )
+
+    def test_requests_are_recorded_per_view_and_action(self):
+        count = self.sample("http_request_db_queries_count")
+        queries = self.sample("http_request_db_queries_sum")
+
+        self.client.get(BOOK_URL)
+
+        self.assertEqual(
+            self.sample("http_request_db_queries_count"), count + 1
+        )
+        self.assertEqual(
+            self.sample("http_request_db_queries_sum"), queries + 3
+        )
+        self.assertGreater(
+            REGISTRY.get_sample_value(
+                "http_request_duration_seconds_count",
+                {
+                    "view": "BookViewSet",
+                    "action": "list",
+                    "method": "GET",
+                    "status": "200",
+                },
+            ),
+            0,
+        )
+
+    def test_metrics_endpoint_is_not_recorded(self):
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"http_request_duration_seconds", response.content)
+        self.assertNotIn(b'view="metrics"', response.content)
+
+    def test_metrics_are_only_served_to_allowed_networks(self):
+        url = reverse("metrics")
+
+        response = self.client.get(url, REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(b"http_request", response.content)
+
+        with override_settings(
+            METRICS_ALLOWED_NETWORKS=["127.0.0.1", "203.0.113.0/24"]
+        ):
+            response = self.client.get(url, REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(response.status_code, 200)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = sample_book()
+        self.detail_url = reverse(
+            "book_service:book-detail", args=[self.book.id]
+        )
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get(BOOK_URL)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+    def test_changes_invalidate_etag(self):
+        etag = self.client.get(BOOK_URL)["ETag"]
+
+        reserve_book(self.book.id)
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        sample_book(title="Another")
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        self.book.delete()
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_page(self):
+        etag = self.client.get(BOOK_URL)["ETag"]
+
+        response = self.client.get(
+            BOOK_URL, {"limit": 1}, HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_supports_last_modified(self):
+        response = self.client.get(self.detail_url)
+
+        response = self.client.get(
+            self.detail_url,
+            HTTP_IF_MODIFIED_SINCE=response["Last-Modified"],
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_book_is_not_found(self):
+        url = reverse("book_service:book-detail", args=[self.book.id + 1])
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_loans_leave_updated_at_alone(self):
+        updated_at = self.book.updated_at
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        reserve_book(self.book.id)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.updated_at, updated_at)
+        # The inventory is shown, the book changed all the same.
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["inventory"], 1)
+
+    def test_loans_of_others_leave_borrowing_list_unchanged(self):
+        user, other = (
+            get_user_model().objects.create_user(
+                email=email, password="password"
+            )
+            for email in ("reader@test.com", "other@test.com")
+        )
+        borrowing = Borrowing.objects.create(
+            book=self.book, user=user, expected_return_date=date.today()
+        )
+        self.client.force_authenticate(user)
+        list_url = reverse("borrowing:borrowing-list")
+        detail_url = reverse("borrowing:borrowing-detail", args=[borrowing.id])
+        list_etag = self.client.get(list_url)["ETag"]
+        detail_etag = self.client.get(detail_url)["ETag"]
+
+        self.client.force_authenticate(other)
+        self.client.post(
+            list_url,
+            {"book": self.book.id, "expected_return_date": date.today()},
+        )
+        self.client.force_authenticate(user)
+
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 304)
+        # The detail shows the inventory of the book.
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
@@ -24,6 +24,8 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from library_service_project.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path(
@@ -33,7 +35,9 @@ urlpatterns = [
     path("api/borrowing/", include("borrowing.urls", namespace="borrowing")),
     path("api/user/", include("user.urls", namespace="user")),
     path("api/payments/", include("payment.urls", namespace="payments")),
+    path("api/stats/", include("stats.urls", namespace="stats")),
     path("__debug__/", include("debug_toolbar.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path("api/doc/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/doc/swagger/",
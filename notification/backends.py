@@ -0,0 +1,95 @@
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from library_service_project.clients import (
+    get_telegram_bot,
+    get_telegram_chat_id,
+)
+from library_service_project.metrics import TELEGRAM_REQUEST_DURATION
+
+# Seconds to wait after a 429 that does not say how long.
+DEFAULT_RETRY_AFTER = 30
+
+
+class RetryAfter(Exception):
+    """Raised by a backend when the chat is rate limited."""
+
+    def __init__(self, seconds):
+        super().__init__(f"Rate limited, retry after {seconds}s")
+        self.seconds = seconds
+
+
+def is_markdown_error(exc):
+    """Whether Telegram rejected the Markdown of the message."""
+
+    return exc.error_code == 400 and "can't parse entities" in (
+        exc.description or ""
+    )
+
+
+class TelegramBackend:
+    """
+    Delivers notifications to the library Telegram chat, formatted as
+    Markdown, or as plain text when Telegram cannot parse it.
+    """
+
+    def __init__(self):
+        self.bot = get_telegram_bot()
+        self.chat_id = get_telegram_chat_id()
+
+    def send_message(self, text):
+        from telebot.apihelper import ApiTelegramException
+
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            try:
+                self.bot.send_message(
+                    self.chat_id, text, parse_mode="Markdown"
+                )
+            except ApiTelegramException as exc:
+                # A message with Markdown Telegram rejects, such as a
+                # title with a stray "*", must not hold back the digest.
+                if not is_markdown_error(exc):
+                    raise
+                self.bot.send_message(self.chat_id, text)
+            outcome = "success"
+        except ApiTelegramException as exc:
+            if exc.error_code == 429:
+                outcome = "rate_limited"
+                parameters = (exc.result_json or {}).get("parameters") or {}
+                raise RetryAfter(
+                    parameters.get("retry_after", DEFAULT_RETRY_AFTER)
+                ) from exc
+            raise
+        finally:
+            TELEGRAM_REQUEST_DURATION.labels(outcome).observe(
+                time.perf_counter() - start
+            )
+
+
+class LocalBackend:
+    """
+    Fake bot for tests and offline runs.
+
+    Messages are kept in memory (LocalBackend.sent) instead of being
+    sent anywhere. Set LocalBackend.error to an exception instance to
+    make the next send fail with it.
+    """
+
+    sent = []
+    error = None
+
+    def send_message(self, text):
+        if LocalBackend.error is not None:
+            error, LocalBackend.error = LocalBackend.error, None
+            raise error
+        LocalBackend.sent.append(text)
+
+
+def get_notification_backend():
+    """Return an instance of the backend configured by NOTIFICATION_BACKEND."""
+
+    return import_string(settings.NOTIFICATION_BACKEND)()
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+
+def create_telegram_bucket(apps, schema_editor):
+    # The row take_tokens() locks, created here so concurrent workers
+    # never race to insert it. Refilled long ago, it is full at the
+    # first flush.
+    apps.get_model("notification", "TokenBucket").objects.using(
+        schema_editor.connection.alias
+    ).get_or_create(
+        name="telegram",
+        defaults={
+            "tokens": 0,
+            "updated_at": datetime(2000, 1, 1, tzinfo=timezone.utc),
+        },
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notification", "0002_tokenbucket"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_telegram_bucket, migrations.RunPython.noop
+        ),
+    ]
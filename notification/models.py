@@ -0,0 +1,50 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Notification(models.Model):
+    """A Telegram message waiting in the outbox to be delivered."""
+
+    class StatusChoices(models.Choices):
+        PENDING = "Pending"
+        SENT = "Sent"
+        FAILED = "Failed"
+
+    message = models.TextField()
+    status = models.CharField(
+        max_length=8,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING.value,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                name="notification_due_idx",
+                condition=models.Q(status="Pending"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.status} notification #{self.id}"
+
+
+class TokenBucket(models.Model):
+    """
+    Send tokens of a rate-limited chat, shared by every worker.
+
+    See notification.outbox.take_tokens.
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.2f} tokens"
@@ -0,0 +1,237 @@
+from datetime import timedelta
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from notification.backends import RetryAfter, get_notification_backend
+from notification.models import Notification, TokenBucket
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n"
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+# A claimed notification becomes due again after this long, so rows
+# claimed by a worker that died are picked up by the next flush.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+TELEGRAM_BUCKET = "telegram"
+
+
+def take_tokens(wanted, name=TELEGRAM_BUCKET):
+    """
+    Take up to `wanted` send tokens from the bucket of the chat.
+
+    The bucket is refilled at NOTIFICATION_RATE_LIMIT tokens per second,
+    up to NOTIFICATION_BURST. It is a row locked for the update, so the
+    flushes of every worker share the rate and never spend the same
+    tokens. The row of the Telegram chat is created by a migration,
+    another is created on first use.
+
+    Returns:
+    - int: Number of tokens taken, from 0 to `wanted`.
+    """
+
+    rate = settings.NOTIFICATION_RATE_LIMIT
+    capacity = settings.NOTIFICATION_BURST
+    with transaction.atomic():
+        bucket, _ = TokenBucket.objects.select_for_update().get_or_create(
+            name=name,
+            defaults={"tokens": capacity, "updated_at": timezone.now()},
+        )
+        now = timezone.now()
+        elapsed = max(0.0, (now - bucket.updated_at).total_seconds())
+        tokens = min(capacity, bucket.tokens + elapsed * rate)
+        taken = min(wanted, int(tokens))
+        bucket.tokens = tokens - taken
+        bucket.updated_at = now
+        bucket.save(update_fields=["tokens", "updated_at"])
+    return taken
+
+
+def enqueue_notification(message):
+    """Add a message to the outbox, it is sent by the next flush."""
+
+    return Notification.objects.create(message=message)
+
+
+def enqueue_notifications(messages, batch_size=100):
+    """Add messages from any iterable to the outbox in bulk batches."""
+
+    messages = iter(messages)
+    count = 0
+    while batch := list(islice(messages, batch_size)):
+        Notification.objects.bulk_create(
+            Notification(message=message) for message in batch
+        )
+        count += len(batch)
+    return count
+
+
+def telegram_length(text):
+    """
+    Length of the text as Telegram counts it, in UTF-16 code units.
+
+    An emoji outside the Basic Multilingual Plane is one character in
+    Python but two units for Telegram.
+    """
+
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    Cut the text to at most `limit` UTF-16 code units.
+
+    A surrogate pair cut in half is dropped whole.
+    """
+
+    if len(text) * 2 <= limit:
+        return text
+    return text.encode("utf-16-le")[: limit * 2].decode(
+        "utf-16-le", errors="ignore"
+    )
+
+
+def split_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Split the text into pieces of at most `limit` UTF-16 code units."""
+
+    while text:
+        # A limit too small for the next character still makes progress.
+        piece = truncate_message(text, limit) or text[0]
+        yield piece
+        text = text.removeprefix(piece)
+
+
+def coalesce(notifications, limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    Pack notifications into digests of at most `limit` characters.
+
+    Lengths are counted as Telegram does, see telegram_length(). Yields
+    (text, notifications) pairs, keeping the outbox order. A message
+    longer than the limit is truncated and sent on its own.
+    """
+
+    separator = telegram_length(DIGEST_SEPARATOR)
+    text, length, group = "", 0, []
+    for notification in notifications:
+        message = truncate_message(notification.message, limit)
+        size = telegram_length(message)
+        if group and length + separator + size > limit:
+            yield text, group
+            text, length, group = "", 0, []
+        if group:
+            text, length = f"{text}{DIGEST_SEPARATOR}", length + separator
+        text, length = text + message, length + size
+        group.append(notification)
+
+    if group:
+        yield text, group
+
+
+def backoff(attempt):
+    """Delay before retrying a notification that failed `attempt` times."""
+
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+
+
+def flush_outbox(batch_size=100):
+    """
+    Deliver due notifications as digest messages.
+
+    Due rows are claimed in a short transaction (skipping rows locked by
+    a concurrent flush) and sent outside of it, at most
+    NOTIFICATION_RATE_LIMIT messages per second across all workers.
+    Digests without a token are not waited for, they are released for
+    the next flush. Failed digests are retried with exponential
+    backoff, up to MAX_ATTEMPTS times.
+
+    Returns:
+    - int: Number of digest messages sent.
+    """
+
+    notifications = _claim_due(batch_size)
+    if not notifications:
+        return 0
+
+    digests = list(coalesce(notifications))
+    allowed = take_tokens(len(digests))
+    _release([n.id for _, group in digests[allowed:] for n in group])
+
+    backend = get_notification_backend()
+    sent = 0
+    for index, (text, group) in enumerate(digests[:allowed]):
+        try:
+            backend.send_message(text)
+        except RetryAfter as exc:
+            # The whole chat is throttled, stop and come back later
+            # without counting it as a failed attempt.
+            postponed = [
+                n.id for _, rest in digests[index:allowed] for n in rest
+            ]
+            Notification.objects.filter(id__in=postponed).update(
+                next_attempt_at=timezone.now()
+                + timedelta(seconds=exc.seconds),
+                last_error=str(exc),
+            )
+            break
+        except Exception as exc:
+            _schedule_retry(group, exc)
+        else:
+            Notification.objects.filter(
+                id__in=[notification.id for notification in group]
+            ).update(
+                status=Notification.StatusChoices.SENT.value,
+                attempts=F("attempts") + 1,
+                sent_at=timezone.now(),
+            )
+            sent += 1
+    return sent
+
+
+def _claim_due(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        notifications = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(
+                status=Notification.StatusChoices.PENDING.value,
+                next_attempt_at__lte=now,
+            )
+            .order_by("id")[:batch_size]
+        )
+        Notification.objects.filter(
+            id__in=[notification.id for notification in notifications]
+        ).update(next_attempt_at=now + CLAIM_TIMEOUT)
+    return notifications
+
+
+def _release(notification_ids):
+    # Due again, in their order, for the next flush.
+    if notification_ids:
+        Notification.objects.filter(id__in=notification_ids).update(
+            next_attempt_at=timezone.now()
+        )
+
+
+def _schedule_retry(group, exc):
+    now = timezone.now()
+    group = sorted(group, key=lambda notification: notification.attempts)
+    for attempts, same_attempts in groupby(
+        group, key=lambda notification: notification.attempts
+    ):
+        attempt = attempts + 1
+        if attempt >= MAX_ATTEMPTS:
+            status = Notification.StatusChoices.FAILED.value
+        else:
+            status = Notification.StatusChoices.PENDING.value
+        Notification.objects.filter(
+            id__in=[notification.id for notification in same_attempts]
+        ).update(
+            status=status,
+            attempts=attempt,
+            next_attempt_at=now + backoff(attempt),
+            last_error=repr(exc),
+        )
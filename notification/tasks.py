@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from notification.outbox import flush_outbox
+
+
+@shared_task
+def flush_notifications():
+    """
+    Send pending notifications from the outbox to the Telegram chat.
+
+    By default, every 10 seconds
+    """
+
+    return flush_outbox()
@@ -0,0 +1,285 @@
+import os
+from datetime import timedelta
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from library_service_project.clients import reset_clients
+from notification import outbox
+from notification.backends import (
+    DEFAULT_RETRY_AFTER,
+    LocalBackend,
+    RetryAfter,
+    TelegramBackend,
+)
+from notification.models import Notification, TokenBucket
+from notification.outbox import (
+    TELEGRAM_BUCKET,
+    coalesce,
+    enqueue_notification,
+    enqueue_notifications,
+    flush_outbox,
+    take_tokens,
+    telegram_length,
+    truncate_message,
+)
+
+
+@override_settings(
+    NOTIFICATION_BACKEND="notification.backends.LocalBackend",
+    NOTIFICATION_RATE_LIMIT=1000,
+    NOTIFICATION_BURST=1000,
+)
+class FlushOutboxTests(TestCase):
+    def setUp(self):
+        LocalBackend.sent = []
+        LocalBackend.error = None
+
+    def test_pending_notifications_are_sent_as_one_digest(self):
+        enqueue_notifications(f"message {i}" for i in range(3))
+
+        self.assertEqual(flush_outbox(), 1)
+
+        self.assertEqual(
+            LocalBackend.sent, ["message 0\n\nmessage 1\n\nmessage 2"]
+        )
+        self.assertFalse(
+            Notification.objects.exclude(
+                status=Notification.StatusChoices.SENT.value
+            ).exists()
+        )
+        self.assertEqual(flush_outbox(), 0)
+
+    def test_failed_digest_is_retried_with_backoff(self):
+        notification = enqueue_notification("message")
+        LocalBackend.error = ConnectionError("offline")
+
+        self.assertEqual(flush_outbox(), 0)
+
+        notification.refresh_from_db()
+        self.assertEqual(
+            notification.status, Notification.StatusChoices.PENDING.value
+        )
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn("offline", notification.last_error)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(flush_outbox(), 1)
+        self.assertEqual(LocalBackend.sent, ["message"])
+
+    def test_notification_fails_after_max_attempts(self):
+        notification = enqueue_notification("message")
+        Notification.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+        LocalBackend.error = ConnectionError("offline")
+
+        flush_outbox()
+
+        notification.refresh_from_db()
+        self.assertEqual(
+            notification.status, Notification.StatusChoices.FAILED.value
+        )
+
+    def test_rate_limited_chat_postpones_without_an_attempt(self):
+        notification = enqueue_notification("message")
+        LocalBackend.error = RetryAfter(30)
+
+        self.assertEqual(flush_outbox(), 0)
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.attempts, 0)
+        self.assertGreater(
+            notification.next_attempt_at,
+            timezone.now() + timedelta(seconds=20),
+        )
+
+
+class CoalesceTests(TestCase):
+    def test_digests_respect_limit(self):
+        notifications = [
+            Notification(message="x" * 40),
+            Notification(message="y" * 40),
+            Notification(message="z" * 200),
+        ]
+
+        digests = list(coalesce(notifications, limit=100))
+
+        self.assertEqual([len(group) for _, group in digests], [2, 1])
+        for text, _ in digests:
+            self.assertLessEqual(len(text), 100)
+
+    def test_emoji_count_as_two_units(self):
+        notifications = [
+            Notification(message="📚" * 30),
+            Notification(message="📚" * 30),
+        ]
+
+        digests = list(coalesce(notifications, limit=100))
+
+        self.assertEqual([len(group) for _, group in digests], [1, 1])
+        for text, _ in digests:
+            self.assertEqual(telegram_length(text), 60)
+
+    def test_truncation_keeps_surrogate_pairs_whole(self):
+        self.assertEqual(telegram_length("a📚"), 3)
+        self.assertEqual(truncate_message("a📚b", 2), "a")
+        self.assertEqual(truncate_message("a📚b", 3), "a📚")
+
+
+@override_settings(NOTIFICATION_RATE_LIMIT=0.5, NOTIFICATION_BURST=2)
+class TokenBucketTests(TestCase):
+    def test_telegram_bucket_is_created_full(self):
+        self.assertTrue(
+            TokenBucket.objects.filter(name=TELEGRAM_BUCKET).exists()
+        )
+        self.assertEqual(take_tokens(3), 2)
+
+    def test_burst_then_refill(self):
+        self.assertEqual(take_tokens(3), 2)
+        self.assertEqual(take_tokens(1), 0)
+
+        # Four seconds later, two tokens at 0.5 per second.
+        TokenBucket.objects.update(
+            updated_at=timezone.now() - timedelta(seconds=4)
+        )
+        self.assertEqual(take_tokens(5), 2)
+
+    @override_settings(
+        NOTIFICATION_BACKEND="notification.backends.LocalBackend"
+    )
+    def test_flush_sends_only_digests_with_a_token(self):
+        LocalBackend.sent = []
+        LocalBackend.error = None
+        enqueue_notifications("x" * 3000 for _ in range(3))
+
+        self.assertEqual(flush_outbox(), 2)
+
+        self.assertEqual(len(LocalBackend.sent), 2)
+        unsent = Notification.objects.get(
+            status=Notification.StatusChoices.PENDING.value
+        )
+        self.assertEqual(unsent.attempts, 0)
+        self.assertLessEqual(unsent.next_attempt_at, timezone.now())
+        self.assertEqual(flush_outbox(), 0)
+        self.assertLess(
+            TokenBucket.objects.get(name=TELEGRAM_BUCKET).tokens, 1
+        )
+
+
+class TelegramBackendTests(TestCase):
+    def setUp(self):
+        reset_clients()
+        self.addCleanup(reset_clients)
+
+    def test_missing_token_is_reported_on_first_use(self):
+        with mock.patch.dict(os.environ, clear=True):
+            with self.assertRaisesMessage(
+                ImproperlyConfigured, "TELEGRAM_BOT_TOKEN"
+            ):
+                TelegramBackend()
+
+    def test_rate_limited_call_is_recorded(self):
+        from telebot.apihelper import ApiTelegramException
+
+        env = {"TELEGRAM_BOT_TOKEN": "123:abc", "TELEGRAM_CHAT_ID": "1"}
+        with mock.patch.dict(os.environ, env):
+            backend = TelegramBackend()
+        backend.bot = mock.Mock()
+        backend.bot.send_message.side_effect = ApiTelegramException(
+            "sendMessage",
+            mock.Mock(),
+            {
+                "error_code": 429,
+                "description": "Too Many Requests",
+                "parameters": {"retry_after": 3},
+            },
+        )
+        labels = {"outcome": "rate_limited"}
+        before = REGISTRY.get_sample_value(
+            "telegram_request_duration_seconds_count", labels
+        )
+
+        with self.assertRaises(RetryAfter):
+            backend.send_message("Hello")
+
+        self.assertEqual(
+            REGISTRY.get_sample_value(
+                "telegram_request_duration_seconds_count", labels
+            ),
+            (before or 0) + 1,
+        )
+
+    def test_rate_limited_call_without_retry_after(self):
+        from telebot.apihelper import ApiTelegramException
+
+        env = {"TELEGRAM_BOT_TOKEN": "123:abc", "TELEGRAM_CHAT_ID": "1"}
+        with mock.patch.dict(os.environ, env):
+            backend = TelegramBackend()
+        backend.bot = mock.Mock()
+        backend.bot.send_message.side_effect = ApiTelegramException(
+            "sendMessage",
+            mock.Mock(),
+            {"error_code": 429, "description": "Too Many Requests"},
+        )
+
+        with self.assertRaises(RetryAfter) as raised:
+            backend.send_message("Hello")
+
+        self.assertEqual(raised.exception.seconds, DEFAULT_RETRY_AFTER)
+
+    def test_message_telegram_cannot_parse_is_sent_as_plain_text(self):
+        from telebot.apihelper import ApiTelegramException
+
+        env = {"TELEGRAM_BOT_TOKEN": "123:abc", "TELEGRAM_CHAT_ID": "1"}
+        with mock.patch.dict(os.environ, env):
+            backend = TelegramBackend()
+        backend.bot = mock.Mock()
+        backend.bot.send_message.side_effect = [
+            ApiTelegramException(
+                "sendMessage",
+                mock.Mock(),
+                {
+                    "error_code": 400,
+                    "description": "Bad Request: can't parse entities: "
+                    "Can't find end of the entity starting at byte "
+                    "offset 6",
+                },
+            ),
+            None,
+        ]
+
+        backend.send_message("Hello *")
+
+        self.assertEqual(
+            backend.bot.send_message.call_args_list,
+            [
+                mock.call("1", "Hello *", parse_mode="Markdown"),
+                mock.call("1", "Hello *"),
+            ],
+        )
+
+    def test_other_bad_request_is_not_resent(self):
+        from telebot.apihelper import ApiTelegramException
+
+        env = {"TELEGRAM_BOT_TOKEN": "123:abc", "TELEGRAM_CHAT_ID": "1"}
+        with mock.patch.dict(os.environ, env):
+            backend = TelegramBackend()
+        backend.bot = mock.Mock()
+        backend.bot.send_message.side_effect = ApiTelegramException(
+            "sendMessage",
+            mock.Mock(),
+            {"error_code": 400, "description": "Bad Request: chat not found"},
+        )
+
+        with self.assertRaises(ApiTelegramException):
+            backend.send_message("Hello")
+
+        self.assertEqual(backend.bot.send_message.call_count, 1)
+
+    def test_bot_is_built_once_per_process(self):
+        env = {"TELEGRAM_BOT_TOKEN": "123:abc", "TELEGRAM_CHAT_ID": "1"}
+        with mock.patch.dict(os.environ, env):
+            self.assertIs(TelegramBackend().bot, TelegramBackend().bot)
@@ -0,0 +1,158 @@
+"""
+Rental fees and fines of borrowings.
+
+The scalar functions price one borrowing, the expressions price any
+queryset of borrowings in SQL, so a set of any size is annotated,
+filtered or summed by Postgres without loading its rows.
+
+- rental fee: (expected_return_date - borrow_date + 1) * daily_fee
+- fine: (on_date - expected_return_date + 1) * daily_fee * FINE_MULTIPLIER,
+  accrued by an active borrowing from the day after its expected return
+  date, when returning it requires paying the fine.
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Func,
+    IntegerField,
+    Q,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+FINE_MULTIPLIER = 2
+
+AMOUNT_FIELD = DecimalField(max_digits=12, decimal_places=2)
+ZERO = Decimal("0.00")
+
+
+def rental_fee(borrow_date, expected_return_date, daily_fee):
+    return ((expected_return_date - borrow_date).days + 1) * daily_fee
+
+
+def fine(expected_return_date, daily_fee, on_date=None):
+    days = ((on_date or date.today()) - expected_return_date).days + 1
+    return days * daily_fee * FINE_MULTIPLIER
+
+
+def accrued_fine(borrowing, on_date=None):
+    """The fine of the borrowing if it is returned on the date (today)."""
+
+    on_date = on_date or date.today()
+    if (
+        borrowing.actual_return_data is not None
+        or borrowing.expected_return_date >= on_date
+    ):
+        return ZERO
+    return fine(
+        borrowing.expected_return_date, borrowing.book.daily_fee, on_date
+    )
+
+
+class DaysBetween(Func):
+    """Days from `start` to `end`, Postgres subtracts dates to an integer."""
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite subtracts dates as strings, compare their day numbers.
+        return super().as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+
+def late(on_date=None):
+    """Q of the borrowings accruing a fine on the date (today)."""
+
+    return Q(
+        actual_return_data__isnull=True,
+        expected_return_date__lt=on_date or date.today(),
+    )
+
+
+def days_late_expression(on_date=None):
+    return DaysBetween(
+        Value(on_date or date.today()), F("expected_return_date")
+    )
+
+
+def rental_fee_expression():
+    return ExpressionWrapper(
+        (DaysBetween(F("expected_return_date"), F("borrow_date")) + 1)
+        * F("book__daily_fee"),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def fine_expression(on_date=None):
+    """The accrued_fine() of the borrowing of each row."""
+
+    on_date = on_date or date.today()
+    return Case(
+        When(
+            late(on_date),
+            then=ExpressionWrapper(
+                (days_late_expression(on_date) + 1)
+                * F("book__daily_fee")
+                * FINE_MULTIPLIER,
+                output_field=AMOUNT_FIELD,
+            ),
+        ),
+        default=Value(ZERO),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def returned_fine_expression():
+    """The fine of each borrowing if it was returned late, as of its return."""
+
+    return ExpressionWrapper(
+        (DaysBetween(F("actual_return_data"), F("expected_return_date")) + 1)
+        * F("book__daily_fee")
+        * FINE_MULTIPLIER,
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def with_prices(queryset, on_date=None):
+    """Annotate the borrowings with their rental_fee and fine."""
+
+    return queryset.annotate(
+        rental_fee=rental_fee_expression(), fine=fine_expression(on_date)
+    )
+
+
+def fine_totals(queryset, on_date=None):
+    """
+    Returns:
+    - dict: The number of borrowings of the queryset accruing a fine on
+      the date (today) and the sum of their fines, in one query.
+    """
+
+    on_date = on_date or date.today()
+    return queryset.filter(late(on_date)).aggregate(
+        count=Count("id"),
+        total=Coalesce(
+            Sum(fine_expression(on_date)),
+            Value(ZERO),
+            output_field=AMOUNT_FIELD,
+        ),
+    )
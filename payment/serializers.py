@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from borrowing.models import Borrowing, FineBalance
 from payment.models import Payment
 
 
@@ -25,7 +26,7 @@ class PaymentListSerializer(PaymentSerializer):
 
 class PaymentDetailSerializer(PaymentSerializer):
     book = serializers.CharField(
-        source="borrowing.book_id.title", read_only=True
+        source="borrowing.book.title", read_only=True
     )
     return_date = serializers.CharField(
         source="borrowing.expected_return_date", read_only=True
@@ -42,3 +43,38 @@ class PaymentDetailSerializer(PaymentSerializer):
             "session_url",
             "session_id",
         )
+
+
+class OutstandingFinesFilterSerializer(serializers.Serializer):
+    """The ?user_id= of the outstanding fines, for staff."""
+
+    user_id = serializers.IntegerField(required=False, min_value=1)
+
+
+class OutstandingFineSerializer(serializers.ModelSerializer):
+    """A late borrowing annotated by PaymentViewSet.outstanding_fines."""
+
+    book = serializers.CharField(source="book.title", read_only=True)
+    days_late = serializers.IntegerField(read_only=True)
+    fine = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = Borrowing
+        fields = (
+            "id",
+            "user",
+            "book",
+            "expected_return_date",
+            "days_late",
+            "fine",
+        )
+
+
+class FineBalanceSerializer(serializers.ModelSerializer):
+    email = serializers.CharField(source="user.email", read_only=True)
+
+    class Meta:
+        model = FineBalance
+        fields = ("user", "email", "amount", "borrowings", "accrued_on")
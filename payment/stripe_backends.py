@@ -0,0 +1,56 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from library_service_project.clients import get_stripe_client
+
+
+class StripeBackend:
+    """Creates Checkout sessions through the Stripe API."""
+
+    def create_checkout_session(self, idempotency_key=None, **params):
+        options = {}
+        if idempotency_key is not None:
+            options["idempotency_key"] = idempotency_key
+        return get_stripe_client().checkout.sessions.create(
+            params=params, options=options
+        )
+
+
+class FakeStripeBackend:
+    """
+    Offline stand-in for Stripe, used by tests and load tests.
+
+    Sessions are built locally and look like the real ones as far as
+    this project is concerned (id, url, amount_total).
+    STRIPE_FAKE_LATENCY seconds of sleep can be added to every call
+    to simulate the Stripe round trip. Like Stripe, calls repeated with
+    the same idempotency key return the same session id.
+    """
+
+    def create_checkout_session(self, idempotency_key=None, **params):
+        time.sleep(getattr(settings, "STRIPE_FAKE_LATENCY", 0))
+
+        if idempotency_key is None:
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+        else:
+            key = uuid.uuid5(uuid.NAMESPACE_URL, idempotency_key)
+            session_id = f"cs_test_{key.hex}"
+        amount_total = sum(
+            item["price_data"]["unit_amount"] * item["quantity"]
+            for item in params["line_items"]
+        )
+        return SimpleNamespace(
+            id=session_id,
+            url=f"https://checkout.stripe.com/c/pay/{session_id}",
+            amount_total=amount_total,
+        )
+
+
+def get_stripe_backend():
+    """Return an instance of the backend configured by STRIPE_BACKEND."""
+
+    return import_string(settings.STRIPE_BACKEND)()
@@ -1,12 +1,13 @@
-import os
+import time
 from datetime import date
+from urllib.parse import urljoin
 
-import stripe
 from django.urls import reverse
 
-
-stripe.api_key = os.environ["STRIPE_SECRET_KEY"]
-FINE_MULTIPLIER = 2
+from library_service_project.clients import get_stripe_webhook_secret
+from library_service_project.metrics import STRIPE_REQUEST_DURATION
+from payment.pricing import fine, rental_fee
+from payment.stripe_backends import get_stripe_backend
 
 
 def calculate_amount_borrowing(borrowing):
@@ -18,9 +19,11 @@ def calculate_amount_borrowing(borrowing):
         borrowing (Borrowing): The Borrowing object representing
         the book borrowing."""
 
-    sum_days = borrowing.expected_return_date - borrowing.borrow_date
-    amount = (sum_days.days + 1) * borrowing.book.daily_fee
-    return amount
+    return rental_fee(
+        borrowing.borrow_date,
+        borrowing.expected_return_date,
+        borrowing.book.daily_fee,
+    )
 
 
 def calculate_amount_fine(borrowing):
@@ -32,14 +35,17 @@ def calculate_amount_fine(borrowing):
         borrowing (Borrowing): The Borrowing object
         representing the overdue book."""
 
-    sum_days = date.today() - borrowing.expected_return_date
-    amount = (sum_days.days + 1) * borrowing.book.daily_fee * FINE_MULTIPLIER
-    return amount
+    return fine(borrowing.expected_return_date, borrowing.book.daily_fee)
 
 
-def create_checkout_session(borrowing, request):
+def create_checkout_session(borrowing, base_url):
 
-    """Creates a Stripe Checkout session for initial borrowing payment."""
+    """Creates a Stripe Checkout session for initial borrowing payment.
+
+    Args:
+        borrowing (Borrowing): The Borrowing object to pay for.
+        base_url (str): Absolute URL of the site, used to build
+        the success and cancel redirects."""
 
     success_url = reverse(
         "payments:payment-success", kwargs={"pk": borrowing.id}
@@ -48,7 +54,9 @@ def create_checkout_session(borrowing, request):
         "payments:payment-cancel", kwargs={"pk": borrowing.id}
     )
 
-    session = stripe.checkout.Session.create(
+    session = _create_session(
+        "checkout",
+        idempotency_key=f"borrowing-{borrowing.id}-checkout",
         line_items=[
             {
                 "price_data": {
@@ -64,15 +72,65 @@ def create_checkout_session(borrowing, request):
             }
         ],
         mode="payment",
-        success_url=request.build_absolute_uri(success_url),
-        cancel_url=request.build_absolute_uri(cancel_url),
+        success_url=urljoin(base_url, success_url),
+        cancel_url=urljoin(base_url, cancel_url),
     )
     return session
 
 
-def create_fine_session(borrowing, request):
+def create_batch_checkout_session(borrowings, base_url):
+
+    """Creates one Stripe Checkout session paying for several borrowings.
 
-    """Creates a Stripe Checkout session for fine borrowing payment."""
+    Args:
+        borrowings (list): The Borrowing objects checked out together,
+        one line item is created per borrowing.
+        base_url (str): Absolute URL of the site, used to build
+        the success and cancel redirects."""
+
+    first = borrowings[0]
+    success_url = reverse(
+        "payments:payment-success", kwargs={"pk": first.id}
+    )
+    cancel_url = reverse(
+        "payments:payment-cancel", kwargs={"pk": first.id}
+    )
+
+    session = _create_session(
+        "batch_checkout",
+        idempotency_key=(
+            f"borrowing-{first.id}-batch-checkout-{len(borrowings)}"
+        ),
+        line_items=[
+            {
+                "price_data": {
+                    "currency": "usd",
+                    "product_data": {
+                        "name": borrowing.book.title,
+                    },
+                    "unit_amount": int(
+                        calculate_amount_borrowing(borrowing) * 100
+                    ),
+                },
+                "quantity": 1,
+            }
+            for borrowing in borrowings
+        ],
+        mode="payment",
+        success_url=urljoin(base_url, success_url),
+        cancel_url=urljoin(base_url, cancel_url),
+    )
+    return session
+
+
+def create_fine_session(borrowing, base_url):
+
+    """Creates a Stripe Checkout session for fine borrowing payment.
+
+    Args:
+        borrowing (Borrowing): The overdue Borrowing object.
+        base_url (str): Absolute URL of the site, used to build
+        the success and cancel redirects."""
 
     success_url = reverse(
         "payments:payment-fine-success", kwargs={"pk": borrowing.id}
@@ -81,7 +139,11 @@ def create_fine_session(borrowing, request):
         "payments:payment-cancel", kwargs={"pk": borrowing.id}
     )
 
-    session = stripe.checkout.Session.create(
+    # The fine grows every day and so does its key: a retry on the same day
+    # gets the same session, a request on the next day a new one.
+    session = _create_session(
+        "fine",
+        idempotency_key=f"borrowing-{borrowing.id}-fine-{date.today()}",
         line_items=[
             {
                 "price_data": {
@@ -95,7 +157,44 @@ def create_fine_session(borrowing, request):
             }
         ],
         mode="payment",
-        success_url=request.build_absolute_uri(success_url),
-        cancel_url=request.build_absolute_uri(cancel_url),
+        success_url=urljoin(base_url, success_url),
+        cancel_url=urljoin(base_url, cancel_url),
     )
     return session
+
+
+def verify_webhook_event(payload, signature):
+
+    """Check the signature of a Stripe webhook request and parse it.
+
+    Args:
+        payload (bytes): Raw request body.
+        signature (str): Value of the Stripe-Signature header.
+
+    Returns:
+        stripe.Event: The verified event.
+
+    Raises:
+        ValueError: If the payload or the signature is invalid."""
+
+    import stripe
+
+    try:
+        return stripe.Webhook.construct_event(
+            payload, signature, get_stripe_webhook_secret()
+        )
+    except stripe.SignatureVerificationError as exc:
+        raise ValueError(str(exc)) from exc
+
+
+def _create_session(operation, **params):
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        session = get_stripe_backend().create_checkout_session(**params)
+        outcome = "success"
+        return session
+    finally:
+        STRIPE_REQUEST_DURATION.labels(operation, outcome).observe(
+            time.perf_counter() - start
+        )
@@ -0,0 +1,131 @@
+from celery import shared_task
+from django.db import transaction
+from django.utils import timezone
+
+from borrowing.models import Borrowing
+from payment.models import Payment, StripeEvent
+from payment.stripe_helper import (
+    create_batch_checkout_session,
+    create_checkout_session,
+    create_fine_session,
+)
+from stats.counters import record_payments
+
+
+@shared_task
+def create_payment_session(payment_id, base_url):
+    """
+    Create the Stripe Checkout session for a pending payment.
+
+    Runs after the borrowing transaction has been committed, so no
+    database row or connection is held during the Stripe round trip.
+    Once it finishes, the payment exposes its session_url to the client.
+    """
+
+    payment = Payment.objects.select_related("borrowing__book").get(
+        id=payment_id
+    )
+    if payment.session_id:
+        return
+
+    if payment.type == Payment.TypeChoices.FINE:
+        session = create_fine_session(payment.borrowing, base_url)
+    else:
+        session = create_checkout_session(payment.borrowing, base_url)
+
+    Payment.objects.filter(id=payment_id, session_id="").update(
+        session_url=session.url,
+        session_id=session.id,
+        updated_at=timezone.now(),
+    )
+
+
+@shared_task
+def create_batch_payment_session(payment_ids, base_url):
+    """
+    Create one Stripe Checkout session for payments checked out together.
+
+    Every payment of the batch gets the same session, so paying it marks
+    all of them as paid.
+    """
+
+    payments = list(
+        Payment.objects.select_related("borrowing__book")
+        .filter(id__in=payment_ids)
+        .order_by("borrowing_id")
+    )
+    if any(payment.session_id for payment in payments):
+        return
+
+    session = create_batch_checkout_session(
+        [payment.borrowing for payment in payments], base_url
+    )
+
+    Payment.objects.filter(id__in=payment_ids, session_id="").update(
+        session_url=session.url,
+        session_id=session.id,
+        updated_at=timezone.now(),
+    )
+
+
+@shared_task
+def process_stripe_events(batch_size=500):
+    """
+    Apply received Stripe checkout events to their payments.
+
+    A whole batch of events is applied with one UPDATE of the payments
+    matched by session_id, however many events arrived, the books of
+    paid fines are returned in bulk and the paid amounts are added to
+    the daily revenue.
+    By default, every 5 seconds
+    """
+
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        # Locked, so the amounts added to the revenue are those paid.
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(
+                session_id__in={event.session_id for event in events},
+                status=Payment.StatusChoices.PENDING.value,
+            )
+            .values_list(
+                "id", "session_id", "borrowing_id", "type", "money_to_pay"
+            )
+        )
+        Payment.objects.filter(
+            id__in=[payment_id for payment_id, *_ in payments]
+        ).update(
+            status=Payment.StatusChoices.PAID.value,
+            money_to_pay=0,
+            updated_at=timezone.now(),
+        )
+        # A session is paid once for each of its borrowings, however
+        # many pending copies of their payment it has.
+        charges = {}
+        for _, session_id, borrowing_id, payment_type, amount in payments:
+            charges[session_id, borrowing_id, payment_type] = amount
+        # The books are released before the stats are counted: rows
+        # are locked in the order of a checkout, book first.
+        Borrowing.objects.filter(
+            id__in=[
+                borrowing_id
+                for _, borrowing_id, payment_type in charges
+                if payment_type == Payment.TypeChoices.FINE.value
+            ]
+        ).return_books()
+        record_payments(
+            (payment_type, amount)
+            for (_, _, payment_type), amount in charges.items()
+        )
+        StripeEvent.objects.filter(
+            id__in=[event.id for event in events]
+        ).update(processed_at=timezone.now())
+    return len(events)
@@ -1,3 +1,469 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from borrowing.tests.tests import sample_book, sample_borrowing, sample_user
+from library_service_project.clients import get_stripe_client, reset_clients
+from library_service_project.metrics import STRIPE_REQUEST_DURATION
+from payment.models import Payment, StripeEvent
+from payment.pricing import accrued_fine, fine_totals, rental_fee, with_prices
+from payment.stripe_backends import StripeBackend
+from payment.stripe_helper import (
+    calculate_amount_borrowing,
+    calculate_amount_fine,
+    create_checkout_session,
+)
+from payment.tasks import process_stripe_events
+
+WEBHOOK_URL = reverse("payments:stripe-webhook")
+OUTSTANDING_FINES_URL = reverse("payments:payment-outstanding-fines")
+WEBHOOK_SECRET = "whsec_test"
+
+
+class StripeClientTests(TestCase):
+    def setUp(self):
+        reset_clients()
+        self.addCleanup(reset_clients)
+        env_patcher = mock.patch.dict(
+            os.environ, {"STRIPE_SECRET_KEY": "sk_test_123"}
+        )
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+
+    @override_settings(
+        STRIPE_TIMEOUT=5, STRIPE_MAX_NETWORK_RETRIES=3, STRIPE_POOL_SIZE=4
+    )
+    def test_client_shares_one_pooled_session(self):
+        client = get_stripe_client()
+
+        self.assertIs(client, get_stripe_client())
+        requestor = client._requestor
+        self.assertEqual(requestor._options.max_network_retries, 3)
+        http_client = requestor._client
+        self.assertEqual(http_client._timeout, 5)
+        adapter = http_client._session.get_adapter("https://api.stripe.com")
+        self.assertEqual(adapter._pool_maxsize, 4)
+
+    def test_backend_sends_idempotency_key(self):
+        with mock.patch.object(
+            get_stripe_client().checkout.sessions, "create"
+        ) as create:
+            StripeBackend().create_checkout_session(
+                idempotency_key="borrowing-1-checkout", mode="payment"
+            )
+
+        create.assert_called_once_with(
+            params={"mode": "payment"},
+            options={"idempotency_key": "borrowing-1-checkout"},
+        )
+
+
+@override_settings(STRIPE_BACKEND="payment.stripe_backends.FakeStripeBackend")
+class CreateCheckoutSessionTests(TestCase):
+    def setUp(self):
+        self.borrowing = sample_borrowing(user=sample_user())
+
+    def sample_count(self):
+        for metric in STRIPE_REQUEST_DURATION.collect():
+            for sample in metric.samples:
+                if (
+                    sample.name.endswith("_count")
+                    and sample.labels["operation"] == "checkout"
+                    and sample.labels["outcome"] == "success"
+                ):
+                    return sample.value
+        return 0
+
+    def test_retries_for_the_same_borrowing_get_the_same_session(self):
+        first = create_checkout_session(self.borrowing, "http://testserver/")
+        second = create_checkout_session(self.borrowing, "http://testserver/")
+
+        self.assertEqual(first.id, second.id)
+
+    def test_latency_is_recorded(self):
+        before = self.sample_count()
+
+        create_checkout_session(self.borrowing, "http://testserver/")
+
+        self.assertEqual(self.sample_count(), before + 1)
+
+
+def sample_payment(**params):
+    defaults = {
+        "status": Payment.StatusChoices.PENDING.value,
+        "type": Payment.TypeChoices.PAYMENT.value,
+        "money_to_pay": 10,
+    }
+    defaults.update(params)
+    return Payment.objects.create(**defaults)
+
+
+def checkout_event(event_id, session_id, payment_status="paid"):
+    return {
+        "id": event_id,
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {
+            "object": {
+                "id": session_id,
+                "object": "checkout.session",
+                "payment_status": payment_status,
+            }
+        },
+    }
+
+
+@mock.patch.dict(os.environ, {"STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET})
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+
+    def post_event(self, event, secret=WEBHOOK_SECRET):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(
+            secret.encode(),
+            f"{timestamp}.{payload}".encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        return self.client.post(
+            WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+        )
+
+    def test_invalid_signature_is_rejected(self):
+        res = self.post_event(
+            checkout_event("evt_1", "cs_1"), secret="whsec_other"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_repeated_delivery_is_recorded_once(self):
+        for _ in range(2):
+            res = self.post_event(checkout_event("evt_1", "cs_1"))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    def test_unpaid_session_is_ignored(self):
+        self.post_event(checkout_event("evt_1", "cs_1", "unpaid"))
+
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_success_redirect_does_not_change_payment(self):
+        borrowing = sample_borrowing(user=self.user)
+        payment = sample_payment(borrowing=borrowing, session_id="cs_1")
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(
+            reverse("payments:payment-success", args=[borrowing.id])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING.value)
+
+    def test_events_are_applied_in_bulk(self):
+        book = sample_book(inventory=5)
+        payments = []
+        for i in range(5):
+            borrowing = sample_borrowing(
+                user=self.user,
+                book=book,
+                expected_return_date=date.today() - timedelta(days=1),
+            )
+            payments.append(
+                sample_payment(
+                    borrowing=borrowing,
+                    session_id=f"cs_{i}",
+                    type=Payment.TypeChoices.FINE.value,
+                )
+            )
+            self.post_event(checkout_event(f"evt_{i}", f"cs_{i}"))
+        other = sample_payment(borrowing=borrowing, session_id="cs_other")
+        Book.objects.filter(id=book.id).update(inventory=0)
+
+        # The same queries for any number of events (savepoints,
+        # settling the outstanding fines and counting the revenue and
+        # returns in the stats included).
+        with self.assertNumQueries(17):
+            self.assertEqual(process_stripe_events(), 5)
+
+        for payment in payments:
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, Payment.StatusChoices.PAID.value)
+            self.assertFalse(payment.borrowing.actual_return_data is None)
+        other.refresh_from_db()
+        self.assertEqual(other.status, Payment.StatusChoices.PENDING.value)
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 5)
+        self.assertEqual(process_stripe_events(), 0)
+
+    def test_books_are_locked_before_the_stats(self):
+        # The order of a checkout, which could otherwise deadlock with
+        # the events of a fine on the same book.
+        borrowing = sample_borrowing(
+            user=self.user,
+            expected_return_date=date.today() - timedelta(days=1),
+        )
+        sample_payment(
+            borrowing=borrowing,
+            session_id="cs_1",
+            type=Payment.TypeChoices.FINE.value,
+        )
+        self.post_event(checkout_event("evt_1", "cs_1"))
+
+        with CaptureQueriesContext(connection) as queries:
+            process_stripe_events()
+
+        updated = [
+            query["sql"].split()[1].strip('"')
+            for query in queries.captured_queries
+            if query["sql"].startswith("UPDATE")
+        ]
+        self.assertLess(
+            updated.index("book_service_book"),
+            updated.index("stats_librarystats"),
+        )
+
+
+class PaymentQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.payments = [
+            sample_payment(
+                borrowing=sample_borrowing(
+                    user=self.user, book=sample_book(title=f"Book {i}")
+                )
+            )
+            for i in range(5)
+        ]
+
+    def test_list(self):
+        # ETag aggregate, page count, page rows.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("payments:payment-list"))
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_detail(self):
+        payment = self.payments[0]
+        url = reverse("payments:payment-detail", args=[payment.id])
+
+        # ETag aggregate, payment with its borrowing and book.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data["book"], "Book 0")
+        self.assertEqual(
+            response.data["return_date"],
+            str(payment.borrowing.expected_return_date),
+        )
+
+
+class PricingTests(TestCase):
+    """The SQL expressions agree with the scalar functions."""
+
+    def setUp(self):
+        self.user = sample_user()
+        self.rng = random.Random(20240101)
+        self.today = date.today()
+
+    def random_date(self, days):
+        return self.today + timedelta(days=self.rng.randint(-days, days))
+
+    def random_borrowings(self, count):
+        books = [
+            sample_book(daily_fee=Decimal(self.rng.randint(1, 5000)) / 100)
+            for _ in range(10)
+        ]
+        borrowings = []
+        for _ in range(count):
+            borrow_date = self.random_date(60)
+            expected = borrow_date + timedelta(days=self.rng.randint(0, 45))
+            returned = None
+            if self.rng.random() < 0.3:
+                returned = expected + timedelta(days=self.rng.randint(-5, 5))
+            borrowings.append(
+                Borrowing(
+                    book=self.rng.choice(books),
+                    user=self.user,
+                    expected_return_date=expected,
+                    actual_return_data=returned,
+                )
+            )
+        borrowings = Borrowing.objects.bulk_create(borrowings)
+        # borrow_date is set to today on insert.
+        for borrowing in borrowings:
+            borrowing.borrow_date = (
+                borrowing.expected_return_date
+                - timedelta(days=self.rng.randint(0, 45))
+            )
+        Borrowing.objects.bulk_update(borrowings, ["borrow_date"])
+        return Borrowing.objects.all()
+
+    def test_expressions_match_scalar_functions(self):
+        borrowings = self.random_borrowings(300)
+
+        for on_date in (self.today, self.random_date(30)):
+            for borrowing in with_prices(
+                borrowings.select_related("book"), on_date
+            ):
+                self.assertEqual(
+                    borrowing.rental_fee,
+                    rental_fee(
+                        borrowing.borrow_date,
+                        borrowing.expected_return_date,
+                        borrowing.book.daily_fee,
+                    ),
+                )
+                self.assertEqual(
+                    borrowing.fine, accrued_fine(borrowing, on_date)
+                )
+
+    def test_totals_match_scalar_functions(self):
+        borrowings = self.random_borrowings(300)
+        fines = [
+            accrued_fine(borrowing)
+            for borrowing in borrowings.select_related("book")
+        ]
+
+        totals = fine_totals(borrowings)
+
+        self.assertEqual(totals["total"], sum(fines))
+        self.assertEqual(totals["count"], sum(1 for fine in fines if fine))
+
+    def test_stripe_amounts_match_expressions(self):
+        borrowings = self.random_borrowings(100).filter(
+            actual_return_data__isnull=True,
+            expected_return_date__lt=self.today,
+        )
+
+        for borrowing in with_prices(borrowings.select_related("book")):
+            self.assertEqual(
+                borrowing.rental_fee, calculate_amount_borrowing(borrowing)
+            )
+            self.assertEqual(borrowing.fine, calculate_amount_fine(borrowing))
+
+    def test_totals_of_empty_set(self):
+        self.assertEqual(
+            fine_totals(Borrowing.objects.none()),
+            {"count": 0, "total": Decimal("0.00")},
+        )
+
+
+class OutstandingFinesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.other = sample_user(email="other@test.com")
+        book = sample_book(daily_fee=Decimal("1.50"))
+        self.late = sample_borrowing(
+            user=self.user,
+            book=book,
+            expected_return_date=date.today() - timedelta(days=3),
+        )
+        sample_borrowing(user=self.user, book=book)
+        sample_borrowing(
+            user=self.other,
+            book=book,
+            expected_return_date=date.today() - timedelta(days=1),
+        )
+
+    def test_user_gets_own_late_borrowings(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(OUTSTANDING_FINES_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [row] = response.data["results"]
+        self.assertEqual(row["id"], self.late.id)
+        self.assertEqual(row["days_late"], 3)
+        # Four days at twice the daily fee.
+        self.assertEqual(row["fine"], "12.00")
+        self.assertEqual(response.data["total"], Decimal("12.00"))
+
+    def test_staff_gets_every_late_borrowing(self):
+        staff = sample_user(email="staff@test.com", is_staff=True)
+        self.client.force_authenticate(staff)
+
+        response = self.client.get(OUTSTANDING_FINES_URL)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(response.data["total"], Decimal("18.00"))
+
+        response = self.client.get(
+            OUTSTANDING_FINES_URL, {"user_id": self.other.id}
+        )
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["total"], Decimal("6.00"))
+
+    def test_invalid_user_id_is_rejected(self):
+        staff = sample_user(email="staff@test.com", is_staff=True)
+        self.client.force_authenticate(staff)
+
+        response = self.client.get(OUTSTANDING_FINES_URL, {"user_id": "abc"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("user_id", response.data)
+
+
+class PaymentExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        other = sample_user(email="other@test.com")
+        self.payments = [
+            sample_payment(
+                borrowing=sample_borrowing(user=user),
+                money_to_pay=Decimal("2.50"),
+            )
+            for user in (self.user, other, self.user)
+        ]
+
+    def export(self, **params):
+        response = self.client.get(
+            reverse("payments:payment-export"),
+            {"export_format": "ndjson", **params},
+        )
+        return [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+
+    def test_user_exports_own_payments(self):
+        self.client.force_authenticate(self.user)
+
+        rows = self.export()
+
+        self.assertEqual(
+            [row["id"] for row in rows],
+            [self.payments[0].id, self.payments[2].id],
+        )
+        self.assertEqual(rows[0]["money_to_pay"], "2.50")
+        self.assertEqual(rows[0]["user_id"], self.user.id)
+
+    def test_staff_exports_every_payment(self):
+        self.client.force_authenticate(
+            sample_user(email="staff@test.com", is_staff=True)
+        )
+
+        self.assertEqual(len(self.export()), 3)
@@ -6,6 +6,7 @@ from payment.views import (
     PaymentSuccessView,
     PaymentCancelView,
     PaymentFineSuccessView,
+    StripeWebhookView,
 )
 
 router = routers.DefaultRouter()
@@ -13,6 +14,7 @@ router.register("", PaymentViewSet)
 
 
 urlpatterns = [
+    path("webhook/", StripeWebhookView.as_view(), name="stripe-webhook"),
     path("", include(router.urls)),
     path(
         "<int:pk>/success_payment/",
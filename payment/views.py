@@ -1,88 +1,278 @@
 from datetime import date
 
+from django.db.models import Count, Max, Sum
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from borrowing.models import Borrowing
-from payment.models import Payment
+from borrowing.models import Borrowing, FineBalance
+from library_service_project.conditional import ConditionalGetMixin
+from library_service_project.export import (
+    export_format_parameter,
+    export_response,
+)
+from library_service_project.pagination import CursorOrOffsetPagination
+from payment.models import Payment, StripeEvent
+from payment.pricing import (
+    days_late_expression,
+    fine_expression,
+    fine_totals,
+    late,
+)
 from payment.serializers import (
+    FineBalanceSerializer,
+    OutstandingFineSerializer,
+    OutstandingFinesFilterSerializer,
     PaymentSerializer,
     PaymentListSerializer,
     PaymentDetailSerializer,
 )
+from payment.stripe_helper import verify_webhook_event
+
+PAYMENT_LIST_FIELDS = ("id", "status", "type", "borrowing_id", "money_to_pay")
+PAYMENT_DETAIL_FIELDS = (
+    "id",
+    "status",
+    "money_to_pay",
+    "session_url",
+    "session_id",
+    "borrowing__expected_return_date",
+    "borrowing__book__title",
+)
+PAYMENT_EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("status", "status"),
+    ("type", "type"),
+    ("borrowing_id", "borrowing_id"),
+    ("book", "borrowing__book__title"),
+    ("user_id", "borrowing__user_id"),
+    ("money_to_pay", "money_to_pay"),
+    ("session_id", "session_id"),
+    ("updated_at", "updated_at"),
+)
+
+# Balances listed by PaymentViewSet.fines_summary
+FINES_SUMMARY_LARGEST = 10
 
+# Events that mean the money of a checkout session has been received
+PAID_EVENT_TYPES = {
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+}
 
-class PaymentViewSet(viewsets.ModelViewSet):
+
+class PaymentViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for create, list, retrieve payment.
     """
-    queryset = Payment.objects.select_related("borrowing")
+    queryset = Payment.objects.select_related(
+        "borrowing__book", "borrowing__user"
+    )
     serializer_class = PaymentSerializer
+    pagination_class = CursorOrOffsetPagination
+    conditional_related = ("borrowing",)
 
     def get_queryset(self):
         """
         Get the queryset of payments based on user role.
 
-        For admins, all payments are retrieved.
-        For regular users, only their payments are retrieved.
+        For admins, all payments are listed and exported.
+        For regular users, only their payments are.
+        Only the columns rendered by the action are loaded.
 
         Returns:
         - queryset: Filtered queryset based on user's role.
         """
-        queryset = Payment.objects.select_related("borrowing")
+        queryset = Payment.objects.all()
 
-        if self.action == "list":
+        if self.action in ("list", "export"):
             if not self.request.user.is_staff:
                 queryset = queryset.filter(
-                    borrowing_id__user_id=self.request.user
+                    borrowing__user_id=self.request.user.id
                 )
+            if self.action == "export":
+                return queryset
+            return queryset.only(*PAYMENT_LIST_FIELDS)
 
-        return queryset
+        if self.action == "retrieve":
+            return queryset.select_related("borrowing__book").only(
+                *PAYMENT_DETAIL_FIELDS
+            )
+
+        return queryset.select_related("borrowing__book", "borrowing__user")
 
     def get_serializer_class(self):
         if self.action == "list":
             return PaymentListSerializer
         if self.action == "retrieve":
             return PaymentDetailSerializer
+        if self.action == "outstanding_fines":
+            return OutstandingFineSerializer
         return PaymentSerializer
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "user_id",
+                type=int,
+                description="Filter for staff user by user_id (ex. ?user_id=2)",
+                required=False,
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="outstanding-fines")
+    def outstanding_fines(self, request):
+        """
+        The fines accrued so far by the late borrowings, not yet paid as
+        the books are not returned, with their count and total.
+
+        Regular users get their own borrowings, staff all of them or
+        those of ?user_id=. The fines are computed in SQL.
+        """
+
+        today = date.today()
+        borrowings = Borrowing.objects.all()
+        if not request.user.is_staff:
+            borrowings = borrowings.filter(user_id=request.user.id)
+        else:
+            filters = OutstandingFinesFilterSerializer(
+                data=request.query_params
+            )
+            filters.is_valid(raise_exception=True)
+            if "user_id" in filters.validated_data:
+                borrowings = borrowings.filter(
+                    user_id=filters.validated_data["user_id"]
+                )
+
+        page = self.paginate_queryset(
+            borrowings.filter(late(today))
+            .select_related("book")
+            .only("id", "user_id", "expected_return_date", "book__title")
+            .annotate(
+                days_late=days_late_expression(today),
+                fine=fine_expression(today),
+            )
+            .order_by("-id")
+        )
+        response = self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+        response.data["total"] = fine_totals(borrowings, today)["total"]
+        return response
+
+    @extend_schema(
+        parameters=[export_format_parameter()],
+        responses={200: OpenApiTypes.STR},
+    )
+    @action(methods=["GET"], detail=False)
+    def export(self, request):
+        """
+        Export every payment of the list, oldest first, in one
+        streamed file instead of pages.
+        """
+
+        return export_response(
+            request,
+            self.get_queryset().order_by("id"),
+            PAYMENT_EXPORT_COLUMNS,
+            "payments",
+        )
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="fines-summary",
+        permission_classes=[IsAdminUser],
+    )
+    def fines_summary(self, request):
+        """
+        Staff only: the fines owed by all users and the largest balances,
+        read from the balances precomputed by the nightly accrue_fines.
+        """
+
+        balances = FineBalance.objects.filter(borrowings__gt=0)
+        summary = balances.aggregate(
+            total=Sum("amount"),
+            users=Count("pk"),
+            borrowings=Sum("borrowings"),
+            accrued_on=Max("accrued_on"),
+        )
+        largest = balances.select_related("user").order_by(
+            "-amount", "user_id"
+        )[:FINES_SUMMARY_LARGEST]
+        summary["largest"] = FineBalanceSerializer(largest, many=True).data
+        return Response(summary)
+
+
+class StripeWebhookView(APIView):
+    """
+    Endpoint for Stripe webhook events, signed with STRIPE_WEBHOOK_SECRET.
+
+    Paid checkout sessions are only recorded here (one INSERT, repeated
+    deliveries of an event are ignored) and applied to the payments in
+    batches by the process_stripe_events task.
+    """
+    authentication_classes = ()
+    permission_classes = ()
+
+    def post(self, request):
+        try:
+            event = verify_webhook_event(
+                request.body, request.META.get("HTTP_STRIPE_SIGNATURE", "")
+            )
+        except ValueError:
+            return Response(
+                {"message": "Invalid payload or signature"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        session = event["data"]["object"]
+        if (
+            event["type"] in PAID_EVENT_TYPES
+            and session.get("payment_status") == "paid"
+        ):
+            StripeEvent.objects.bulk_create(
+                [
+                    StripeEvent(
+                        event_id=event["id"],
+                        type=event["type"],
+                        session_id=session["id"],
+                    )
+                ],
+                ignore_conflicts=True,
+            )
+        return Response({"received": True}, status=status.HTTP_200_OK)
+
 
 class PaymentSuccessView(APIView):
     """
-    API endpoint for success payment.
+    API endpoint Stripe redirects to after a successful payment.
+
+    The payment itself is confirmed by the Stripe webhook.
     """
     def get(self, request, pk):
-        borrowing = Borrowing.objects.get(id=pk)
-        payment = Payment.objects.get(borrowing=borrowing)
-        payment.status = Payment.StatusChoices.PAID
-        payment.money_to_pay = 0
-        payment.save()
         return Response(
-            {"message": "Payment was successfully processed"},
+            {"message": "Payment was received and will be confirmed shortly"},
             status=status.HTTP_200_OK,
         )
 
 
 class PaymentFineSuccessView(APIView):
     """
-    API endpoint for success fine payment.
+    API endpoint Stripe redirects to after a successful fine payment.
+
+    The fine is confirmed and the book returned by the Stripe webhook.
     """
     def get(self, request, pk):
-        borrowing = Borrowing.objects.get(id=pk)
-        payment = Payment.objects.get(
-            borrowing=borrowing, type=Payment.TypeChoices.FINE
-        )
-        payment.status = Payment.StatusChoices.PAID
-        payment.money_to_pay = 0
-        payment.save()
-
-        borrowing.actual_return_data = date.today()
-        borrowing.book.inventory += 1
-        borrowing.book.save()
-        borrowing.save()
         return Response(
-            {"message": "Payment fine was successfully processed"},
+            {
+                "message":
+                    "Payment fine was received and will be confirmed shortly"
+            },
             status=status.HTTP_200_OK,
         )
 
@@ -0,0 +1,191 @@
+"""
+Incremental updates of the stats tables.
+
+They run in the transaction of the borrowings, returns and payments
+they count, so the counters commit or roll back with them, and each is
+a handful of UPDATEs whatever the size of the tables.
+
+A transaction adds to one shard of the library totals, LibraryStats
+and DailyRevenue rows picked at random the first time it counts
+something, so concurrent checkouts, returns and payments seldom wait
+for one another. Every path locks its rows in the same order: the
+borrowings returned, the books, the LibraryStats shard, and then the
+BookStats and DailyRevenue rows. rebuild_stats locks every shard first,
+in the order of their pk, and waits for the transactions counting
+meanwhile.
+
+Rows missing from the tables, such as those of books inserted in bulk,
+are not created here, the next rebuild_stats counts them.
+"""
+
+import random
+from collections import Counter
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from stats.models import (
+    LIBRARY_SHARDS,
+    BookStats,
+    DailyRevenue,
+    LibraryStats,
+)
+
+
+def _shard():
+    """
+    The shard of the current transaction.
+
+    Picked once per transaction: two shards locked by two transactions
+    in opposite orders would deadlock.
+    """
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        # Each UPDATE is a transaction of its own.
+        return random.randint(1, LIBRARY_SHARDS)
+    outermost = connection.atomic_blocks[0]
+    picked = getattr(connection, "stats_shard", None)
+    if picked is None or picked[0] is not outermost:
+        picked = connection.stats_shard = (
+            outermost,
+            random.randint(1, LIBRARY_SHARDS),
+        )
+    return picked[1]
+
+
+def _overdue(expected_return_dates):
+    """How many of the dates are on or before LibraryStats.overdue_on."""
+
+    return sum(
+        (
+            Case(
+                When(overdue_on__gte=day, then=Value(count)),
+                default=Value(0),
+            )
+            for day, count in Counter(expected_return_dates).items()
+        ),
+        Value(0),
+    )
+
+
+def update_library(**changes):
+    LibraryStats.objects.filter(pk=_shard()).update(
+        updated_at=timezone.now(), **changes
+    )
+
+
+def _update_books(book_ids, sign, *fields):
+    # One UPDATE per distinct number of borrowings of a book, as
+    # book_service.inventory.release_books does.
+    by_count = {}
+    for book_id, count in Counter(book_ids).items():
+        by_count.setdefault(count, []).append(book_id)
+    for count, ids in by_count.items():
+        BookStats.objects.filter(book_id__in=ids).update(
+            updated_at=timezone.now(),
+            **{field: F(field) + sign * count for field in fields},
+        )
+
+
+def record_borrowings(borrowings):
+    """
+    Count new borrowings, active until they are returned.
+
+    Args:
+    - borrowings (iterable): (book_id, expected_return_date) of each.
+    """
+
+    borrowings = list(borrowings)
+    if not borrowings:
+        return
+    update_library(
+        borrowings=F("borrowings") + len(borrowings),
+        active_borrowings=F("active_borrowings") + len(borrowings),
+        overdue_borrowings=F("overdue_borrowings")
+        + _overdue(expected for _, expected in borrowings),
+    )
+    _update_books(
+        (book_id for book_id, _ in borrowings),
+        1,
+        "borrowings",
+        "active_borrowings",
+    )
+
+
+def record_returns(borrowings):
+    """
+    Count returned borrowings as no longer active, nor overdue.
+
+    Args:
+    - borrowings (iterable): (book_id, expected_return_date) of each.
+    """
+
+    borrowings = list(borrowings)
+    if not borrowings:
+        return
+    update_library(
+        active_borrowings=F("active_borrowings") - len(borrowings),
+        overdue_borrowings=F("overdue_borrowings")
+        - _overdue(expected for _, expected in borrowings),
+    )
+    _update_books(
+        (book_id for book_id, _ in borrowings), -1, "active_borrowings"
+    )
+
+
+def record_payments(payments, day=None):
+    """
+    Add paid payments to the revenue of the day (today).
+
+    Args:
+    - payments (iterable): (type, amount) of each payment, the type
+      being a Payment.TypeChoices value.
+    """
+
+    day = day or date.today()
+    per_type = {}
+    for payment_type, amount in payments:
+        count, total = per_type.get(payment_type, (0, 0))
+        per_type[payment_type] = (count + 1, total + amount)
+    if not per_type:
+        return
+    update_library(
+        revenue=F("revenue") + sum(total for _, total in per_type.values())
+    )
+    shard = _shard()
+    DailyRevenue.objects.bulk_create(
+        [
+            DailyRevenue(day=day, type=payment_type, shard=shard)
+            for payment_type in per_type
+        ],
+        ignore_conflicts=True,
+    )
+    DailyRevenue.objects.filter(
+        day=day, type__in=per_type, shard=shard
+    ).update(
+        amount=F("amount")
+        + Case(
+            *(
+                When(type=payment_type, then=Value(total))
+                for payment_type, (_, total) in per_type.items()
+            ),
+            output_field=DecimalField(),
+        ),
+        payments=F("payments")
+        + Case(
+            *(
+                When(type=payment_type, then=Value(count))
+                for payment_type, (count, _) in per_type.items()
+            ),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def record_copies(copies):
+    """Count copies added to (or, if negative, removed from) the shelves."""
+
+    update_library(copies=F("copies") + copies)
@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand
+
+from stats.rebuild import rebuild_stats
+
+
+class Command(BaseCommand):
+    """Django command to recompute the stats tables"""
+
+    help = (
+        "Recompute the library, book and revenue stats from the books, "
+        "borrowings and payments. Run it once after installing the stats "
+        "app, the nightly refresh_stats task keeps all but the revenue "
+        "in line afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-revenue",
+            action="store_true",
+            help="Do not reprice the revenue of the paid payments.",
+        )
+
+    def handle(self, *args, **options):
+        totals = rebuild_stats(revenue=not options["keep_revenue"])
+        self.stdout.write(
+            ", ".join(f"{name}: {value}" for name, value in totals.items())
+        )
@@ -0,0 +1,112 @@
+# Generated by Django 4.2.9 on 2026-10-18 19:41
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_library_stats(apps, schema_editor):
+    # The row the incremental updates count on, rebuild_stats fills it.
+    apps.get_model("stats", "LibraryStats").objects.using(
+        schema_editor.connection.alias
+    ).create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("book_service", "0003_book_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookStats",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="book_service.book",
+                    ),
+                ),
+                ("borrowings", models.IntegerField(default=0)),
+                ("active_borrowings", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "book stats",
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyRevenue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("type", models.CharField(max_length=8)),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0"), max_digits=14
+                    ),
+                ),
+                ("payments", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="LibraryStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("borrowings", models.IntegerField(default=0)),
+                ("active_borrowings", models.IntegerField(default=0)),
+                ("overdue_borrowings", models.IntegerField(default=0)),
+                ("overdue_on", models.DateField(blank=True, null=True)),
+                ("copies", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0"), max_digits=14
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "library stats",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailyrevenue",
+            constraint=models.UniqueConstraint(
+                fields=("day", "type"), name="daily_revenue_day_type_unique"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookstats",
+            index=models.Index(
+                fields=["-borrowings", "book"],
+                name="book_stats_popularity_idx",
+            ),
+        ),
+        migrations.RunPython(create_library_stats, migrations.RunPython.noop),
+    ]
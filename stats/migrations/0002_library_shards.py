@@ -0,0 +1,39 @@
+# Generated by Django 4.2.9 on 2026-10-18 20:50
+
+from django.db import migrations, models
+
+
+def create_library_shards(apps, schema_editor):
+    # The rows the incremental updates pick from, the first exists.
+    LibraryStats = apps.get_model("stats", "LibraryStats")
+    LibraryStats.objects.using(schema_editor.connection.alias).bulk_create(
+        [LibraryStats(pk=shard) for shard in range(1, 17)],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stats", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="dailyrevenue",
+            name="daily_revenue_day_type_unique",
+        ),
+        migrations.AddField(
+            model_name="dailyrevenue",
+            name="shard",
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddConstraint(
+            model_name="dailyrevenue",
+            constraint=models.UniqueConstraint(
+                fields=("day", "type", "shard"),
+                name="daily_revenue_day_type_shard_unique",
+            ),
+        ),
+        migrations.RunPython(create_library_shards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,125 @@
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Max, Sum
+
+from book_service.models import Book
+
+# Rows of LibraryStats, and shards of each day of DailyRevenue. Each
+# transaction adds to a shard of its own, picked at random, so that
+# concurrent borrowings, returns and payments seldom wait for the same
+# row.
+LIBRARY_SHARDS = 16
+# Primary key of the LibraryStats row, and shard of the DailyRevenue
+# rows, rebuild_stats writes the totals to.
+LIBRARY = 1
+
+
+class LibraryStats(models.Model):
+    """
+    A shard of the totals of the whole library, the rows with a pk
+    from 1 to LIBRARY_SHARDS. totals() sums them.
+
+    overdue_borrowings counts the active borrowings due on or before
+    overdue_on, the date of the last rebuild.
+
+    The counters are plain integers: one that drifted below zero, after
+    an edit the incremental updates missed, must not fail a return.
+    rebuild_stats sets it right.
+    """
+
+    borrowings = models.IntegerField(default=0)
+    active_borrowings = models.IntegerField(default=0)
+    overdue_borrowings = models.IntegerField(default=0)
+    overdue_on = models.DateField(null=True, blank=True)
+    # Copies owned, on the shelf (Book.inventory) or borrowed.
+    copies = models.IntegerField(default=0)
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal(0)
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "library stats"
+
+    def __str__(self):
+        return f"{self.active_borrowings} of {self.copies} copies borrowed"
+
+    @classmethod
+    def totals(cls):
+        """The sum of the shards, as an unsaved LibraryStats."""
+        return cls(
+            **cls.objects.aggregate(
+                borrowings=Sum("borrowings", default=0),
+                active_borrowings=Sum("active_borrowings", default=0),
+                overdue_borrowings=Sum("overdue_borrowings", default=0),
+                overdue_on=Max("overdue_on"),
+                copies=Sum("copies", default=0),
+                revenue=Sum("revenue", default=Decimal(0)),
+                updated_at=Max("updated_at"),
+            )
+        )
+
+    @property
+    def utilisation(self):
+        """Share of the copies that are borrowed."""
+        if self.copies <= 0:
+            return 0.0
+        return self.active_borrowings / self.copies
+
+
+class BookStats(models.Model):
+    book = models.OneToOneField(
+        Book, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    borrowings = models.IntegerField(default=0)
+    active_borrowings = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "book stats"
+        indexes = [
+            models.Index(
+                fields=["-borrowings", "book"],
+                name="book_stats_popularity_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} borrowed {self.borrowings} times"
+
+    @property
+    def utilisation(self):
+        """Share of the copies of the book that are borrowed."""
+        copies = self.book.inventory + self.active_borrowings
+        if copies <= 0:
+            return 0.0
+        return self.active_borrowings / copies
+
+
+class DailyRevenue(models.Model):
+    """
+    Money received on a day for the payments of a Payment type, in one
+    of the shards of the day.
+    """
+
+    day = models.DateField()
+    # A Payment.TypeChoices value.
+    type = models.CharField(max_length=8)
+    shard = models.PositiveSmallIntegerField(default=LIBRARY)
+    amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal(0)
+    )
+    payments = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "type", "shard"],
+                name="daily_revenue_day_type_shard_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.amount} of {self.type} on {self.day}"
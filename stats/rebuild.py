@@ -0,0 +1,164 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from payment.models import Payment
+from payment.pricing import rental_fee_expression, returned_fine_expression
+from stats.models import (
+    LIBRARY,
+    LIBRARY_SHARDS,
+    BookStats,
+    DailyRevenue,
+    LibraryStats,
+)
+
+
+def _revenue(payment_type, amount):
+    """Paid payments of the type, per day, repriced with `amount`."""
+
+    return (
+        Borrowing.objects.filter(
+            payments__status=Payment.StatusChoices.PAID.value,
+            payments__type=payment_type,
+        )
+        .annotate(day=TruncDate("payments__updated_at"))
+        .order_by("day")
+        .values("day")
+        .annotate(amount=Sum(amount), payments=Count("payments"))
+    )
+
+
+def rebuild_stats(on_date=None, revenue=True, chunk_size=5000):
+    """
+    Recompute the stats tables from the books, borrowings and payments,
+    counting the borrowings overdue on the date (today).
+
+    The incremental updates keep the counters current between two
+    rebuilds, but they cannot tell when a borrowing becomes overdue and
+    miss the rows they are not told about: books inserted in bulk,
+    borrowings deleted with their user or edited in the admin. The
+    nightly refresh_stats task rebuilds everything but the revenue.
+
+    The amount of a paid payment is not kept (money_to_pay is zeroed),
+    so rebuilding the revenue reprices the payments with
+    payment.pricing, a fine as of the return of its borrowing, on the
+    day the payment was last updated.
+
+    The totals are written to the LibraryStats and DailyRevenue rows of
+    the LIBRARY shard, and the other shards are zeroed. The LibraryStats
+    rows are locked first, the incremental updates of the borrowings and
+    payments made meanwhile wait for the rebuild and are then counted
+    on top of it.
+
+    Returns:
+    - dict: The library totals.
+    """
+
+    on_date = on_date or date.today()
+    with transaction.atomic():
+        LibraryStats.objects.bulk_create(
+            [LibraryStats(pk=shard) for shard in range(1, LIBRARY_SHARDS + 1)],
+            ignore_conflicts=True,
+        )
+        shards = list(LibraryStats.objects.select_for_update().order_by("pk"))
+        library = LibraryStats.totals()
+
+        active = Q(actual_return_data__isnull=True)
+        counted = {
+            book_id: (borrowings, active_borrowings)
+            for book_id, borrowings, active_borrowings in (
+                Borrowing.objects.order_by()
+                .values_list("book_id")
+                .annotate(
+                    borrowings=Count("id"),
+                    active_borrowings=Count("id", filter=active),
+                )
+            )
+        }
+        stored = {
+            book_id: (borrowings, active_borrowings)
+            for book_id, borrowings, active_borrowings in (
+                BookStats.objects.values_list(
+                    "book_id", "borrowings", "active_borrowings"
+                ).iterator(chunk_size=chunk_size)
+            )
+        }
+        # Only the rows that drifted, or are missing, are written.
+        changed = []
+        for book_id in Book.objects.values_list("id", flat=True).iterator(
+            chunk_size=chunk_size
+        ):
+            borrowings, active_borrowings = counted.get(book_id, (0, 0))
+            if stored.get(book_id) != (borrowings, active_borrowings):
+                changed.append(
+                    BookStats(
+                        book_id=book_id,
+                        borrowings=borrowings,
+                        active_borrowings=active_borrowings,
+                    )
+                )
+        BookStats.objects.bulk_create(
+            changed,
+            batch_size=chunk_size,
+            update_conflicts=True,
+            unique_fields=["book"],
+            update_fields=["borrowings", "active_borrowings", "updated_at"],
+        )
+
+        totals = Borrowing.objects.aggregate(
+            borrowings=Count("id"),
+            active_borrowings=Count("id", filter=active),
+            overdue_borrowings=Count(
+                "id", filter=active & Q(expected_return_date__lte=on_date)
+            ),
+        )
+        on_shelves = Book.objects.aggregate(copies=Sum("inventory"))["copies"]
+        library.borrowings = totals["borrowings"]
+        library.active_borrowings = totals["active_borrowings"]
+        library.overdue_borrowings = totals["overdue_borrowings"]
+        library.overdue_on = on_date
+        library.copies = (on_shelves or 0) + totals["active_borrowings"]
+        fields = [
+            "borrowings",
+            "active_borrowings",
+            "overdue_borrowings",
+            "copies",
+        ]
+
+        if revenue:
+            DailyRevenue.objects.all().delete()
+            days = [
+                DailyRevenue(type=payment_type, **row)
+                for payment_type, amount in (
+                    (Payment.TypeChoices.PAYMENT, rental_fee_expression()),
+                    (Payment.TypeChoices.FINE, returned_fine_expression()),
+                )
+                for row in _revenue(payment_type.value, amount)
+            ]
+            DailyRevenue.objects.bulk_create(days, batch_size=chunk_size)
+            library.revenue = sum((day.amount for day in days), Decimal(0))
+            fields.append("revenue")
+        now = timezone.now()
+        for shard in shards:
+            counted = library if shard.pk == LIBRARY else LibraryStats()
+            for field in fields:
+                setattr(shard, field, getattr(counted, field))
+            shard.overdue_on = on_date
+            shard.updated_at = now
+        LibraryStats.objects.bulk_update(
+            shards, fields + ["overdue_on", "updated_at"]
+        )
+
+    return {
+        "borrowings": library.borrowings,
+        "active_borrowings": library.active_borrowings,
+        "overdue_borrowings": library.overdue_borrowings,
+        "copies": library.copies,
+        "revenue": library.revenue,
+    }
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+from rest_framework import serializers
+
+from stats.models import BookStats, DailyRevenue, LibraryStats
+
+# Days of revenue returned by default, and at most.
+REVENUE_DAYS = 30
+MAX_REVENUE_DAYS = 366
+
+
+class LibraryStatsSerializer(serializers.ModelSerializer):
+    utilisation = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = LibraryStats
+        fields = (
+            "borrowings",
+            "active_borrowings",
+            "overdue_borrowings",
+            "overdue_on",
+            "copies",
+            "utilisation",
+            "revenue",
+            "updated_at",
+        )
+
+
+class BookStatsSerializer(serializers.ModelSerializer):
+    title = serializers.CharField(source="book.title", read_only=True)
+    inventory = serializers.IntegerField(
+        source="book.inventory", read_only=True
+    )
+    utilisation = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = BookStats
+        fields = (
+            "book",
+            "title",
+            "borrowings",
+            "active_borrowings",
+            "inventory",
+            "utilisation",
+        )
+
+
+class DailyRevenueSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyRevenue
+        fields = ("day", "type", "amount", "payments")
+
+
+class RevenueRangeSerializer(serializers.Serializer):
+    """The ?from= and ?to= days of the revenue, the last 30 by default."""
+
+    to = serializers.DateField(required=False)
+
+    def get_fields(self):
+        # "from" is a keyword, it cannot be declared as an attribute.
+        fields = super().get_fields()
+        fields["from"] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        end = attrs.get("to") or date.today()
+        start = attrs.get("from") or end - timedelta(days=REVENUE_DAYS - 1)
+        if start > end:
+            raise serializers.ValidationError("'from' must not be after 'to'.")
+        if (end - start).days >= MAX_REVENUE_DAYS:
+            raise serializers.ValidationError(
+                f"At most {MAX_REVENUE_DAYS} days can be requested."
+            )
+        return {"from": start, "to": end}
@@ -0,0 +1,69 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from book_service.models import Book
+from borrowing.models import Borrowing
+from stats.counters import record_copies, record_returns, update_library
+from stats.models import BookStats
+
+# The stats are kept on the primary, books written to another database
+# (a replica, by the tests) are not counted.
+
+
+@receiver(pre_save, sender=Book)
+def remember_inventory(
+    sender, instance, raw=False, using=None, update_fields=None, **kwargs
+):
+    instance._previous_inventory = 0
+    if raw or using != DEFAULT_DB_ALIAS or instance.pk is None:
+        return
+    if update_fields is not None and "inventory" not in update_fields:
+        instance._previous_inventory = instance.inventory
+        return
+    instance._previous_inventory = (
+        Book.objects.filter(pk=instance.pk)
+        .values_list("inventory", flat=True)
+        .first()
+        or 0
+    )
+
+
+@receiver(post_save, sender=Book)
+def count_book_copies(
+    sender, instance, created, raw=False, using=None, **kwargs
+):
+    if raw or using != DEFAULT_DB_ALIAS:
+        return
+    if created:
+        BookStats.objects.create(book=instance)
+    added = instance.inventory - instance._previous_inventory
+    if added:
+        record_copies(added)
+
+
+@receiver(pre_delete, sender=Book)
+def uncount_book(sender, instance, using=None, **kwargs):
+    """Its copies and borrowings are gone with the book."""
+
+    if using != DEFAULT_DB_ALIAS:
+        return
+    # Its borrowings and then the book are locked before the stats, as
+    # a return locks them.
+    borrowings = list(
+        Borrowing.objects.filter(book=instance)
+        .select_for_update()
+        .values_list("book_id", "expected_return_date", "actual_return_data")
+    )
+    Book.objects.select_for_update().filter(pk=instance.pk).exists()
+    active = [
+        (book_id, expected)
+        for book_id, expected, returned in borrowings
+        if returned is None
+    ]
+    record_returns(active)
+    update_library(
+        borrowings=F("borrowings") - len(borrowings),
+        copies=F("copies") - instance.inventory - len(active),
+    )
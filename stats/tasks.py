@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from stats.rebuild import rebuild_stats
+
+
+@shared_task
+def refresh_stats():
+    """
+    Rebuild the library and book stats, counting the borrowings that
+    became overdue today. The revenue is kept, it is maintained as the
+    payments are received.
+
+    Scheduled every night by CELERY_BEAT_SCHEDULE.
+    """
+
+    rebuild_stats(revenue=False)
@@ -0,0 +1,372 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowing.models import Borrowing
+from borrowing.tests.tests import sample_book, sample_user
+from payment.models import Payment, StripeEvent
+from payment.tasks import process_stripe_events
+from stats.models import LIBRARY, BookStats, DailyRevenue, LibraryStats
+from stats.rebuild import rebuild_stats
+
+BORROWING_URL = reverse("borrowing:borrowing-list")
+LIBRARY_STATS_URL = reverse("stats:library-stats")
+BOOK_STATS_URL = reverse("stats:book-stats-list")
+REVENUE_URL = reverse("stats:revenue")
+
+
+def borrow(book, user, **params):
+    params.setdefault("expected_return_date", date.today())
+    return Borrowing.objects.create(book=book, user=user, **params)
+
+
+def library_stats():
+    stats = LibraryStats.totals()
+    return {
+        "borrowings": stats.borrowings,
+        "active_borrowings": stats.active_borrowings,
+        "overdue_borrowings": stats.overdue_borrowings,
+        "copies": stats.copies,
+        "revenue": stats.revenue,
+    }
+
+
+def book_stats():
+    return set(
+        BookStats.objects.values_list(
+            "book_id", "borrowings", "active_borrowings"
+        )
+    )
+
+
+class StatsCountersTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.today = date.today()
+        self.book = sample_book(inventory=3, daily_fee=Decimal("1.50"))
+        self.late = borrow(
+            self.book,
+            self.user,
+            expected_return_date=self.today - timedelta(days=1),
+        )
+        borrow(self.book, self.user, actual_return_data=self.today)
+        rebuild_stats()
+
+    def assert_matches_rebuild(self):
+        counted = library_stats(), book_stats()
+        rebuild_stats(revenue=False)
+        self.assertEqual(counted, (library_stats(), book_stats()))
+
+    def test_rebuild(self):
+        other = sample_book(inventory=1)
+
+        self.assertEqual(
+            rebuild_stats(),
+            {
+                "borrowings": 2,
+                "active_borrowings": 1,
+                "overdue_borrowings": 1,
+                "copies": 5,
+                "revenue": Decimal(0),
+            },
+        )
+        self.assertEqual(
+            book_stats(), {(self.book.id, 2, 1), (other.id, 0, 0)}
+        )
+
+    def test_borrowings_and_returns_are_counted(self):
+        self.client.post(
+            BORROWING_URL,
+            {
+                "book": self.book.id,
+                "expected_return_date": self.today + timedelta(days=3),
+            },
+        )
+        self.client.post(
+            reverse("borrowing:borrowing-batch"),
+            {
+                "books": [self.book.id, sample_book().id],
+                "expected_return_date": self.today + timedelta(days=3),
+            },
+            format="json",
+        )
+        Borrowing.objects.filter(id=self.late.id).return_books()
+
+        self.assertEqual(
+            library_stats(),
+            {
+                "borrowings": 5,
+                "active_borrowings": 3,
+                "overdue_borrowings": 0,
+                "copies": 6,
+                "revenue": Decimal(0),
+            },
+        )
+        self.assert_matches_rebuild()
+
+    def test_borrowings_overdue_after_the_rebuild_are_not_counted(self):
+        due = borrow(self.book, self.user)
+        rebuild_stats(on_date=self.today - timedelta(days=1))
+
+        due.return_book()
+
+        self.assertEqual(library_stats()["overdue_borrowings"], 1)
+        self.assert_matches_rebuild()
+
+    def test_book_copies_are_counted(self):
+        book = sample_book(inventory=4)
+        book.inventory = 2
+        book.save()
+        self.assertEqual(library_stats()["copies"], 6)
+
+        self.book.delete()
+
+        self.assertEqual(
+            library_stats(),
+            {
+                "borrowings": 0,
+                "active_borrowings": 0,
+                "overdue_borrowings": 0,
+                "copies": 2,
+                "revenue": Decimal(0),
+            },
+        )
+        self.assert_matches_rebuild()
+
+    def test_paid_payments_are_added_to_the_revenue(self):
+        for session_id, payment_type, amount in (
+            ("cs_1", Payment.TypeChoices.PAYMENT, "4.50"),
+            ("cs_2", Payment.TypeChoices.FINE, "6.00"),
+        ):
+            Payment.objects.create(
+                status=Payment.StatusChoices.PENDING.value,
+                type=payment_type.value,
+                borrowing=self.late,
+                session_id=session_id,
+                money_to_pay=Decimal(amount),
+            )
+            StripeEvent.objects.create(
+                event_id=f"evt_{session_id}",
+                type="checkout.session.completed",
+                session_id=session_id,
+            )
+
+        process_stripe_events()
+
+        self.assertEqual(
+            set(
+                DailyRevenue.objects.values_list(
+                    "day", "type", "amount", "payments"
+                )
+            ),
+            {
+                (self.today, "Payment", Decimal("4.50"), 1),
+                (self.today, "Fine", Decimal("6.00"), 1),
+            },
+        )
+        self.assertEqual(library_stats()["revenue"], Decimal("10.50"))
+        self.assertEqual(library_stats()["active_borrowings"], 0)
+        self.assert_matches_rebuild()
+
+    def test_a_session_is_counted_once_per_borrowing(self):
+        other = borrow(self.book, self.user)
+        # Two copies of the fine of a late borrowing, and the payment of
+        # another borrowing paid in the same batch session.
+        for borrowing, payment_type in (
+            (self.late, Payment.TypeChoices.FINE),
+            (self.late, Payment.TypeChoices.FINE),
+            (other, Payment.TypeChoices.PAYMENT),
+        ):
+            Payment.objects.create(
+                status=Payment.StatusChoices.PENDING.value,
+                type=payment_type.value,
+                borrowing=borrowing,
+                session_id="cs_shared",
+                money_to_pay=Decimal("0.80"),
+            )
+        StripeEvent.objects.create(
+            event_id="evt_shared",
+            type="checkout.session.completed",
+            session_id="cs_shared",
+        )
+
+        process_stripe_events()
+
+        self.assertFalse(
+            Payment.objects.filter(
+                status=Payment.StatusChoices.PENDING.value
+            ).exists()
+        )
+        self.assertEqual(
+            dict(DailyRevenue.objects.values_list("type", "payments")),
+            {"Fine": 1, "Payment": 1},
+        )
+        self.assertEqual(library_stats()["revenue"], Decimal("1.60"))
+
+    def test_shards_are_summed(self):
+        with mock.patch("stats.counters._shard", return_value=3):
+            self.client.post(
+                BORROWING_URL,
+                {
+                    "book": self.book.id,
+                    "expected_return_date": self.today + timedelta(days=3),
+                },
+            )
+        Payment.objects.create(
+            status=Payment.StatusChoices.PENDING.value,
+            type=Payment.TypeChoices.FINE.value,
+            borrowing=self.late,
+            session_id="cs_1",
+            money_to_pay=Decimal("6.00"),
+        )
+        StripeEvent.objects.create(
+            event_id="evt_1",
+            type="checkout.session.completed",
+            session_id="cs_1",
+        )
+        with mock.patch("stats.counters._shard", return_value=7):
+            process_stripe_events()
+
+        self.assertEqual(
+            set(
+                LibraryStats.objects.exclude(borrowings=0).values_list(
+                    "pk", "borrowings"
+                )
+            ),
+            {(LIBRARY, 2), (3, 1)},
+        )
+        self.assertEqual(
+            set(DailyRevenue.objects.values_list("shard", "amount")),
+            {(7, Decimal("6.00"))},
+        )
+        self.assertEqual(
+            library_stats(),
+            {
+                "borrowings": 3,
+                "active_borrowings": 1,
+                "overdue_borrowings": 0,
+                "copies": 4,
+                "revenue": Decimal("6.00"),
+            },
+        )
+        self.assert_matches_rebuild()
+        # The revenue too, when it is rebuilt.
+        rebuild_stats()
+        self.assertEqual(
+            list(
+                LibraryStats.objects.exclude(
+                    borrowings=0, active_borrowings=0, copies=0, revenue=0
+                ).values_list("pk", flat=True)
+            ),
+            [LIBRARY],
+        )
+
+    def test_rebuild_reprices_the_revenue(self):
+        # Five days of rental, three days of fine: 7.50 and 9.00.
+        Borrowing.objects.filter(id=self.late.id).update(
+            borrow_date=self.today - timedelta(days=5),
+            expected_return_date=self.today - timedelta(days=1),
+            actual_return_data=self.today + timedelta(days=1),
+        )
+        for payment_type in Payment.TypeChoices.values:
+            Payment.objects.create(
+                status=Payment.StatusChoices.PAID.value,
+                type=payment_type,
+                borrowing=self.late,
+                money_to_pay=0,
+            )
+
+        self.assertEqual(rebuild_stats()["revenue"], Decimal("16.50"))
+        self.assertEqual(
+            dict(DailyRevenue.objects.values_list("type", "amount")),
+            {"Payment": Decimal("7.50"), "Fine": Decimal("9.00")},
+        )
+
+
+class StatsApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = sample_user(email="staff@test.com", is_staff=True)
+        self.client.force_authenticate(self.staff)
+        self.books = [sample_book(title=f"Book {i}") for i in range(3)]
+        for i, book in enumerate(self.books):
+            for _ in range(i):
+                borrow(book, self.staff)
+        rebuild_stats()
+
+    def test_staff_only(self):
+        self.client.force_authenticate(sample_user())
+
+        for url in (LIBRARY_STATS_URL, BOOK_STATS_URL, REVENUE_URL):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_library_stats_are_one_query(self):
+        LibraryStats.objects.filter(pk=LIBRARY + 1).update(borrowings=1)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(LIBRARY_STATS_URL)
+
+        self.assertEqual(response.data["borrowings"], 4)
+        self.assertEqual(response.data["copies"], 9)
+        self.assertEqual(response.data["utilisation"], 3 / 9)
+
+    def test_books_by_popularity(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(BOOK_STATS_URL, {"limit": 2})
+
+        self.assertEqual(
+            [
+                (book["title"], book["borrowings"], book["utilisation"])
+                for book in response.data["results"]
+            ],
+            [("Book 2", 2, 2 / 4), ("Book 1", 1, 1 / 3)],
+        )
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [book["title"] for book in response.data["results"]],
+            ["Book 0"],
+        )
+
+    def test_revenue_range(self):
+        today = date.today()
+        DailyRevenue.objects.bulk_create(
+            DailyRevenue(
+                day=today - timedelta(days=days),
+                type="Payment",
+                amount=Decimal(days),
+                payments=1,
+            )
+            for days in (0, 5, 40)
+        )
+        DailyRevenue.objects.create(
+            day=today, type="Payment", shard=2, amount=1, payments=1
+        )
+
+        response = self.client.get(REVENUE_URL)
+        self.assertEqual(
+            [(day["amount"], day["payments"]) for day in response.data],
+            [("5.00", 1), ("1.00", 2)],
+        )
+        response = self.client.get(
+            REVENUE_URL, {"from": today - timedelta(days=40), "to": today}
+        )
+        self.assertEqual(len(response.data), 3)
+
+    def test_invalid_revenue_range(self):
+        today = date.today()
+
+        for params in (
+            {"from": today, "to": today - timedelta(days=1)},
+            {"from": today - timedelta(days=400)},
+            {"from": "yesterday"},
+        ):
+            response = self.client.get(REVENUE_URL, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
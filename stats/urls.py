@@ -0,0 +1,15 @@
+from django.urls import path, include
+from rest_framework import routers
+
+from stats.views import BookStatsViewSet, LibraryStatsView, RevenueView
+
+router = routers.SimpleRouter()
+router.register("books", BookStatsViewSet, basename="book-stats")
+
+urlpatterns = [
+    path("", LibraryStatsView.as_view(), name="library-stats"),
+    path("revenue/", RevenueView.as_view(), name="revenue"),
+    path("", include(router.urls)),
+]
+
+app_name = "stats"
@@ -0,0 +1,96 @@
+from django.db.models import Sum
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import viewsets
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from library_service_project.pagination import KeysetPagination
+from stats.models import BookStats, DailyRevenue, LibraryStats
+from stats.serializers import (
+    BookStatsSerializer,
+    DailyRevenueSerializer,
+    LibraryStatsSerializer,
+    RevenueRangeSerializer,
+)
+
+
+class PopularityPagination(KeysetPagination):
+    """Keyset pages of the most borrowed books first."""
+
+    ordering = ("-borrowings", "book_id")
+
+
+class LibraryStatsView(APIView):
+    """
+    Staff only: totals of the library, summed over the shards of the
+    incrementally maintained LibraryStats.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses=LibraryStatsSerializer)
+    def get(self, request):
+        return Response(LibraryStatsSerializer(LibraryStats.totals()).data)
+
+
+class BookStatsViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Staff only: borrowings and utilisation of each book.
+
+    list:
+    The most borrowed books first, in keyset pages.
+
+    retrieve:
+    The stats of a book, by its id.
+    """
+
+    queryset = BookStats.objects.select_related("book").order_by(
+        "-borrowings", "book_id"
+    )
+    serializer_class = BookStatsSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = PopularityPagination
+
+
+class RevenueView(APIView):
+    """
+    Staff only: money received per day and payment type, from ?from=
+    to ?to= (the last 30 days by default), summed over the shards of
+    the days. Days without payments are left out.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "from",
+                type=str,
+                description="First day, YYYY-MM-DD",
+                required=False,
+            ),
+            OpenApiParameter(
+                "to",
+                type=str,
+                description="Last day, YYYY-MM-DD (today)",
+                required=False,
+            ),
+        ],
+        responses=DailyRevenueSerializer(many=True),
+    )
+    def get(self, request):
+        serializer = RevenueRangeSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        days = (
+            DailyRevenue.objects.filter(
+                day__range=(
+                    serializer.validated_data["from"],
+                    serializer.validated_data["to"],
+                )
+            )
+            .values("day", "type")
+            .annotate(amount=Sum("amount"), payments=Sum("payments"))
+            .order_by("day", "type")
+        )
+        return Response(DailyRevenueSerializer(days, many=True).data)
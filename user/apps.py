@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UserConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "user"
+
+    def ready(self):
+        import user.checks  # noqa: F401
+        import user.schema  # noqa: F401
+        import user.signals  # noqa: F401
@@ -0,0 +1,134 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the is_staff, is_active and full_name claims of the
+user, so StatelessJWTAuthentication serves a request with a TokenUser
+built from them instead of loading the user row. Tokens issued before
+the claims were added still authenticate with the user row.
+
+A change of the staff or active status or of the password, or the
+deletion of the user, revokes every token issued to the user so far,
+whether the user is saved or updated in bulk (see user.models):
+their user id and the time go to a denylist kept in the
+JWT_DENYLIST_CACHE (Redis, shared by the workers) until those tokens
+have expired. Without a shared denylist, a worker would keep accepting
+tokens revoked by another, see user.checks.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import models, tokens
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+USER_CLAIMS = ("is_staff", "is_active", "full_name")
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class AccessToken(tokens.AccessToken):
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+class RefreshToken(tokens.RefreshToken):
+    access_token_class = AccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        # Its access tokens copy the claims.
+        return add_user_claims(super().for_user(user), user)
+
+
+class TokenUser(models.TokenUser):
+    """
+    The user of a request, as described by the claims of its token.
+
+    Permissions are not in the token, checking one loads the user.
+    """
+
+    @property
+    def is_active(self):
+        return self.token.get("is_active", True)
+
+    @property
+    def full_name(self):
+        return self.token.get("full_name", "")
+
+    @cached_property
+    def _user(self):
+        return get_user_model().objects.get(pk=self.pk)
+
+    def has_perm(self, perm, obj=None):
+        return self._user.has_perm(perm, obj)
+
+    def has_perms(self, perm_list, obj=None):
+        return all(self.has_perm(perm, obj) for perm in perm_list)
+
+    def has_module_perms(self, module):
+        return self._user.has_module_perms(module)
+
+
+def _denylist_key(user_id):
+    return f"jwt:revoked:{user_id}"
+
+
+def revoke_tokens(*user_ids):
+    """Reject the tokens issued to the users until now."""
+
+    # An access token refreshed at the end of the refresh token lifetime
+    # keeps the "iat" of the refresh token.
+    lifetime = (
+        api_settings.REFRESH_TOKEN_LIFETIME
+        + api_settings.ACCESS_TOKEN_LIFETIME
+    )
+    now = int(time.time())
+    caches[settings.JWT_DENYLIST_CACHE].set_many(
+        {_denylist_key(user_id): now for user_id in user_ids},
+        timeout=int(lifetime.total_seconds()),
+    )
+
+
+def is_revoked(token):
+    """
+    Returns:
+    - bool: Whether the token was issued before its user was denylisted.
+      "iat" is in whole seconds, a token issued in the second of the
+      revocation is rejected too.
+    """
+
+    revoked_at = caches[settings.JWT_DENYLIST_CACHE].get(
+        _denylist_key(token[api_settings.USER_ID_CLAIM])
+    )
+    return revoked_at is not None and token["iat"] <= revoked_at
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM in validated_token and is_revoked(
+            validated_token
+        ):
+            raise AuthenticationFailed(
+                _("Token has been revoked"), code="token_revoked"
+            )
+
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+
+        user = api_settings.TOKEN_USER_CLASS(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed(
+                _("User is inactive"), code="user_inactive"
+            )
+        return user
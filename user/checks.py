@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from django.utils.module_loading import import_string
+
+# Backends whose entries are only seen by the process that wrote them.
+PER_PROCESS_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register()
+def check_jwt_denylist(app_configs, **kwargs):
+    """
+    StatelessJWTAuthentication accepts a token until its user is in the
+    denylist, which every worker must see.
+    """
+
+    from user.authentication import StatelessJWTAuthentication
+
+    stateless = any(
+        issubclass(import_string(path), StatelessJWTAuthentication)
+        for path in settings.REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"]
+    )
+    backend = settings.CACHES[settings.JWT_DENYLIST_CACHE]["BACKEND"]
+    if stateless and backend in PER_PROCESS_CACHES:
+        return [
+            Error(
+                "StatelessJWTAuthentication needs a denylist shared by "
+                f"every worker, JWT_DENYLIST_CACHE uses {backend}.",
+                hint=(
+                    "Set JWT_DENYLIST_REDIS_URL or REDIS_CACHE_URL, or "
+                    "JWT_AUTHENTICATION to rest_framework_simplejwt."
+                    "authentication.JWTAuthentication."
+                ),
+                id="user.E001",
+            )
+        ]
+    return []
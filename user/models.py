@@ -1,9 +1,57 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext as _
 
+from user.authentication import revoke_tokens
 
-class UserManager(BaseUserManager):
+# The fields whose change revokes the tokens of the user.
+REVOKING_FIELDS = ("is_active", "is_staff", "password")
+
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Update the users, revoking the tokens of those whose staff or
+        active status or password changes.
+
+        pre_save is not sent for a bulk update, user.signals does the
+        same for a user saved alone.
+        """
+
+        changed = {
+            field: kwargs[field]
+            for field in REVOKING_FIELDS
+            if field in kwargs
+        }
+        if not changed:
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            # The users already set that way keep their tokens.
+            user_ids = list(
+                self.exclude(**changed)
+                .select_for_update()
+                .values_list("pk", flat=True)
+            )
+            updated = super().update(**kwargs)
+        if user_ids:
+            revoke_tokens(*user_ids)
+        return updated
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        """Update the users, revoking their tokens as update() does."""
+
+        updated = super().bulk_update(objs, fields, batch_size=batch_size)
+        if set(fields) & set(REVOKING_FIELDS):
+            revoke_tokens(*(obj.pk for obj in objs))
+        return updated
+
+    bulk_update.alters_data = True
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """Define a model manager for User model with no username field."""
 
     use_in_migrations = True
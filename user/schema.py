@@ -0,0 +1,17 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import (
+    SimpleJWTScheme,
+    TokenObtainPairSerializerExtension,
+    TokenRefreshSerializerExtension,
+)
+
+
+class StatelessJWTScheme(SimpleJWTScheme):
+    target_class = "user.authentication.StatelessJWTAuthentication"
+
+
+class TokenObtainPairSchema(TokenObtainPairSerializerExtension):
+    target_class = "user.serializers.TokenObtainPairSerializer"
+
+
+class TokenRefreshSchema(TokenRefreshSerializerExtension):
+    target_class = "user.serializers.TokenRefreshSerializer"
@@ -1,6 +1,10 @@
 from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
 from django.utils.translation import gettext as _
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from user.authentication import RefreshToken, is_revoked
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -25,6 +29,24 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class ManageUserSerializer(UserSerializer):
+    """
+    The user with their fine balance as of the last nightly accrual,
+    annotated by ManageUserView.
+    """
+
+    outstanding_fine = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+    fines_accrued_on = serializers.DateField(read_only=True)
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + (
+            "outstanding_fine",
+            "fines_accrued_on",
+        )
+
+
 class AuthTokenSerializer(serializers.Serializer):
     email = serializers.CharField(label=_("Email"))
     password = serializers.CharField(
@@ -53,3 +75,18 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs["user"] = user
         return attrs
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """Issues tokens carrying the claims of user.authentication.TokenUser."""
+
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        if is_revoked(self.token_class(attrs["refresh"])):
+            raise InvalidToken(_("Token has been revoked"))
+        return super().validate(attrs)
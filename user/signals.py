@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from user.authentication import revoke_tokens
+from user.models import REVOKING_FIELDS, User
+
+
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_access_change(
+    sender, instance, raw=False, update_fields=None, using=None, **kwargs
+):
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(
+        REVOKING_FIELDS
+    ):
+        return
+
+    # The row being overwritten, in the database written to.
+    previous = (
+        User.objects.using(using)
+        .filter(pk=instance.pk)
+        .values(*REVOKING_FIELDS)
+        .first()
+    )
+    if previous and any(
+        previous[field] != getattr(instance, field)
+        for field in REVOKING_FIELDS
+    ):
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    revoke_tokens(instance.pk)
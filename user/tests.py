@@ -1,3 +1,200 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.checks import Error
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from user.authentication import (
+    AccessToken,
+    RefreshToken,
+    StatelessJWTAuthentication,
+    TokenUser,
+)
+from user.checks import check_jwt_denylist
+from user.views import ManageUserView
+
+ME_URL = reverse("user:manage")
+TOKEN_URL = reverse("user:token_obtain_pair")
+TOKEN_REFRESH_URL = reverse("user:token_refresh")
+
+
+class ManageUserQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="Test122345"
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZE=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    # The default without a shared denylist is JWTAuthentication.
+    @mock.patch.object(
+        ManageUserView, "authentication_classes", (StatelessJWTAuthentication,)
+    )
+    def test_me(self):
+        # The user loaded by the view, the token holds no email.
+        with self.assertNumQueries(1):
+            response = self.client.get(ME_URL)
+        self.assertEqual(response.data["email"], self.user.email)
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        caches[settings.JWT_DENYLIST_CACHE].clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="Test122345",
+            first_name="Ann",
+            last_name="Reader",
+            is_staff=True,
+        )
+
+    def authenticate(self, token):
+        request = RequestFactory().get(
+            "/api/books/", HTTP_AUTHORIZE=f"Bearer {token}"
+        )
+        user, _ = StatelessJWTAuthentication().authenticate(request)
+        return user
+
+    def test_obtained_token_carries_user_claims(self):
+        response = self.client.post(
+            TOKEN_URL, {"email": "user@test.com", "password": "Test122345"}
+        )
+
+        token = tokens.AccessToken(response.data["access"])
+        self.assertTrue(token["is_staff"])
+        self.assertTrue(token["is_active"])
+        self.assertEqual(token["full_name"], "Ann Reader")
+
+    def test_user_is_built_from_claims(self):
+        token = AccessToken.for_user(self.user)
+
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+
+        self.assertIsInstance(user, TokenUser)
+        self.assertEqual(user.id, self.user.id)
+        self.assertTrue(user.is_staff)
+        self.assertEqual(user.full_name, "Ann Reader")
+
+    def test_token_without_claims_loads_user(self):
+        token = tokens.AccessToken.for_user(self.user)
+
+        with self.assertNumQueries(1):
+            user = self.authenticate(token)
+
+        self.assertEqual(user, self.user)
+
+    def test_inactive_claim_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        token["is_active"] = False
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_access_change_revokes_tokens(self):
+        token = AccessToken.for_user(self.user)
+        self.user.first_name = "Anna"
+        self.user.save()
+        self.authenticate(token)
+
+        self.user.is_staff = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_bulk_deactivation_revokes_tokens(self):
+        token = AccessToken.for_user(self.user)
+        other = get_user_model().objects.create_user(
+            email="other@test.com", password="Test122345"
+        )
+        other_token = AccessToken.for_user(other)
+        users = get_user_model().objects.filter(pk=self.user.pk)
+
+        users.update(first_name="Anna")
+        self.authenticate(token)
+        users.update(is_active=False)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        self.authenticate(other_token)
+
+    def test_bulk_update_of_unchanged_users_keeps_tokens(self):
+        token = AccessToken.for_user(self.user)
+
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=True
+        )
+
+        self.authenticate(token)
+
+    def test_bulk_password_change_revokes_tokens(self):
+        token = AccessToken.for_user(self.user)
+        self.user.set_password("Changed12345")
+
+        get_user_model().objects.bulk_update([self.user], ["password"])
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_revoked_refresh_token_is_rejected(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.user.set_password("Changed12345")
+        self.user.save()
+
+        response = self.client.post(
+            TOKEN_REFRESH_URL, {"refresh": str(refresh)}
+        )
+
+        self.assertEqual(response.status_code, 401)
+
+
+class DenylistCheckTests(TestCase):
+    def rest_framework(self, authentication):
+        return {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_AUTHENTICATION_CLASSES": (authentication,),
+        }
+
+    def test_stateless_authentication_needs_a_shared_denylist(self):
+        stateless = "user.authentication.StatelessJWTAuthentication"
+        locmem = {
+            **settings.CACHES,
+            settings.JWT_DENYLIST_CACHE: {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+            },
+        }
+        redis = {
+            **settings.CACHES,
+            settings.JWT_DENYLIST_CACHE: {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://localhost:6379/2",
+            },
+        }
+
+        with override_settings(
+            REST_FRAMEWORK=self.rest_framework(stateless), CACHES=locmem
+        ):
+            [error] = check_jwt_denylist(None)
+        self.assertIsInstance(error, Error)
+        self.assertEqual(error.id, "user.E001")
+
+        with override_settings(
+            REST_FRAMEWORK=self.rest_framework(stateless), CACHES=redis
+        ):
+            self.assertEqual(check_jwt_denylist(None), [])
+        with override_settings(
+            REST_FRAMEWORK=self.rest_framework(
+                "rest_framework_simplejwt.authentication.JWTAuthentication"
+            ),
+            CACHES=locmem,
+        ):
+            self.assertEqual(check_jwt_denylist(None), [])
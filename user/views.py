@@ -1,9 +1,18 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from rest_framework import generics
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.settings import api_settings
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from user.serializers import (
+    UserSerializer,
+    AuthTokenSerializer,
+    ManageUserSerializer,
+)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -17,8 +26,19 @@ class CreateTokenView(ObtainAuthToken):
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
-    serializer_class = UserSerializer
+    serializer_class = ManageUserSerializer
     permission_classes = (IsAuthenticated, )
 
     def get_object(self):
-        return self.request.user
+        # request.user may be a user.authentication.TokenUser, which
+        # only holds the claims of the token.
+        return (
+            get_user_model()
+            .objects.annotate(
+                outstanding_fine=Coalesce(
+                    "fine_balance__amount", Value(Decimal(0))
+                ),
+                fines_accrued_on=F("fine_balance__accrued_on"),
+            )
+            .get(pk=self.request.user.pk)
+        )